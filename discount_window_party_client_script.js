@@ -33,14 +33,21 @@ function discount_window_party(frm, callback) {
     // Sammle alle Teilnehmer und ihre Produkttabellen
     let teilnehmerMitProdukten = [];
     
+    // Alle Produkte liegen in einer Tabelle, der Teilnehmer steht in jeder Zeile
+    let produkteFuer = function(teilnehmer) {
+        return (frm.doc.produktauswahl || []).filter(item => item.teilnehmer === teilnehmer);
+    };
+    
     // Gastgeberin hinzufügen
-    if (frm.doc.gastgeberin && frm.doc.produktauswahl_für_gastgeberin && frm.doc.produktauswahl_für_gastgeberin.length > 0) {
-        teilnehmerMitProdukten.push({
-            name: frm.doc.gastgeberin,
-            typ: "Gastgeberin",
-            produktfeld: "produktauswahl_für_gastgeberin",
-            produkte: frm.doc.produktauswahl_für_gastgeberin
-        });
+    if (frm.doc.gastgeberin) {
+        let produkte = produkteFuer(frm.doc.gastgeberin);
+        if (produkte.length > 0) {
+            teilnehmerMitProdukten.push({
+                name: frm.doc.gastgeberin,
+                typ: "Gastgeberin",
+                produkte: produkte
+            });
+        }
     }
     
     // Alle Gäste hinzufügen
@@ -48,19 +55,16 @@ function discount_window_party(frm, callback) {
         let kunde = frm.doc.kunden[i];
         if (!kunde.kunde) continue;
         
-        let field_name = `produktauswahl_für_gast_${i+1}`;
-        if (frm.doc[field_name] && frm.doc[field_name].length > 0) {
-            // Prüfe ob der Gast tatsächlich Produkte hat
-            let hatProdukte = frm.doc[field_name].some(item => item.item_code && item.qty && item.qty > 0);
-            if (hatProdukte) {
-                teilnehmerMitProdukten.push({
-                    name: kunde.kunde,
-                    typ: "Gast",
-                    gastNummer: i + 1,
-                    produktfeld: field_name,
-                    produkte: frm.doc[field_name]
-                });
-            }
+        let produkte = produkteFuer(kunde.kunde);
+        // Prüfe ob der Gast tatsächlich Produkte hat
+        let hatProdukte = produkte.some(item => item.item_code && item.qty && item.qty > 0);
+        if (hatProdukte) {
+            teilnehmerMitProdukten.push({
+                name: kunde.kunde,
+                typ: "Gast",
+                gastNummer: i + 1,
+                produkte: produkte
+            });
         }
     }
     
@@ -357,15 +361,9 @@ function discount_window_party(frm, callback) {
                                 
                                 console.log(`Preis für ${itemCode}: ${price}`);
                                 
-                                // Füge das Item zur entsprechenden Produkttabelle hinzu
-                                let produkttabelle = frm.doc[teilnehmer.produktfeld];
-                                if (!produkttabelle) {
-                                    produkttabelle = [];
-                                    frm.doc[teilnehmer.produktfeld] = produkttabelle;
-                                }
-                                
-                                // Neues Item hinzufügen
-                                let newItem = {
+                                // Neues Item für den Teilnehmer zur Produkttabelle hinzufügen
+                                frm.add_child("produktauswahl", {
+                                    teilnehmer: teilnehmer.name,
                                     item_code: itemCode,
                                     item_name: item.item_name || itemName,
                                     description: item.description || itemName,
@@ -377,12 +375,10 @@ function discount_window_party(frm, callback) {
                                     conversion_factor: 1,
                                     warehouse: warehouse,
                                     delivery_date: deliveryDate
-                                };
-                                
-                                produkttabelle.push(newItem);
+                                });
                                 
-                                // Refresh das entsprechende Feld
-                                frm.refresh_field(teilnehmer.produktfeld);
+                                // Refresh der Produkttabelle
+                                frm.refresh_field("produktauswahl");
                                 
                                 console.log(`Aktionsartikel ${itemName} zu ${teilnehmer.name} hinzugefügt`);
                                 resolve();
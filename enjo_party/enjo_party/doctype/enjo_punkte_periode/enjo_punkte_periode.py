@@ -0,0 +1,17 @@
+# Copyright (c) 2025, Elia and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class ENJOPunktePeriode(Document):
+	# Wird nur über enjo_party.enjo_party.utils.punkte_periode gepflegt
+	pass
+
+
+def on_doctype_update():
+	# Eine Zeile pro Partnerin und Monat - Schlüssel für die Upserts aus punkte_periode
+	frappe.db.add_unique(
+		"ENJO Punkte Periode", ["sales_partner", "periode"], constraint_name="unique_sales_partner_periode"
+	)
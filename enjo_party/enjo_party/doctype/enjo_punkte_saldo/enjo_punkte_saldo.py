@@ -0,0 +1,10 @@
+# Copyright (c) 2025, Elia and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class ENJOPunkteSaldo(Document):
+	# Wird nur über enjo_party.enjo_party.utils.punkte_saldo gepflegt
+	pass
@@ -14,4 +14,27 @@ class ENJOPunkteTransaktion(Document):
 		# Item Name automatisch setzen falls leer
 		if self.item_code and not self.item_name:
 			item_doc = frappe.get_cached_doc("Item", self.item_code)
-			self.item_name = item_doc.item_name or self.item_code 
\ No newline at end of file
+			self.item_name = item_doc.item_name or self.item_code 
+
+
+def on_doctype_update():
+	# Punkte-Übersicht: Filter auf Partnerin und Storno-Status, Sortierung nach Datum
+	frappe.db.add_index(
+		"ENJO Punkte Transaktion",
+		["sales_partner", "is_cancelled", "transaction_date"],
+		index_name="sales_partner_is_cancelled_transaction_date_index"
+	)
+	
+	# Punkte-Übersicht mit Zeitraum ohne Storno-Filter (sales_invoice und item_code über search_index)
+	frappe.db.add_index(
+		"ENJO Punkte Transaktion",
+		["sales_partner", "transaction_date"],
+		index_name="sales_partner_transaction_date_index"
+	)
+	
+	# Täglicher Punkteverfall: offene Vergaben vor einem Stichtag (utils/punkte_verfall)
+	frappe.db.add_index(
+		"ENJO Punkte Transaktion",
+		["transaktionsart", "verfallen", "is_cancelled", "transaction_date"],
+		index_name="verfall_index"
+	)
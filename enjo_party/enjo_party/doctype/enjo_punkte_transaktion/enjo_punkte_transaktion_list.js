@@ -0,0 +1,86 @@
+// Copyright (c) 2025, Elia and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings['ENJO Punkte Transaktion'] = {
+    onload: function(listview) {
+        // Export als Hintergrund-Job statt über die Report-Ansicht (bleibt auch bei großen Zeiträumen speicherschonend)
+        listview.page.add_menu_item(__('Punkte exportieren (CSV/XLSX)'), function() {
+            let dialog = new frappe.ui.Dialog({
+                title: __('ENJO Punkte exportieren'),
+                fields: [
+                    {
+                        fieldname: 'quelle',
+                        fieldtype: 'Select',
+                        label: __('Inhalt'),
+                        options: 'Transaktionen\nÜbersicht',
+                        default: 'Transaktionen'
+                    },
+                    {
+                        fieldname: 'format',
+                        fieldtype: 'Select',
+                        label: __('Format'),
+                        options: 'CSV\nXLSX',
+                        default: 'CSV'
+                    },
+                    {
+                        fieldname: 'from_date',
+                        fieldtype: 'Date',
+                        label: __('Von Datum')
+                    },
+                    {
+                        fieldname: 'to_date',
+                        fieldtype: 'Date',
+                        label: __('Bis Datum')
+                    },
+                    {
+                        fieldname: 'sales_partner',
+                        fieldtype: 'Link',
+                        label: __('Vertriebspartnerin'),
+                        options: 'Sales Partner'
+                    },
+                    {
+                        fieldname: 'include_cancelled',
+                        fieldtype: 'Check',
+                        label: __('Stornierte einschließen'),
+                        depends_on: "eval:doc.quelle == 'Transaktionen'"
+                    }
+                ],
+                primary_action_label: __('Exportieren'),
+                primary_action: function(values) {
+                    dialog.hide();
+                    frappe.call({
+                        method: 'enjo_party.enjo_party.utils.punkte_export.export_punkte',
+                        args: values,
+                        callback: function() {
+                            frappe.show_alert({
+                                message: __('Export gestartet - die Datei erscheint hier, sobald sie fertig ist.'),
+                                indicator: 'blue'
+                            });
+                        }
+                    });
+                }
+            });
+            dialog.show();
+        });
+
+        if (!frappe.listview_settings['ENJO Punkte Transaktion']._export_events) {
+            frappe.listview_settings['ENJO Punkte Transaktion']._export_events = true;
+
+            frappe.realtime.on('enjo_punkte_export_done', function(data) {
+                frappe.msgprint({
+                    title: __('Export fertig'),
+                    indicator: 'green',
+                    message: __('{0} Zeilen exportiert: <a href="{1}" target="_blank">{2}</a>',
+                        [data.rows, data.file_url, data.file_name])
+                });
+            });
+            frappe.realtime.on('enjo_punkte_export_error', function(data) {
+                frappe.msgprint({
+                    title: __('Export fehlgeschlagen'),
+                    indicator: 'red',
+                    message: data.error
+                });
+            });
+        }
+    }
+};
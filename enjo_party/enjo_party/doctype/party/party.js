@@ -71,6 +71,54 @@
 // 	},
 // });
 
+// Alle Produkte stehen in EINER Tabelle (produktauswahl), die Spalte "teilnehmer" ordnet sie zu
+function getProdukteFuer(frm, teilnehmer) {
+	return (frm.doc.produktauswahl || []).filter(row => row.teilnehmer === teilnehmer);
+}
+
+// Hat der Teilnehmer mindestens ein gefülltes Produkt?
+function hatProdukte(frm, teilnehmer) {
+	return getProdukteFuer(frm, teilnehmer).some(produkt => produkt.item_code && produkt.qty && produkt.qty > 0);
+}
+
+// Gastgeberin und alle Gäste in der Reihenfolge der Gästeliste
+function getTeilnehmer(frm) {
+	let teilnehmer = frm.doc.gastgeberin ? [frm.doc.gastgeberin] : [];
+	(frm.doc.kunden || []).forEach(k => {
+		if (k.kunde) teilnehmer.push(k.kunde);
+	});
+	return teilnehmer;
+}
+
+// Merkt sich die aktuelle Zuordnung, damit Produkte bei einem Kundenwechsel mitwandern
+function merkeTeilnehmer(frm) {
+	frm._teilnehmerStand = { gastgeberin: frm.doc.gastgeberin, kunden: {} };
+	(frm.doc.kunden || []).forEach(k => {
+		frm._teilnehmerStand.kunden[k.name] = k.kunde;
+	});
+}
+
+// Überträgt alle Produkte von einem Teilnehmer auf einen anderen (z.B. Gast wurde ausgetauscht)
+function uebertrageProdukte(frm, alterTeilnehmer, neuerTeilnehmer) {
+	if (!alterTeilnehmer || !neuerTeilnehmer || alterTeilnehmer === neuerTeilnehmer) return;
+	getProdukteFuer(frm, alterTeilnehmer).forEach(row => {
+		row.teilnehmer = neuerTeilnehmer;
+	});
+	frm.refresh_field('produktauswahl');
+}
+
+// Entfernt Produkte von Personen, die nicht mehr an der Party teilnehmen
+function entferneVerwaisteProdukte(frm) {
+	let teilnehmer = getTeilnehmer(frm);
+	let vorher = (frm.doc.produktauswahl || []).length;
+	frm.doc.produktauswahl = (frm.doc.produktauswahl || []).filter(row => !row.teilnehmer || teilnehmer.includes(row.teilnehmer));
+	if (frm.doc.produktauswahl.length !== vorher) {
+		frm.doc.produktauswahl.forEach((row, index) => { row.idx = index + 1; });
+		frm.refresh_field('produktauswahl');
+		calculate_party_totals(frm);
+	}
+}
+
 // Hilfsfunktion zum Wiederherstellen der Buttons basierend auf dem aktuellen Status
 function refreshButtons(frm) {
 	console.log("refreshButtons aufgerufen - Status:", frm.doc.status, "docstatus:", frm.doc.docstatus, "is_new:", frm.is_new());
@@ -164,18 +212,7 @@ function startAuftraegeErstellung(frm) {
 	
 	// Prüfe Gastgeberin
 	if (frm.doc.gastgeberin) {
-		let hat_gastgeberin_produkte = false;
-		if (frm.doc.produktauswahl_für_gastgeberin && frm.doc.produktauswahl_für_gastgeberin.length > 0) {
-			for (let produkt of frm.doc.produktauswahl_für_gastgeberin) {
-				// Nur gefüllte Zeilen prüfen
-				if (produkt.item_code && produkt.qty && produkt.qty > 0) {
-					hat_gastgeberin_produkte = true;
-					break;
-				}
-			}
-		}
-		
-		if (!hat_gastgeberin_produkte) {
+		if (!hatProdukte(frm, frm.doc.gastgeberin)) {
 			teilnehmer_ohne_produkte.push(`${getCustomerName(frm.doc.gastgeberin)} (Gastgeberin)`);
 		}
 	}
@@ -185,20 +222,7 @@ function startAuftraegeErstellung(frm) {
 		let kunde = frm.doc.kunden[i];
 		if (!kunde.kunde) continue;
 		
-		let field_name = `produktauswahl_für_gast_${i+1}`;
-		let hat_produkte = false;
-		
-		if (frm.doc[field_name] && frm.doc[field_name].length > 0) {
-			for (let produkt of frm.doc[field_name]) {
-				// Nur gefüllte Zeilen prüfen
-				if (produkt.item_code && produkt.qty && produkt.qty > 0) {
-					hat_produkte = true;
-					break;
-				}
-			}
-		}
-		
-		if (!hat_produkte) {
+		if (!hatProdukte(frm, kunde.kunde)) {
 			teilnehmer_ohne_produkte.push(getCustomerName(kunde.kunde));
 		}
 	}
@@ -258,20 +282,7 @@ function startAuftraegeErstellung(frm) {
 					let kunde = frm.doc.kunden[i];
 					if (!kunde.kunde) continue;
 					
-					let field_name = `produktauswahl_für_gast_${i+1}`;
-					let hat_produkte = false;
-					
-					if (frm.doc[field_name] && frm.doc[field_name].length > 0) {
-						for (let produkt of frm.doc[field_name]) {
-							// Nur gefüllte Zeilen prüfen
-							if (produkt.item_code && produkt.qty && produkt.qty > 0) {
-								hat_produkte = true;
-								break;
-							}
-						}
-					}
-					
-					if (!hat_produkte) {
+					if (!hatProdukte(frm, kunde.kunde)) {
 						gaeste_ohne_produkte.push({
 							index: i,
 							name: kunde.kunde
@@ -365,7 +376,7 @@ function startAktionsSystem(frm, callback) {
 				let teilnehmerMitProdukten = [];
 				
 				// Gastgeberin hinzufügen
-				if (frm.doc.gastgeberin && frm.doc.produktauswahl_für_gastgeberin && frm.doc.produktauswahl_für_gastgeberin.length > 0) {
+				if (frm.doc.gastgeberin && getProdukteFuer(frm, frm.doc.gastgeberin).length > 0) {
 					// Hole Gastgeberin-Name
 					frappe.call({
 						method: "frappe.client.get_value",
@@ -383,8 +394,7 @@ function startAktionsSystem(frm, callback) {
 								name: frm.doc.gastgeberin,
 								displayName: gastgeberinName,
 								typ: "Gastgeberin",
-								produktfeld: "produktauswahl_für_gastgeberin",
-								produkte: frm.doc.produktauswahl_für_gastgeberin
+								produkte: getProdukteFuer(frm, frm.doc.gastgeberin)
 							});
 						}
 					});
@@ -396,37 +406,32 @@ function startAktionsSystem(frm, callback) {
 					let kunde = frm.doc.kunden[i];
 					if (!kunde.kunde) continue;
 					
-					let field_name = `produktauswahl_für_gast_${i+1}`;
-					if (frm.doc[field_name] && frm.doc[field_name].length > 0) {
-						let hatProdukte = frm.doc[field_name].some(item => item.item_code && item.qty && item.qty > 0);
-						if (hatProdukte) {
-							// Hole Gast-Name
-							let promise = new Promise((resolve) => {
-								frappe.call({
-									method: "frappe.client.get_value",
-									args: {
-										doctype: "Customer",
-										filters: {
-											name: kunde.kunde
-										},
-										fieldname: "customer_name"
+					if (hatProdukte(frm, kunde.kunde)) {
+						// Hole Gast-Name
+						let promise = new Promise((resolve) => {
+							frappe.call({
+								method: "frappe.client.get_value",
+								args: {
+									doctype: "Customer",
+									filters: {
+										name: kunde.kunde
 									},
-									callback: function(r) {
-										let gastName = r.message ? r.message.customer_name : kunde.kunde;
-										teilnehmerMitProdukten.push({
-											name: kunde.kunde,
-											displayName: gastName,
-											typ: "Gast",
-											gastNummer: i + 1,
-											produktfeld: field_name,
-											produkte: frm.doc[field_name]
-										});
-										resolve();
-									}
-								});
+									fieldname: "customer_name"
+								},
+								callback: function(r) {
+									let gastName = r.message ? r.message.customer_name : kunde.kunde;
+									teilnehmerMitProdukten.push({
+										name: kunde.kunde,
+										displayName: gastName,
+										typ: "Gast",
+										gastNummer: i + 1,
+										produkte: getProdukteFuer(frm, kunde.kunde)
+									});
+									resolve();
+								}
 							});
-							gastePromises.push(promise);
-						}
+						});
+						gastePromises.push(promise);
 					}
 				}
 				
@@ -616,24 +621,9 @@ function startAktionsSystem(frm, callback) {
 							console.log(`${aktionsartikelHinzugefuegt} Aktionsartikel wurden hinzugefügt`);
 							
 							if (aktionsartikelHinzugefuegt > 0) {
-								// Refresh alle betroffenen Felder (mit Fehlerbehandlung)
+								// Refresh der Produkttabelle (mit Fehlerbehandlung)
 								try {
-									// Gastgeberin-Tabelle
-									if (frm.fields_dict.produktauswahl_für_gastgeberin) {
-										frm.refresh_field('produktauswahl_für_gastgeberin');
-									}
-									
-									// Gäste-Tabellen
-									for (let i = 1; i <= 15; i++) {
-										let fieldName = `produktauswahl_für_gast_${i}`;
-										if (frm.fields_dict[fieldName]) {
-											try {
-												frm.refresh_field(fieldName);
-											} catch (e) {
-												console.log(`Konnte ${fieldName} nicht refreshen:`, e);
-											}
-										}
-									}
+									frm.refresh_field('produktauswahl');
 								} catch (e) {
 									console.log("Fehler beim Refreshen nach Aktionsartikeln:", e);
 								}
@@ -696,7 +686,7 @@ function startAktionsSystem(frm, callback) {
 								let stock_uom = itemDetails.stock_uom || "Stk";
 								
 								// WICHTIG: Verwende frm.add_child() statt Array-Manipulation!
-								let neuer_eintrag = frm.add_child(teilnehmer.produktfeld);
+								let neuer_eintrag = frm.add_child('produktauswahl', { teilnehmer: teilnehmer.name });
 								
 								// Setze alle erforderlichen Felder
 								frappe.model.set_value(neuer_eintrag.doctype, neuer_eintrag.name, 'item_code', itemCode);
@@ -707,7 +697,6 @@ function startAktionsSystem(frm, callback) {
 								frappe.model.set_value(neuer_eintrag.doctype, neuer_eintrag.name, 'uom', stock_uom);
 								frappe.model.set_value(neuer_eintrag.doctype, neuer_eintrag.name, 'stock_uom', stock_uom);
 								frappe.model.set_value(neuer_eintrag.doctype, neuer_eintrag.name, 'conversion_factor', 1.0);
-								frappe.model.set_value(neuer_eintrag.doctype, neuer_eintrag.name, 'uom_conversion_factor', 1.0);
 								frappe.model.set_value(neuer_eintrag.doctype, neuer_eintrag.name, 'stock_qty', 1.0);
 								frappe.model.set_value(neuer_eintrag.doctype, neuer_eintrag.name, 'base_amount', rate * 1);
 								frappe.model.set_value(neuer_eintrag.doctype, neuer_eintrag.name, 'base_rate', rate);
@@ -728,7 +717,7 @@ function startAktionsSystem(frm, callback) {
 								// ENTFERNT: frappe.model.set_value(neuer_eintrag.doctype, neuer_eintrag.name, '_aktionsartikel', true);
 								
 								// Refresh das Feld, damit es sichtbar wird
-								frm.refresh_field(teilnehmer.produktfeld);
+								frm.refresh_field('produktauswahl');
 								
 								console.log(`Aktionsartikel ${itemName} zu ${teilnehmer.displayName} hinzugefügt`);
 								resolve();
@@ -766,12 +755,12 @@ function applyGutscheinSystem(frm, callback) {
 	
 	// Funktion zum Sammeln der Produkte aus der Gastgeberin-Tabelle
 	function sammleGastgeberProdukte() {
-		if (frm.doc.gastgeberin && frm.doc.produktauswahl_für_gastgeberin && frm.doc.produktauswahl_für_gastgeberin.length > 0) {
-			frm.doc.produktauswahl_für_gastgeberin.forEach((item, index) => {
+		if (frm.doc.gastgeberin) {
+			getProdukteFuer(frm, frm.doc.gastgeberin).forEach((item, index) => {
 				if (item.item_code && item.qty && item.qty > 0 && item.rate && item.rate > 0) {
 					gastgeberProdukte.push({
 						item: item,
-						produktfeld: "produktauswahl_für_gastgeberin",
+						produktfeld: "produktauswahl",
 						tabellenName: "Gastgeberin",
 						index: index,
 						originalRate: item.rate,
@@ -1027,7 +1016,7 @@ function stelleOriginalPreiseWieder(frm) {
 	frm.originalPricesBackup = {};
 	
 	// Aktualisiere alle betroffenen Tabellen
-	frm.refresh_field("produktauswahl_für_gastgeberin");
+	frm.refresh_field("produktauswahl");
 	
 	// Berechne Gesamtsummen neu
 	calculate_party_totals(frm);
@@ -1080,24 +1069,9 @@ function erstelleAuftraege(frm) {
 	// Vor dem Speichern: Alle Produkttabellen aktualisieren und Gesamtsummen neu berechnen
 	console.log("Aktualisiere alle Produkttabellen vor dem Speichern...");
 	
-	// Refresh nur existierende Produkttabellen (mit Fehlerbehandlung)
+	// Refresh der Produkttabelle (mit Fehlerbehandlung)
 	try {
-		// Gastgeberin-Tabelle
-		if (frm.doc.produktauswahl_für_gastgeberin && frm.fields_dict.produktauswahl_für_gastgeberin) {
-			frm.refresh_field('produktauswahl_für_gastgeberin');
-		}
-		
-		// Gäste-Tabellen (nur die, die tatsächlich existieren)
-		for (let i = 1; i <= 15; i++) {
-			let fieldName = `produktauswahl_für_gast_${i}`;
-			if (frm.doc[fieldName] && frm.fields_dict[fieldName]) {
-				try {
-					frm.refresh_field(fieldName);
-				} catch (e) {
-					console.log(`Konnte ${fieldName} nicht refreshen:`, e);
-				}
-			}
-		}
+		frm.refresh_field('produktauswahl');
 	} catch (e) {
 		console.log("Fehler beim Refreshen der Tabellen:", e);
 	}
@@ -1158,58 +1132,27 @@ function validateAktionsartikel(frm) {
 			// Prüfe alle Produkttabellen
 			let aktionsartikelGefunden = 0;
 			
-			// Gastgeberin-Tabelle
-			if (frm.doc.produktauswahl_für_gastgeberin) {
-				frm.doc.produktauswahl_für_gastgeberin.forEach(item => {
-					if (aktionsCodes.includes(item.item_code)) {
-						aktionsartikelGefunden++;
-						// Stelle sicher, dass wichtige Felder gesetzt sind
-						if (!item.qty) item.qty = 1;
-						if (!item.uom) item.uom = "Stk";
-						if (!item.stock_uom) item.stock_uom = "Stk";
-						if (!item.conversion_factor) item.conversion_factor = 1;
-						if (!item.delivery_date) item.delivery_date = frappe.datetime.add_days(frappe.datetime.nowdate(), 7);
-						if (!item.warehouse) {
-							frappe.call({
-								method: "enjo_party.enjo_party.doctype.party.party.get_default_warehouse",
-								async: false,
-								callback: function(r) {
-									item.warehouse = r.message || "Lagerräume - BM";
-								}
-							});
-						}
-						console.log(`Aktionsartikel validiert: ${item.item_code} für Gastgeberin`);
-					}
-				});
-			}
-			
-			// Gäste-Tabellen
-			for (let i = 1; i <= 15; i++) {
-				let fieldName = `produktauswahl_für_gast_${i}`;
-				if (frm.doc[fieldName]) {
-					frm.doc[fieldName].forEach(item => {
-						if (aktionsCodes.includes(item.item_code)) {
-							aktionsartikelGefunden++;
-							// Stelle sicher, dass wichtige Felder gesetzt sind
-							if (!item.qty) item.qty = 1;
-							if (!item.uom) item.uom = "Stk";
-							if (!item.stock_uom) item.stock_uom = "Stk";
-							if (!item.conversion_factor) item.conversion_factor = 1;
-							if (!item.delivery_date) item.delivery_date = frappe.datetime.add_days(frappe.datetime.nowdate(), 7);
-							if (!item.warehouse) {
-								frappe.call({
-									method: "enjo_party.enjo_party.doctype.party.party.get_default_warehouse",
-									async: false,
-									callback: function(r) {
-										item.warehouse = r.message || "Lagerräume - BM";
-									}
-								});
+			(frm.doc.produktauswahl || []).forEach(item => {
+				if (aktionsCodes.includes(item.item_code)) {
+					aktionsartikelGefunden++;
+					// Stelle sicher, dass wichtige Felder gesetzt sind
+					if (!item.qty) item.qty = 1;
+					if (!item.uom) item.uom = "Stk";
+					if (!item.stock_uom) item.stock_uom = "Stk";
+					if (!item.conversion_factor) item.conversion_factor = 1;
+					if (!item.delivery_date) item.delivery_date = frappe.datetime.add_days(frappe.datetime.nowdate(), 7);
+					if (!item.warehouse) {
+						frappe.call({
+							method: "enjo_party.enjo_party.doctype.party.party.get_default_warehouse",
+							async: false,
+							callback: function(r) {
+								item.warehouse = r.message || "Lagerräume - BM";
 							}
-							console.log(`Aktionsartikel validiert: ${item.item_code} für Gast ${i}`);
-						}
-					});
+						});
+					}
+					console.log(`Aktionsartikel validiert: ${item.item_code} für ${item.teilnehmer}`);
 				}
-			}
+			});
 			
 			console.log(`${aktionsartikelGefunden} Aktionsartikel gefunden und validiert`);
 		}
@@ -1238,15 +1181,8 @@ function erstelleAuftraegeDirectly(frm) {
 	// Kurze Pause, dann API direkt aufrufen
 	// ENTFERNT: setTimeout da es bei eingefrorenem Screen nicht funktioniert
 	// setTimeout(() => {
-		// WICHTIG: Setze skip_total_calculation Backend-Flag nur wenn Frontend-Flags gesetzt sind
-		// damit calculate_totals() nur übersprungen wird wenn tatsächlich Gutschrift/Aktionsartikel angewendet wurden
-		if (frm._skipTotalCalculation) {
-			console.log("Setze Backend skip_total_calculation Flag");
-			frm.doc.skip_total_calculation = 1;
-		} else {
-			console.log("Setze KEIN Backend skip_total_calculation Flag - normale Berechnung");
-			frm.doc.skip_total_calculation = 0;
-		}
+		// Ob die Summen im Backend eingefroren bleiben, entscheidet der Server selbst
+		// (angewendeter Gutschein bzw. laufende Buchung)
 		
 		// DEBUG: Zeige aktuellen Dokument-Status
 		console.log("DEBUG: Vor dem Speichern - docstatus:", frm.doc.docstatus, "is_dirty:", frm.is_dirty());
@@ -1284,8 +1220,6 @@ function erstelleAuftraegeDirectly(frm) {
 			// Screen wieder freigeben
 			
 			frappe.freeze_screen = false;
-			// Flag zurücksetzen bei Fehler
-			frm.doc.skip_total_calculation = 0;
 			
 			// Detaillierte Fehlermeldung
 			let errorMessage = "Fehler beim Speichern der Änderungen.";
@@ -1308,156 +1242,141 @@ function erstelleAuftraegeDirectly(frm) {
 	// }, 100);
 	
 	function callCreateInvoicesAPI() {
-		console.log("Rufe Aufträge-API auf...");
+		console.log("Starte Buchung als Hintergrund-Job...");
+		
+		// Listener VOR dem Einreihen registrieren, damit kein Fortschritt verloren geht
+		verfolgeBuchungsJob(frm);
 		
 		frappe.call({
-			method: "enjo_party.enjo_party.doctype.party.party.create_invoices",
+			method: "enjo_party.enjo_party.doctype.party.party.enqueue_party_booking",
 			args: {
-				party: frm.doc.name,
-				from_button: true  // Flag, um zu zeigen, dass der Aufruf vom Button kommt
+				party: frm.doc.name
 			},
-			freeze: true, // Screen-Freeze wieder aktiviert da Debugging abgeschlossen
-			freeze_message: __("Erstelle und reiche Aufträge ein..."),
 			callback: function(r) {
-				console.log("API-Antwort erhalten - verarbeite Ergebnis");
-				// Screen wieder freigeben
+				// Screen wieder freigeben - der Fortschritt wird über die Fortschrittsanzeige gemeldet
 				frappe.freeze_screen = false;
 				
-				// WICHTIG: Flags zurücksetzen, damit normale Funktionalität wiederhergestellt wird
-				frm.doc.skip_total_calculation = 0;
-				
-				if (r.message && r.message.length > 0) {
-					frappe.msgprint({
-						title: __("Erfolgreich gebuchte Präsentation"),
-						message: __("{0} Aufträge wurden erfolgreich erstellt und eingereicht.<br><br>Das Fenster wird gleich automatisch neu geladen, um den aktuellen Status anzuzeigen.", [r.message.length]),
-						indicator: "green"
+				if (r.message && r.message.joined) {
+					console.log("Buchung läuft bereits - hänge mich an Job an:", r.message.job_id);
+					frappe.show_alert({
+						message: __("Die Buchung dieser Präsentation läuft bereits."),
+						indicator: "blue"
 					});
-					// Vollständiges Neuladen der Seite, um den Status zu aktualisieren
-					// Delay erhöht, damit Benutzer die Erfolgsmeldung lesen können
-					setTimeout(function() {
-						location.reload();
-					}, 3500); // 3.5 Sekunden statt 2
-				} else {
-					console.log("Keine Aufträge erstellt - refreshButtons wird aufgerufen");
-					frappe.msgprint({
-						title: __("Hinweis"),
-						message: __("Es wurden keine Aufträge erstellt. Bitte überprüfen Sie, ob Produkte ausgewählt wurden."),
-						indicator: "orange"
-					});
-					// Buttons wieder herstellen statt reload
-					console.log("Keine Aufträge erstellt - refreshButtons wird aufgerufen");
-					refreshButtons(frm);
 				}
+				frappe.show_progress(__("Buche Präsentation"), 0, 1, __("Buchung wurde gestartet..."));
 			},
 			error: function(r) {
-				console.error("API-Fehler bei Aufträge-Erstellung:", r);
-				// Screen wieder freigeben
+				console.error("API-Fehler beim Starten der Buchung:", r);
+				beendeBuchungsVerfolgung(frm);
 				frappe.freeze_screen = false;
 				
-				// WICHTIG: Flags zurücksetzen auch bei Fehlern
-				frm.doc.skip_total_calculation = 0;
-				
-				// Bei API-Fehlern - zeige vollständige Fehlermeldung
-				let errorMessage = "Es ist ein Fehler beim Erstellen der Aufträge aufgetreten.";
+				let errorMessage = "Die Buchung konnte nicht gestartet werden.";
 				if (r && r.message) {
 					errorMessage += "\n\nFehlermeldung: " + r.message;
 				}
-				if (r && r.exc) {
-					errorMessage += "\n\nTechnische Details: " + r.exc;
-				}
 				
 				frappe.msgprint({
 					title: __("Fehler"),
 					message: errorMessage,
 					indicator: "red"
 				});
-				// Buttons wieder herstellen
-				console.log("API-Fehler - refreshButtons wird aufgerufen");
 				refreshButtons(frm);
 			}
 		});
 	}
 }
 
-// Funktion zum Aktualisieren der benutzerdefinierten Überschriften
-function updateCustomHeaders(frm) {
-	if (!frm.doc.kunden) return;
+// Hängt sich per Realtime an den Buchungs-Job der Party an und zeigt den Fortschritt
+function verfolgeBuchungsJob(frm) {
+	beendeBuchungsVerfolgung(frm);
+	
+	const party = frm.doc.name;
+	
+	frm._buchungProgress = function(data) {
+		if (!data || data.party !== party) return;
+		frappe.show_progress(
+			__("Buche Präsentation"),
+			data.current,
+			data.total,
+			__("{0} ({1} von {2})", [data.description, data.current, data.total])
+		);
+	};
 	
-	// Zuerst für die Gastgeberin, wenn vorhanden
-	if (frm.doc.gastgeberin) {
-		let sectionId = "produktauswahl_für_gastgeberin_section";
-		let sectionHeader = document.querySelector(`[data-fieldname="${sectionId}"] .section-head`);
+	frm._buchungDone = function(data) {
+		if (!data || data.party !== party) return;
+		beendeBuchungsVerfolgung(frm);
+		frappe.hide_progress();
 		
-		if (sectionHeader) {
-			// Hole den echten Kundennamen asynchron (wie bei den Gästen)
-			frappe.db.get_doc('Customer', frm.doc.gastgeberin).then(customer_doc => {
-				let kundenName = customer_doc.customer_name || frm.doc.gastgeberin;
-				
-				// Wende den Stil direkt auf das Kopfelement an
-				sectionHeader.style.fontWeight = "500";
-				sectionHeader.style.fontSize = "1em";
-				sectionHeader.style.color = "#6C7680";
-				
-				// Prüfe, ob wir bereits einen angepassten Header haben
-				if (!sectionHeader.querySelector('.custom-header')) {
-					// Erstelle einen neuen Inhalt mit einem benutzerdefinierten span
-					sectionHeader.innerHTML = `Produktauswahl für <span class="custom-header" style="font-weight: 600; color: #1F272E;">${kundenName}</span>`;
-				} else {
-					// Aktualisiere nur den Text des benutzerdefinierten Spans
-					sectionHeader.querySelector('.custom-header').textContent = kundenName;
-				}
-				
-				// Auch das Label für das Versand-Dropdown anpassen
-				frm.set_df_property('versand_gastgeberin', 'label', `Versand für ${kundenName} an:`);
-			}).catch(error => {
-				// Falls der Customer nicht gefunden wird, verwende die ID als Fallback
-				console.log("Konnte Customer für Gastgeberin nicht laden:", error);
-				sectionHeader.style.fontWeight = "500";
-				sectionHeader.style.fontSize = "1em";
-				sectionHeader.style.color = "#6C7680";
-				
-				if (!sectionHeader.querySelector('.custom-header')) {
-					sectionHeader.innerHTML = `Produktauswahl für <span class="custom-header" style="font-weight: 600; color: #1F272E;">${frm.doc.gastgeberin}</span>`;
-				} else {
-					sectionHeader.querySelector('.custom-header').textContent = frm.doc.gastgeberin;
-				}
-				frm.set_df_property('versand_gastgeberin', 'label', `Versand für ${frm.doc.gastgeberin} an:`);
+		let orders = data.orders || [];
+		if (orders.length > 0) {
+			frappe.msgprint({
+				title: __("Erfolgreich gebuchte Präsentation"),
+				message: __("{0} Aufträge wurden erfolgreich erstellt und eingereicht.<br><br>Das Fenster wird gleich automatisch neu geladen, um den aktuellen Status anzuzeigen.", [orders.length]),
+				indicator: "green"
 			});
+			setTimeout(function() {
+				location.reload();
+			}, 3500);
+		} else {
+			frappe.msgprint({
+				title: __("Hinweis"),
+				message: __("Es wurden keine Aufträge erstellt. Bitte überprüfen Sie, ob Produkte ausgewählt wurden."),
+				indicator: "orange"
+			});
+			frm.reload_doc();
 		}
-	}
+	};
 	
-	// Dann für jeden Kunden
-	for (let i = 1; i <= frm.doc.kunden.length; i++) {
-		if (i > 15) break; // Maximale Anzahl von Tabs
-		
-		let kundeRow = frm.doc.kunden[i-1];
-		if (!kundeRow || !kundeRow.kunde) continue;
-		
-		// Finde den entsprechenden Section-Header im DOM
-		let sectionId = `produktauswahl_für_gast_${i}_section`;
-		let sectionHeader = document.querySelector(`[data-fieldname="${sectionId}"] .section-head`);
+	frm._buchungError = function(data) {
+		if (!data || data.party !== party) return;
+		beendeBuchungsVerfolgung(frm);
+		frappe.hide_progress();
 		
-		if (sectionHeader) {
-			// Hole den echten Kundennamen asynchron
-			frappe.db.get_doc('Customer', kundeRow.kunde).then(customer_doc => {
-				let kundenName = customer_doc.customer_name || kundeRow.kunde;
-				// Wende den Stil direkt auf das Kopfelement an, anstatt den innerHTML zu ersetzen
-				sectionHeader.style.fontWeight = "500";
-				sectionHeader.style.fontSize = "1em";
-				sectionHeader.style.color = "#6C7680";
-				// Prüfe, ob wir bereits einen angepassten Header haben
-				if (!sectionHeader.querySelector('.custom-header')) {
-					// Erstelle einen neuen Inhalt mit einem benutzerdefinierten span
-					sectionHeader.innerHTML = `Produktauswahl für <span class="custom-header" style="font-weight: 600; color: #1F272E;">${kundenName}</span>`;
-				} else {
-					// Aktualisiere nur den Text des benutzerdefinierten Spans
-					sectionHeader.querySelector('.custom-header').textContent = kundenName;
-				}
-				// Auch das Label für das Versand-Dropdown anpassen
-				frm.set_df_property(`versand_gast_${i}`, 'label', `Versand für ${kundenName} an:`);
-			});
-		}
-	}
+		frappe.msgprint({
+			title: __("Fehler"),
+			message: __("Es ist ein Fehler beim Erstellen der Aufträge aufgetreten.") + "<br><br>" + __("Fehlermeldung: {0}", [data.error || ""]),
+			indicator: "red"
+		});
+		frm.reload_doc();
+	};
+	
+	frappe.realtime.on("party_booking_progress", frm._buchungProgress);
+	frappe.realtime.on("party_booking_done", frm._buchungDone);
+	frappe.realtime.on("party_booking_error", frm._buchungError);
+}
+
+function beendeBuchungsVerfolgung(frm) {
+	if (frm._buchungProgress) frappe.realtime.off("party_booking_progress", frm._buchungProgress);
+	if (frm._buchungDone) frappe.realtime.off("party_booking_done", frm._buchungDone);
+	if (frm._buchungError) frappe.realtime.off("party_booking_error", frm._buchungError);
+	frm._buchungProgress = frm._buchungDone = frm._buchungError = null;
+}
+
+// Funktion zum Aktualisieren der benutzerdefinierten Überschriften
+function updateCustomHeaders(frm) {
+	if (!frm.doc.gastgeberin) return;
+	
+	// Label für das Versand-Dropdown der Gastgeberin mit dem echten Kundennamen
+	// (die Versandziele der Gäste stehen direkt in der Gästeliste)
+	frappe.db.get_value('Customer', frm.doc.gastgeberin, 'customer_name').then(r => {
+		let kundenName = (r.message && r.message.customer_name) || frm.doc.gastgeberin;
+		frm.set_df_property('versand_gastgeberin', 'label', `Versand für ${kundenName} an:`);
+	}).catch(error => {
+		// Falls der Customer nicht gefunden wird, verwende die ID als Fallback
+		console.log("Konnte Customer für Gastgeberin nicht laden:", error);
+		frm.set_df_property('versand_gastgeberin', 'label', `Versand für ${frm.doc.gastgeberin} an:`);
+	});
+}
+
+// Filter für die Teilnehmer-Spalte der Produkttabelle und die Versandziele der Gäste:
+// nur Personen, die an der Party teilnehmen
+function updateTeilnehmerFilter(frm) {
+	frm.set_query("teilnehmer", "produktauswahl", function() {
+		return { filters: [["name", "in", getTeilnehmer(frm)]] };
+	});
+	frm.set_query("versand_zu", "kunden", function() {
+		return { filters: [["name", "in", getTeilnehmer(frm)]] };
+	});
 }
 
 // Funktion zum Aktualisieren der Kunden-Filter
@@ -1605,6 +1524,20 @@ frappe.ui.form.on('Party', {
 		// Deaktiviere Pflichtfelder für normales Speichern
 		disableRequiredFields(frm);
 
+		// Läuft gerade eine Buchung im Hintergrund? Dann Fortschritt weiter anzeigen
+		if (frm.doc.booking_job_id && !frm._buchungProgress) {
+			frappe.call({
+				method: "enjo_party.enjo_party.doctype.party.party.get_party_booking_status",
+				args: { party: frm.doc.name },
+				callback: function(r) {
+					if (r.message && r.message.running) {
+						verfolgeBuchungsJob(frm);
+						frappe.show_progress(__("Buche Präsentation"), 0, 1, __("Buchung läuft im Hintergrund..."));
+					}
+				}
+			});
+		}
+
 		// Wenn das Dokument gebucht ist, zeige den Kundennamen statt der ID für die Gastgeberin
 		if (frm.doc.docstatus === 1 && frm.doc.gastgeberin) {
 			frappe.db.get_value('Customer', frm.doc.gastgeberin, 'customer_name')
@@ -1630,41 +1563,28 @@ frappe.ui.form.on('Party', {
 		}
 		// Rest des bestehenden refresh-Codes...
 
-		// Zeige die Produktauswahl-Tabellen für die Gäste erst nach dem Speichern
-		// Alle Gäste-Tabellen werden im Neu-Modus ausgeblendet
-		for (let i = 1; i <= 15; i++) {
-			// Nur anzeigen, wenn das Dokument gespeichert ist UND genügend Gäste vorhanden sind
-			frm.toggle_display(
-				`produktauswahl_für_gast_${i}_section`, 
-				!frm.is_new() && frm.doc.kunden && frm.doc.kunden.length >= i
-			);
-		}
-		
-		// Zeige Gastgeberin-Produktauswahl nur an, wenn eine Gastgeberin eingetragen und das Dokument gespeichert ist
+		// Zeige die Produktauswahl erst nach dem Speichern und wenn eine Gastgeberin eingetragen ist
 		frm.toggle_display(
-			"produktauswahl_für_gastgeberin_section", 
+			"produktauswahl_section", 
 			!frm.is_new() && frm.doc.gastgeberin
 		);
+		
+		merkeTeilnehmer(frm);
+		updateTeilnehmerFilter(frm);
 
-		// Automatisch leere Zeilen zu sichtbaren, leeren Produkttabellen hinzufügen
+		// Automatisch eine leere Zeile für jeden Teilnehmer ohne Produkte hinzufügen
 		setTimeout(() => {
-			// Für Gastgeberin-Tabelle
-			if (!frm.is_new() && frm.doc.gastgeberin) {
-				if (!frm.doc.produktauswahl_für_gastgeberin || frm.doc.produktauswahl_für_gastgeberin.length === 0) {
-					let row = frm.add_child('produktauswahl_für_gastgeberin');
-					frm.refresh_field('produktauswahl_für_gastgeberin');
-				}
-			}
+			if (frm.is_new() || frm.doc.docstatus !== 0) return;
 			
-			// Für Gäste-Tabellen
-			for (let i = 1; i <= 15; i++) {
-				if (!frm.is_new() && frm.doc.kunden && frm.doc.kunden.length >= i) {
-					let field_name = `produktauswahl_für_gast_${i}`;
-					if (!frm.doc[field_name] || frm.doc[field_name].length === 0) {
-						let row = frm.add_child(field_name);
-						frm.refresh_field(field_name);
-					}
+			let hinzugefuegt = false;
+			getTeilnehmer(frm).forEach(teilnehmer => {
+				if (getProdukteFuer(frm, teilnehmer).length === 0) {
+					frm.add_child('produktauswahl', { teilnehmer: teilnehmer });
+					hinzugefuegt = true;
 				}
+			});
+			if (hinzugefuegt) {
+				frm.refresh_field('produktauswahl');
 			}
 		}, 100);
 
@@ -1673,17 +1593,6 @@ frappe.ui.form.on('Party', {
 			updateCustomHeaders(frm);
 		}, 500);
 		
-		// Verstecke das Datum-Feld auch in der Gastgeberin-Tabelle
-		if (frm.fields_dict["produktauswahl_für_gastgeberin"]) {
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('delivery_date', 'hidden', 1);
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('delivery_date', 'reqd', 0);
-			// Verstecke auch das Warehouse-Feld
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('warehouse', 'hidden', 1);
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('warehouse', 'reqd', 0);
-			// Mache das Preisfeld schreibgeschützt
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('rate', 'read_only', 1);
-		}
-		
 		// Sammle alle Namen: Gastgeberin, Partnerin, Gäste
 		let optionen = [];
 		let promises = [];
@@ -1729,11 +1638,6 @@ frappe.ui.form.on('Party', {
 				))
 			);
 
-			for (let i = 1; i <= 15; i++) {
-				if (frm.fields_dict[`versand_gast_${i}`]) { // Nur wenn das Feld existiert
-					frm.set_df_property(`versand_gast_${i}`, 'options', uniqueOptionen);
-				}
-			}
 			if (frm.fields_dict['versand_gastgeberin']) { // Nur wenn das Feld existiert
 				frm.set_df_property('versand_gastgeberin', 'options', uniqueOptionen);
 			}
@@ -1745,13 +1649,6 @@ frappe.ui.form.on('Party', {
 					if (frm.fields_dict['versand_gastgeberin'] && frm.doc.versand_gastgeberin) {
 						felderZuPruefen.push('versand_gastgeberin');
 					}
-					for (let k = 1; k <= 15; k++) {
-						const feldNameLoop = `versand_gast_${k}`;
-						// Prüfe, ob das Feld im Formular definiert ist UND einen Wert im Dokument hat
-						if (frm.fields_dict[feldNameLoop] && frm.doc[feldNameLoop]) {
-							felderZuPruefen.push(feldNameLoop);
-						}
-					}
 
 					felderZuPruefen.forEach(feldName => {
 						const kundenId = frm.doc[feldName];
@@ -1789,85 +1686,15 @@ frappe.ui.form.on('Party', {
 			}
 		});
 		
-		// Verstecke das Datum-Feld in allen Produktauswahl-Tabellen und setze Item-Filter
-		for (let i = 1; i <= 15; i++) {
-			const fieldName = `produktauswahl_für_gast_${i}`;
-			if (frm.fields_dict[fieldName]) {
-				// Verstecke das Datum-Feld in der Tabelle (damit kein Kalender erscheint)
-				frm.fields_dict[fieldName].grid.update_docfield_property('delivery_date', 'hidden', 1);
-				frm.fields_dict[fieldName].grid.update_docfield_property('delivery_date', 'reqd', 0);
-				// Verstecke auch das Warehouse-Feld
-				frm.fields_dict[fieldName].grid.update_docfield_property('warehouse', 'hidden', 1);
-				frm.fields_dict[fieldName].grid.update_docfield_property('warehouse', 'reqd', 0);
-				// Mache das Preisfeld schreibgeschützt
-				frm.fields_dict[fieldName].grid.update_docfield_property('rate', 'read_only', 1);
-				
-				// Automatische Spaltenbreiten - CSS-Regeln entfernt
-				// Zusätzlich: Verstecke die Spalten per CSS (robustere Methode)
-				setTimeout(() => {
-					$(frm.wrapper).find(`[data-fieldname="${fieldName}"] .grid-body .data-row .col[data-fieldname="delivery_date"]`).hide();
-					$(frm.wrapper).find(`[data-fieldname="${fieldName}"] .grid-body .data-row .col[data-fieldname="warehouse"]`).hide();
-					$(frm.wrapper).find(`[data-fieldname="${fieldName}"] .grid-heading-row .col[data-fieldname="delivery_date"]`).hide();
-					$(frm.wrapper).find(`[data-fieldname="${fieldName}"] .grid-heading-row .col[data-fieldname="warehouse"]`).hide();
-					
-					// Mache die Artikel-Code Spalte breiter
-					// $(frm.wrapper).find(`[data-fieldname="${fieldName}"] .grid-heading-row .col[data-fieldname="item_code"]`).css('width', '300px');
-					// $(frm.wrapper).find(`[data-fieldname="${fieldName}"] .grid-body .data-row .col[data-fieldname="item_code"]`).css('width', '300px');
-				}, 500);
-				
-				// Setze Standard-Spaltenbreiten wie in der manuellen Konfiguration
-				if (frm.fields_dict[fieldName].grid) {
-					// Spaltenbreiten entfernt - lasse Frappe automatisch wählen  
-					// frm.fields_dict[fieldName].grid.update_docfield_property('item_code', 'columns', 4);
-					// frm.fields_dict[fieldName].grid.update_docfield_property('qty', 'columns', 1);
-					// frm.fields_dict[fieldName].grid.update_docfield_property('rate', 'columns', 2);
-					// frm.fields_dict[fieldName].grid.update_docfield_property('amount', 'columns', 2);
+		// Setze Filter für Item-Auswahl (nur Sales Items, nicht disabled)
+		frm.set_query("item_code", "produktauswahl", function() {
+			return {
+				filters: {
+					'is_sales_item': 1,
+					'disabled': 0
 				}
-				
-				// Setze Filter für Item-Auswahl (nur Sales Items, nicht disabled)
-				if (frm.fields_dict[fieldName].grid.get_field('item_code')) {
-						frm.fields_dict[fieldName].grid.get_field('item_code').get_query = function() {
-							return {
-								filters: {
-									'is_sales_item': 1,
-									'disabled': 0
-								}
-							};
-						};
-					}
-			}
-		}
-		
-		// Auch für die Gastgeberin-Tabelle
-		if (frm.fields_dict["produktauswahl_für_gastgeberin"]) {
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('delivery_date', 'hidden', 1);
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('delivery_date', 'reqd', 0);
-			// Verstecke auch das Warehouse-Feld
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('warehouse', 'hidden', 1);
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('warehouse', 'reqd', 0);
-			// Mache das Preisfeld schreibgeschützt
-			frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('rate', 'read_only', 1);
-			
-			// Zusätzlich: Verstecke die Spalten per CSS (robustere Methode)
-			setTimeout(() => {
-				$(frm.wrapper).find('[data-fieldname="produktauswahl_für_gastgeberin"] .grid-body .data-row .col[data-fieldname="delivery_date"]').hide();
-				$(frm.wrapper).find('[data-fieldname="produktauswahl_für_gastgeberin"] .grid-body .data-row .col[data-fieldname="warehouse"]').hide();
-				$(frm.wrapper).find('[data-fieldname="produktauswahl_für_gastgeberin"] .grid-heading-row .col[data-fieldname="delivery_date"]').hide();
-				$(frm.wrapper).find('[data-fieldname="produktauswahl_für_gastgeberin"] .grid-heading-row .col[data-fieldname="warehouse"]').hide();
-			}, 500);
-			
-			// Setze Filter für Item-Auswahl
-			if (frm.fields_dict["produktauswahl_für_gastgeberin"].grid.get_field('item_code')) {
-				frm.fields_dict["produktauswahl_für_gastgeberin"].grid.get_field('item_code').get_query = function() {
-					return {
-						filters: {
-							'is_sales_item': 1,
-							'disabled': 0
-						}
-					};
-				};
-			}
-		}
+			};
+		});
 		
 		// Standard-Submit-Button ausblenden - aber nur wenn nicht im Neu-Modus
 		if (!frm.is_new() && frm.page && frm.page.btn_primary) {
@@ -2027,16 +1854,21 @@ frappe.ui.form.on('Party', {
 		if (frm.doc.gastgeberin) {
 			// Aktualisiere das Label für die Gastgeberin
 			frm.set_df_property('versand_gastgeberin', 'label', `Versand für ${frm.doc.gastgeberin} an:`);
-			
-			for (let i = 1; i <= 15; i++) {
-				// Immer die Gastgeberin als Versandziel setzen
-				frm.set_value(`versand_gast_${i}`, frm.doc.gastgeberin);
-			}
-			
+
+			// Immer die Gastgeberin als Versandziel für alle Gäste setzen
+			(frm.doc.kunden || []).forEach(function(row) {
+				frappe.model.set_value(row.doctype, row.name, 'versand_zu', frm.doc.gastgeberin);
+			});
+
 			// Auch für die Gastgeberin selbst
 			frm.set_value('versand_gastgeberin', frm.doc.gastgeberin);
 		}
-		
+
+		// Produkte der bisherigen Gastgeberin übernehmen
+		uebertrageProdukte(frm, frm._teilnehmerStand && frm._teilnehmerStand.gastgeberin, frm.doc.gastgeberin);
+		merkeTeilnehmer(frm);
+		updateTeilnehmerFilter(frm);
+
 		// Header-Updates mit minimaler Verzögerung
 		setTimeout(() => {
 			updateCustomHeaders(frm);
@@ -2066,9 +1898,6 @@ frappe.ui.form.on('Party', {
 		}
 		
 		Promise.all(promises).then(() => {
-			for (let i = 1; i <= 15; i++) {
-				frm.set_df_property(`versand_gast_${i}`, 'options', optionen);
-			}
 			frm.set_df_property('versand_gastgeberin', 'options', optionen);
 		});
 	},
@@ -2157,10 +1986,15 @@ frappe.ui.form.on('Party', {
 		}, 100);
 	},
 	kunden_remove: function(frm) {
+		// Produkte entfernter Gäste verwerfen
+		entferneVerwaisteProdukte(frm);
+		merkeTeilnehmer(frm);
+
 		// SOFORTIGE Filter-Aktualisierung
 		updateKundenFilter(frm);
 		updateGastgeberinFilter(frm);
-		
+		updateTeilnehmerFilter(frm);
+
 		// Header-Updates mit minimaler Verzögerung
 		setTimeout(() => {
 			updateCustomHeaders(frm);
@@ -2172,21 +2006,26 @@ frappe.ui.form.on('Party', {
 frappe.ui.form.on('Party Kunde', {
 	kunde: function(frm, cdt, cdn) {
 		let row = locals[cdt][cdn];
-		let idx = row.idx;
-		
+
 		// SOFORTIGE Validierung auf Duplikate
 		if (!validateKundenDuplicates(frm, row)) {
 			return; // Stoppe hier, wenn Duplikat gefunden
 		}
-		
-		// Sofort das Versand-Label aktualisieren
-		if (row.kunde) {
-			frm.set_df_property(`versand_gast_${idx}`, 'label', `Versand für ${row.kunde} an:`);
+
+		// Produkte des bisherigen Gastes dieser Zeile übernehmen
+		let alterKunde = frm._teilnehmerStand && frm._teilnehmerStand.kunden[row.name];
+		uebertrageProdukte(frm, alterKunde, row.kunde);
+
+		// Standard-Versandziel ist die Gastgeberin
+		if (row.kunde && !row.versand_zu && frm.doc.gastgeberin) {
+			frappe.model.set_value(cdt, cdn, 'versand_zu', frm.doc.gastgeberin);
 		}
-		
+		merkeTeilnehmer(frm);
+
 		// SOFORTIGE Filter-Aktualisierung (ohne Verzögerung)
 		updateKundenFilter(frm);
 		updateGastgeberinFilter(frm);
+		updateTeilnehmerFilter(frm);
 		
 		// Header-Updates mit minimaler Verzögerung
 		setTimeout(() => {
@@ -2212,8 +2051,8 @@ frappe.ui.form.on('Party Kunde', {
 	}
 });
 
-// Event-Handler für Sales Order Item - Nur Menge automatisch auf 1 setzen
-frappe.ui.form.on('Sales Order Item', {
+// Event-Handler für Party Produkt - Nur Menge automatisch auf 1 setzen
+frappe.ui.form.on('Party Produkt', {
 	item_code: function(frm, cdt, cdn) {
 		let row = locals[cdt][cdn];
 		if (row.item_code && !row.qty) {
@@ -2226,7 +2065,6 @@ frappe.ui.form.on('Sales Order Item', {
 					frappe.model.set_value(cdt, cdn, 'uom', item_doc.stock_uom);
 					frappe.model.set_value(cdt, cdn, 'stock_uom', item_doc.stock_uom);
 					frappe.model.set_value(cdt, cdn, 'conversion_factor', 1.0);
-					frappe.model.set_value(cdt, cdn, 'uom_conversion_factor', 1.0);
 					
 					// Item Name setzen
 					if (!row.item_name) {
@@ -2350,30 +2188,14 @@ function update_all_empty_prices(frm) {
 			}
 			console.log("Schutz für Aktionsartikel-Codes:", aktionsCodes);
 			
-			// Für jede Produkttabelle durchgehen
-			for (let i = 1; i <= 15; i++) {
-				const field_name = `produktauswahl_für_gast_${i}`;
-				if (frm.doc[field_name] && frm.doc[field_name].length > 0) {
-					frm.doc[field_name].forEach(function(item) {
-						// WICHTIG: Nicht überschreiben, wenn es ein Gutschein-reduzierter Artikel oder Aktionsartikel ist!
-						let istAktionsartikel = aktionsCodes.includes(item.item_code);
-						if (item.item_code && (!item.rate || item.rate == 0) && !item._gutschein_angewendet && !istAktionsartikel) {
-							get_item_price(frm, item);
-						}
-					});
+			// Alle Produkte aller Teilnehmer durchgehen
+			(frm.doc.produktauswahl || []).forEach(function(item) {
+				// WICHTIG: Nicht überschreiben, wenn es ein Gutschein-reduzierter Artikel oder Aktionsartikel ist!
+				let istAktionsartikel = aktionsCodes.includes(item.item_code);
+				if (item.item_code && (!item.rate || item.rate == 0) && !item._gutschein_angewendet && !istAktionsartikel) {
+					get_item_price(frm, item);
 				}
-			}
-			
-			// Auch für die Gastgeberin-Tabelle
-			if (frm.doc.produktauswahl_für_gastgeberin && frm.doc.produktauswahl_für_gastgeberin.length > 0) {
-				frm.doc.produktauswahl_für_gastgeberin.forEach(function(item) {
-					// WICHTIG: Nicht überschreiben, wenn es ein Gutschein-reduzierter Artikel oder Aktionsartikel ist!
-					let istAktionsartikel = aktionsCodes.includes(item.item_code);
-					if (item.item_code && (!item.rate || item.rate == 0) && !item._gutschein_angewendet && !istAktionsartikel) {
-						get_item_price(frm, item);
-					}
-				});
-			}
+			});
 		}
 	});
 }
@@ -2382,28 +2204,14 @@ function update_all_empty_prices(frm) {
 function calculate_party_totals(frm) {
 	let total_amount = 0.0;
 	
-	// Berechne Gesamtumsatz aus allen Produkttabellen
+	// Berechne Gesamtumsatz aus der Produkttabelle aller Teilnehmer
 	// HINWEIS: Versandkosten werden NICHT hier berechnet, sondern automatisch 
 	// beim Erstellen der Aufträge basierend auf der neuen 7-Artikel-Versandlogik hinzugefügt
-	for (let i = 1; i <= 15; i++) {
-		const field_name = `produktauswahl_für_gast_${i}`;
-		if (frm.doc[field_name] && frm.doc[field_name].length > 0) {
-			frm.doc[field_name].forEach(function(item) {
-				if (item.qty && item.rate) {
-					total_amount += flt(item.qty) * flt(item.rate);
-				}
-			});
+	(frm.doc.produktauswahl || []).forEach(function(item) {
+		if (item.qty && item.rate) {
+			total_amount += flt(item.qty) * flt(item.rate);
 		}
-	}
-	
-	// Auch Gastgeberin-Tabelle berücksichtigen
-	if (frm.doc.produktauswahl_für_gastgeberin && frm.doc.produktauswahl_für_gastgeberin.length > 0) {
-		frm.doc.produktauswahl_für_gastgeberin.forEach(function(item) {
-			if (item.qty && item.rate) {
-				total_amount += flt(item.qty) * flt(item.rate);
-			}
-		});
-	}
+	});
 	
 	// Setze Gesamtumsatz NUR wenn wir nicht in der Aufträge-Erstellung sind
 	// (um Gutschrift-reduzierten Gesamtumsatz zu bewahren)
@@ -2443,50 +2251,21 @@ function calculate_gutschein_value(total_amount) {
 }
 
 // Neue Hilfsfunktionen zum Aktivieren/Deaktivieren der Pflichtfelder
-function disableRequiredFields(frm) {
-	// Für Gastgeberin-Tabelle
-	if (frm.fields_dict["produktauswahl_für_gastgeberin"]) {
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('item_code', 'reqd', 0);
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('item_name', 'reqd', 0);
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('qty', 'reqd', 0);
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('uom', 'reqd', 0);
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('conversion_factor', 'reqd', 0);
-	}
+function setProduktPflichtfelder(frm, reqd) {
+	let grid = frm.fields_dict["produktauswahl"] && frm.fields_dict["produktauswahl"].grid;
+	if (!grid) return;
 
-	// Für alle Gäste-Tabellen
-	for (let i = 1; i <= 15; i++) {
-		let fieldName = `produktauswahl_für_gast_${i}`;
-		if (frm.fields_dict[fieldName]) {
-			frm.fields_dict[fieldName].grid.update_docfield_property('item_code', 'reqd', 0);
-			frm.fields_dict[fieldName].grid.update_docfield_property('item_name', 'reqd', 0);
-			frm.fields_dict[fieldName].grid.update_docfield_property('qty', 'reqd', 0);
-			frm.fields_dict[fieldName].grid.update_docfield_property('uom', 'reqd', 0);
-			frm.fields_dict[fieldName].grid.update_docfield_property('conversion_factor', 'reqd', 0);
-		}
-	}
+	['item_code', 'item_name', 'qty', 'uom', 'conversion_factor'].forEach(function(fieldname) {
+		grid.update_docfield_property(fieldname, 'reqd', reqd);
+	});
 }
 
-function enableRequiredFields(frm) {
-	// Für Gastgeberin-Tabelle
-	if (frm.fields_dict["produktauswahl_für_gastgeberin"]) {
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('item_code', 'reqd', 1);
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('item_name', 'reqd', 1);
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('qty', 'reqd', 1);
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('uom', 'reqd', 1);
-		frm.fields_dict["produktauswahl_für_gastgeberin"].grid.update_docfield_property('conversion_factor', 'reqd', 1);
-	}
+function disableRequiredFields(frm) {
+	setProduktPflichtfelder(frm, 0);
+}
 
-	// Für alle Gäste-Tabellen
-	for (let i = 1; i <= 15; i++) {
-		let fieldName = `produktauswahl_für_gast_${i}`;
-		if (frm.fields_dict[fieldName]) {
-			frm.fields_dict[fieldName].grid.update_docfield_property('item_code', 'reqd', 1);
-			frm.fields_dict[fieldName].grid.update_docfield_property('item_name', 'reqd', 1);
-			frm.fields_dict[fieldName].grid.update_docfield_property('qty', 'reqd', 1);
-			frm.fields_dict[fieldName].grid.update_docfield_property('uom', 'reqd', 1);
-			frm.fields_dict[fieldName].grid.update_docfield_property('conversion_factor', 'reqd', 1);
-		}
-	}
+function enableRequiredFields(frm) {
+	setProduktPflichtfelder(frm, 1);
 }
 // Neue Funktion zur Warehouse-Korrektur vor dem Speichern
 function fixAllWarehouses(frm) {
@@ -1,15 +1,23 @@
 # Copyright (c) 2025, Elia and contributors
 # For license information, please see license.txt
 
+import hashlib
+import json
+
 import frappe
 from frappe.model.document import Document
 from frappe.utils import flt, today
 
+from enjo_party.enjo_party.utils import logger
+from enjo_party.enjo_party.utils.picklist import begin_party_buchung, create_picklist, end_party_buchung, get_picklist_index
+
 
 class Party(Document):
 	def before_save(self):
 		# Entferne alle komplett leeren Zeilen aus den Produkttabellen BEVOR alles andere passiert
-		self.remove_empty_product_rows()
+		# (bereits in validate erledigt, falls process_produktauswahl gelaufen ist)
+		if not self.flags.produkte_verarbeitet:
+			self.remove_empty_product_rows()
 		
 		# Wenn es ein neues Dokument ist, wird der Name erst nach dem Speichern generiert
 		if self.is_new():
@@ -21,107 +29,237 @@ class Party(Document):
 
 	def remove_empty_product_rows(self):
 		"""
-		Entferne alle komplett leeren Zeilen aus den Produkttabellen.
+		Entferne alle komplett leeren Zeilen aus der Produkttabelle.
 		Eine Zeile gilt als leer, wenn sie WEDER item_code NOCH qty > 0 hat.
 		Andere automatisch gesetzte Felder (delivery_date, warehouse, etc.) werden ignoriert.
 		"""
-		# Gastgeberin-Tabelle bereinigen
-		if hasattr(self, 'produktauswahl_für_gastgeberin') and self.produktauswahl_für_gastgeberin:
-			original_count = len(self.produktauswahl_für_gastgeberin)
-			self.produktauswahl_für_gastgeberin = [
-				row for row in self.produktauswahl_für_gastgeberin 
-				if (row.item_code and row.item_code.strip()) or (row.qty and row.qty > 0)
+		if not self.produktauswahl:
+			return
+		
+		original_count = len(self.produktauswahl)
+		self.produktauswahl = [
+			row for row in self.produktauswahl
+			if (row.item_code and row.item_code.strip()) or (row.qty and row.qty > 0)
+		]
+		removed_count = original_count - len(self.produktauswahl)
+		if removed_count > 0:
+			for idx, row in enumerate(self.produktauswahl, start=1):
+				row.idx = idx
+			logger.info("Entfernt %s leere Zeilen aus der Produkttabelle", removed_count, title="remove_empty_rows")
+	
+	def get_item_stammdaten(self):
+		"""
+		Lädt die benötigten Item-Felder aller Artikel der Produkttabelle mit einer Abfrage.
+		Das Ergebnis wird pro Dokument-Instanz gecacht.
+
+		Returns:
+			dict: {item_code: {"stock_uom", "item_name", "custom_considered_for_action", "custom_punkte"}}
+		"""
+		item_codes = {row.item_code for row in self.produktauswahl or [] if row.item_code}
+		stammdaten = self.flags.item_stammdaten or {}
+
+		fehlende = item_codes - set(stammdaten)
+		if fehlende:
+			item_meta = frappe.get_meta("Item")
+			fields = ["name", "stock_uom", "item_name"] + [
+				fieldname for fieldname in ("custom_considered_for_action", "custom_punkte")
+				if item_meta.has_field(fieldname)
 			]
-			removed_count = original_count - len(self.produktauswahl_für_gastgeberin)
-			if removed_count > 0:
-				frappe.log_error(f"Entfernt {removed_count} leere Zeilen aus Gastgeberin-Produkttabelle", "INFO: remove_empty_rows")
+			for item in frappe.get_all("Item", filters={"name": ["in", list(fehlende)]}, fields=fields):
+				stammdaten[item.name] = item
+
+		self.flags.item_stammdaten = stammdaten
+		return stammdaten
+
+	def process_produktauswahl(self, calculate_totals=True):
+		"""
+		Ein Durchlauf über die Produkttabelle statt getrennter Schleifen:
+		leere Zeilen entfernen, Zeilen mit Item-Stammdaten ergänzen, Beträge berechnen,
+		Gesamtumsatz/Gutscheinwert summieren und das Vorhandensein von Produkten für den Status merken.
+		"""
+		item_stammdaten = self.get_item_stammdaten()
+		zeilen = []
+		total_amount = 0.0
+		has_products = False
+
+		for item in self.produktauswahl or []:
+			# Komplett leere Zeilen (weder item_code noch qty > 0) verwerfen
+			if not ((item.item_code and item.item_code.strip()) or (item.qty and item.qty > 0)):
+				continue
+
+			item.idx = len(zeilen) + 1
+			zeilen.append(item)
+
+			if item.item_code:
+				self.normalize_product_row(item, item_stammdaten.get(item.item_code) or {})
+				if item.qty:
+					has_products = True
+
+			if item.qty and item.rate:
+				total_amount += flt(item.qty) * flt(item.rate)
+
+		removed_count = len(self.produktauswahl or []) - len(zeilen)
+		if removed_count > 0:
+			self.produktauswahl = zeilen
+			logger.info("Entfernt %s leere Zeilen aus der Produkttabelle", removed_count, title="remove_empty_rows")
+
+		# Berechne Gesamtumsatz und Gutscheinwert NUR wenn nicht in Aufträge-Erstellung
+		if calculate_totals:
+			self.gesamtumsatz = total_amount
+			self.gastgeber_gutschein_wert = self.calculate_gutschein_value(total_amount)
+
+		# Status wird erst in before_save gesetzt (validate_all_guests_have_products prüft noch den alten Status)
+		self.flags.hat_produkte = has_products
+		self.flags.produkte_verarbeitet = True
+
+	def normalize_product_row(self, item, item_doc):
+		"""Setzt UOM, Item Name, Lieferdatum und Beträge einer Produktzeile"""
+		# Immer explizit den UOM setzen
+		item.uom = item.uom or item_doc.get("stock_uom") or "Nos"
+		item.stock_uom = item_doc.get("stock_uom")
+
+		# Falls Item Name fehlt
+		if not item.item_name:
+			item.item_name = item_doc.get("item_name") or item.item_code
+
+		# WICHTIG: Normalisiere delivery_date Format für Datenbank-Kompatibilität
+		if item.delivery_date:
+			try:
+				# Konvertiere ISO-String zu Date-Objekt falls nötig
+				item.delivery_date = frappe.utils.getdate(item.delivery_date)
+			except Exception as e:
+				# Fallback bei Parse-Fehlern
+				logger.warn(f"Delivery Date Parse Fehler für {item.item_code}: {str(e)}", title="delivery_date_parse")
+				item.delivery_date = frappe.utils.getdate(frappe.utils.add_days(frappe.utils.today(), 7))
+
+		# Weitere erforderliche Standardfelder für den Auftrag setzen
+		if not item.conversion_factor:
+			item.conversion_factor = 1.0
+		if not item.stock_qty:
+			item.stock_qty = flt(item.qty) * flt(item.conversion_factor)
+
+		# Berechne den Betrag (amount = qty * rate)
+		if item.qty and item.rate:
+			item.amount = flt(item.qty) * flt(item.rate)
+			item.base_amount = item.amount
+
+	def get_produkt_hash(self):
+		"""
+		Inhalts-Hash über alles, was Summen, Status und Adressprüfung beeinflusst:
+		Produktzeilen, Teilnehmer und Versandziele.
+		Der Status selbst gehört nicht dazu - set_status leitet ihn erst in before_save (nach dem Speichern
+		des Hashs) aus den Produkten ab, sonst gälte jede Party beim nächsten Speichern als geändert.
+		"""
+		inhalt = {
+			"gastgeberin": self.gastgeberin,
+			"versand_gastgeberin": self.versand_gastgeberin,
+			"kunden": [(row.kunde, row.versand_zu) for row in self.kunden or []],
+			"produkte": [
+				(
+					row.teilnehmer, row.item_code, row.item_name, flt(row.qty), flt(row.rate),
+					row.uom, flt(row.conversion_factor), str(row.delivery_date or ""), row.warehouse
+				)
+				for row in self.produktauswahl or []
+			],
+		}
+		return hashlib.sha256(json.dumps(inhalt, sort_keys=True, default=str).encode()).hexdigest()
+
+	def is_totals_frozen(self):
+		"""
+		Gesamtumsatz und Gutscheinwert nicht neu berechnen - entscheidet allein der Server:
+		während der Buchung (flags.totals_frozen) oder wenn der Gutschein bereits angewendet ist,
+		d. h. Produkte der Gastgeberin unter Listenpreis gespeichert werden.
+		"""
+		if self.flags.totals_frozen:
+			return True
+		if self.is_new():
+			return False
+		return any(
+			row.teilnehmer == self.gastgeberin and flt(row.price_list_rate) > flt(row.rate)
+			for row in self.produktauswahl or []
+		)
+
+	def get_teilnehmer(self):
+		"""Gastgeberin und alle Gäste in der Reihenfolge der Gästeliste"""
+		teilnehmer = [self.gastgeberin] if self.gastgeberin else []
+		teilnehmer += [kunde_row.kunde for kunde_row in self.kunden or [] if kunde_row.kunde]
+		return teilnehmer
+	
+	def get_produkte_nach_teilnehmer(self):
+		"""
+		Gruppiert die Produkttabelle nach Teilnehmer.
 		
-		# Gäste-Tabellen bereinigen
-		for i in range(1, 16):
-			field_name = f'produktauswahl_für_gast_{i}'
-			if hasattr(self, field_name):
-				current_table = getattr(self, field_name)
-				if current_table:
-					original_count = len(current_table)
-					cleaned_table = [
-						row for row in current_table 
-						if (row.item_code and row.item_code.strip()) or (row.qty and row.qty > 0)
-					]
-					setattr(self, field_name, cleaned_table)
-					removed_count = original_count - len(cleaned_table)
-					if removed_count > 0:
-						frappe.log_error(f"Entfernt {removed_count} leere Zeilen aus {field_name}", "INFO: remove_empty_rows")
+		Returns:
+			dict: {teilnehmer: [Party Produkt Zeilen]}
+		"""
+		produkte = {}
+		for row in self.produktauswahl or []:
+			produkte.setdefault(row.teilnehmer, []).append(row)
+		return produkte
 
 	def after_insert(self):
 		# Nach dem Einfügen den party_name auf den generierten Namen setzen
 		self.db_set("party_name", self.name, update_modified=False)
 		
 	def validate(self):
-		frappe.log_error(f"=== VALIDATE START für {self.name} - skip_flag: {getattr(self, 'skip_total_calculation', False)} ===", "DEBUG: validate_start")
-		
-		# NEUE LOGIK: Prüfe globalen Flag über frappe.local.flags
-		# Dieser wird durch JavaScript-Speichern NICHT überschrieben
-		skip_calculation = getattr(self, 'skip_total_calculation', False) or frappe.local.flags.get('skip_party_total_calculation', False)
-		frappe.log_error(f"=== ERWEITERTE PRÜFUNG für {self.name} - dokument_flag: {getattr(self, 'skip_total_calculation', False)}, global_flag: {frappe.local.flags.get('skip_party_total_calculation', False)}, final_skip: {skip_calculation} ===", "DEBUG: validate_flags")
+		# Eingefrorene Summen während der Aufträge-Erstellung (Schutz für Gutschrift-reduzierte Preise)
+		totals_frozen = self.is_totals_frozen()
 		
-		# Stelle sicher, dass UOM Conversion Factor in allen Produkttabellen gesetzt ist
-		frappe.log_error("Starte set_uom_conversion_factor", "DEBUG: validate_step")
-		self.set_uom_conversion_factor()
-		frappe.log_error("set_uom_conversion_factor abgeschlossen", "DEBUG: validate_step")
+		# Dirty-Tracking: Produkte, Teilnehmer und Versandziele seit dem letzten Speichern unverändert?
+		produkt_hash = self.get_produkt_hash()
+		unveraendert = not self.is_new() and produkt_hash == self.produkt_hash
+		logger.debug("=== VALIDATE START für %s - totals_frozen: %s, unveraendert: %s ===", self.name, totals_frozen, unveraendert, title="validate_start")
 		
-		# Berechne Gesamtumsatz und Gutscheinwert NUR wenn nicht in Aufträge-Erstellung
-		# (Schutz für Gutschrift-reduzierte Preise)
-		if not skip_calculation:
-			frappe.log_error("Starte calculate_totals", "DEBUG: validate_step")
-			self.calculate_totals()
-			frappe.log_error("calculate_totals abgeschlossen", "DEBUG: validate_step")
+		# Ein Durchlauf über alle Produkte: leere Zeilen, UOM/Item-Daten, Beträge, Summen und Status
+		# Gesamtumsatz und Gutscheinwert NUR wenn nicht in Aufträge-Erstellung
+		if not unveraendert:
+			logger.debug("Starte process_produktauswahl (calculate_totals=%s)", not totals_frozen, title="validate_step")
+			self.process_produktauswahl(calculate_totals=not totals_frozen)
+			logger.debug("process_produktauswahl abgeschlossen", title="validate_step")
 		else:
-			frappe.log_error("calculate_totals übersprungen (skip_flag gesetzt)", "DEBUG: validate_step")
+			logger.debug("process_produktauswahl übersprungen (Produkte unverändert)", title="validate_step")
 		
 		# Prüfe, dass die Gastgeberin nicht auch als Gast in der Kundenliste steht
-		frappe.log_error("Starte validate_gastgeberin_not_in_kunden", "DEBUG: validate_step")
+		logger.debug("Starte validate_gastgeberin_not_in_kunden", title="validate_step")
 		self.validate_gastgeberin_not_in_kunden()
-		frappe.log_error("validate_gastgeberin_not_in_kunden abgeschlossen", "DEBUG: validate_step")
+		logger.debug("validate_gastgeberin_not_in_kunden abgeschlossen", title="validate_step")
 		
 		# NEUE ADRESSVALIDIERUNG: Prüfe alle Adressen VOR der Produktvalidierung
-		# ABER NUR wenn nicht in Aufträge-Erstellung (skip_total_calculation Flag)
-		if not skip_calculation:
-			frappe.log_error("Starte validate_all_addresses", "DEBUG: validate_step")
+		# ABER NUR wenn sich Teilnehmer geändert haben und nicht in Aufträge-Erstellung
+		if not totals_frozen and not unveraendert:
+			logger.debug("Starte validate_all_addresses", title="validate_step")
 			self.validate_all_addresses()
-			frappe.log_error("validate_all_addresses abgeschlossen", "DEBUG: validate_step")
+			logger.debug("validate_all_addresses abgeschlossen", title="validate_step")
 		else:
-			frappe.log_error("validate_all_addresses übersprungen (skip_flag gesetzt)", "DEBUG: validate_step")
+			logger.debug("validate_all_addresses übersprungen (unverändert oder Summen eingefroren)", title="validate_step")
 		
 		# Prüfe, dass alle Gäste Produkte ausgewählt haben (nur wenn nicht neu UND nicht in Aufträge-Erstellung)
 		# (Schutz für Aktionsartikel während der Aufträge-Erstellung)
-		if not self.is_new() and not skip_calculation:
-			frappe.log_error("Starte validate_all_guests_have_products", "DEBUG: validate_step")
+		if not self.is_new() and not totals_frozen:
+			logger.debug("Starte validate_all_guests_have_products", title="validate_step")
 			self.validate_all_guests_have_products()
-			frappe.log_error("validate_all_guests_have_products abgeschlossen", "DEBUG: validate_step")
+			logger.debug("validate_all_guests_have_products abgeschlossen", title="validate_step")
 		else:
-			frappe.log_error("validate_all_guests_have_products übersprungen (neu oder skip_flag gesetzt)", "DEBUG: validate_step")
+			logger.debug("validate_all_guests_have_products übersprungen (neu oder Summen eingefroren)", title="validate_step")
+		
+		# Hash des bereinigten Stands merken, damit das nächste Speichern vergleichen kann
+		if not unveraendert:
+			self.produkt_hash = self.get_produkt_hash()
 		
-		frappe.log_error(f"=== VALIDATE ENDE für {self.name} ===", "DEBUG: validate_end")
+		logger.debug("=== VALIDATE ENDE für %s ===", self.name, title="validate_end")
 	
 	def before_submit(self):
 		"""
 		Vor dem Einreichen der Party automatisch Aufträge erstellen,
 		falls noch keine existieren
 		"""
-		# Prüfen, ob bereits Aufträge zu dieser Party existieren
-		existing_orders = frappe.get_all(
-			"Sales Order",
-			filters={"docstatus": ["!=", 2]},
-			or_filters=[
-				{"po_no": self.name},  # Versuche, in verschiedenen Feldern zu suchen
-				{"customer_name": self.name}
-			],
-			limit=1
-		)
+		# Submit aus der laufenden Buchung heraus: Aufträge werden gerade erstellt
+		if self.flags.in_party_booking:
+			return
 		
-		# Wenn bereits Aufträge existieren, keinen neuen erstellen
-		if existing_orders:
-			frappe.log_error(f"Party {self.name}: Bestehende Aufträge gefunden: {existing_orders}", "INFO: before_submit")
+		# Prüfen, ob bereits Aufträge zu dieser Party existieren (indizierter Lookup über Party Buchung)
+		if frappe.db.exists("Party Buchung", {"party": self.name, "sales_order": ["is", "set"]}):
+			logger.info("Party %s: Bestehende Aufträge gefunden", self.name, title="before_submit")
 			return
 			
 		# Aufträge erstellen beim Submit - aber ohne weitere Fehlerbehandlung
@@ -184,43 +322,23 @@ class Party(Document):
 		
 		# Sammle alle Teilnehmer ohne Produktauswahl
 		teilnehmer_ohne_produkte = []
+		produkte = self.get_produkte_nach_teilnehmer()
+		
+		def hat_produkte(kunde):
+			return any(p.item_code and p.qty and p.qty > 0 for p in produkte.get(kunde, []))
 		
 		# Prüfe Gastgeberin
-		if self.gastgeberin:
-			hat_gastgeberin_produkte = False
-			if hasattr(self, "produktauswahl_für_gastgeberin") and self.produktauswahl_für_gastgeberin:
-				for produkt in self.produktauswahl_für_gastgeberin:
-					if produkt.item_code and produkt.qty and produkt.qty > 0:
-						hat_gastgeberin_produkte = True
-						break
-			
-			if not hat_gastgeberin_produkte:
-				teilnehmer_ohne_produkte.append(f"Gastgeberin ({self.gastgeberin})")
+		if self.gastgeberin and not hat_produkte(self.gastgeberin):
+			teilnehmer_ohne_produkte.append(f"Gastgeberin ({self.gastgeberin})")
 		
 		# Prüfe alle Gäste
 		for idx, kunde_row in enumerate(self.kunden):
 			if not kunde_row.kunde:
 				continue
-				
-			index = idx + 1
-			field_name = f"produktauswahl_für_gast_{index}"
-			
-			# Prüfen ob die Tabelle existiert und Produkte enthält
-			hat_produkte = False
-			if hasattr(self, field_name) and getattr(self, field_name):
-				tabelle_inhalt = getattr(self, field_name)
-				frappe.log_error(f"Gast {index} ({kunde_row.kunde}) - Anzahl Zeilen in {field_name}: {len(tabelle_inhalt)}", "DEBUG: table_check")
-				
-				for idx_prod, produkt in enumerate(getattr(self, field_name)):
-					if produkt.item_code:
-						frappe.log_error(f"  Zeile {idx_prod}: item_code={produkt.item_code}, qty={produkt.qty}, rate={produkt.rate}", "DEBUG: row_check")
-					if produkt.item_code and produkt.qty and produkt.qty > 0:
-						hat_produkte = True
-						break
 			
-			# Wenn keine Produkte gefunden wurden, zur Liste hinzufügen
-			if not hat_produkte:
-				teilnehmer_ohne_produkte.append(f"Gast {index} ({kunde_row.kunde})")
+			logger.debug("Gast %s (%s) - Anzahl Zeilen: %s", idx + 1, kunde_row.kunde, len(produkte.get(kunde_row.kunde, [])), title="table_check")
+			if not hat_produkte(kunde_row.kunde):
+				teilnehmer_ohne_produkte.append(f"Gast {idx + 1} ({kunde_row.kunde})")
 		
 		# Wenn Teilnehmer ohne Produkte gefunden wurden, Fehlermeldung anzeigen
 		if teilnehmer_ohne_produkte:
@@ -238,22 +356,10 @@ class Party(Document):
 		if self.status == "Abgeschlossen":
 			return
 			
-		# Prüfen, ob Produkte vorhanden sind
-		has_products = False
-		
-		# Für alle Produktauswahl-Tabellen prüfen
-		for i in range(1, 16):  # 1 bis 15
-			field_name = f"produktauswahl_für_gast_{i}"
-			if hasattr(self, field_name) and getattr(self, field_name):
-				table = getattr(self, field_name)
-				if any(item.item_code and item.qty for item in table):
-					has_products = True
-					break
-		
-		# Auch Gastgeberin-Tabelle prüfen
-		if not has_products and hasattr(self, "produktauswahl_für_gastgeberin") and self.produktauswahl_für_gastgeberin:
-			if any(item.item_code and item.qty for item in self.produktauswahl_für_gastgeberin):
-				has_products = True
+		# Prüfen, ob Produkte vorhanden sind (aus process_produktauswahl, falls schon gelaufen)
+		has_products = self.flags.hat_produkte
+		if has_products is None:
+			has_products = any(item.item_code and item.qty for item in self.produktauswahl or [])
 		
 		# Status setzen basierend auf dem Vorhandensein von Produkten
 		if has_products:
@@ -261,119 +367,6 @@ class Party(Document):
 		else:
 			self.status = "Gäste"
 	
-	def set_uom_conversion_factor(self):
-		# Für alle Produktauswahl-Tabellen
-		for i in range(1, 16):  # 1 bis 15
-			field_name = f"produktauswahl_für_gast_{i}"
-			if hasattr(self, field_name) and getattr(self, field_name):
-				table = getattr(self, field_name)
-				for item in table:
-					if item.item_code:
-						# Standard-UOM und Item-Daten vom Item abfragen
-						item_doc = frappe.get_cached_doc("Item", item.item_code)
-						
-						# Immer explizit den UOM und UOM Conversion Factor setzen
-						item.uom = item.uom or item_doc.stock_uom or "Nos"
-						item.stock_uom = item_doc.stock_uom
-						item.uom_conversion_factor = 1.0
-						
-						# Falls Item Name fehlt
-						if not item.item_name:
-							item.item_name = item_doc.item_name or item.item_code
-						
-						# WICHTIG: Normalisiere delivery_date Format für Datenbank-Kompatibilität
-						if hasattr(item, 'delivery_date') and item.delivery_date:
-							try:
-								# Konvertiere ISO-String zu Date-Objekt falls nötig
-								if isinstance(item.delivery_date, str):
-									# Parse ISO-String und konvertiere zu Date
-									item.delivery_date = frappe.utils.getdate(item.delivery_date)
-								else:
-									# Stelle sicher, dass es ein Date-Objekt ist
-									item.delivery_date = frappe.utils.getdate(item.delivery_date)
-							except Exception as e:
-								# Fallback bei Parse-Fehlern
-								frappe.log_error(f"Delivery Date Parse Fehler für {item.item_code}: {str(e)}", "WARNING: delivery_date_parse")
-								item.delivery_date = frappe.utils.getdate(frappe.utils.add_days(frappe.utils.today(), 7))
-						
-						# Weitere erforderliche Standardfelder für Sales Order Item setzen
-						if not item.conversion_factor:
-							item.conversion_factor = 1.0
-						if not item.stock_qty:
-							item.stock_qty = flt(item.qty) * flt(item.conversion_factor)
-						
-						# Berechne den Betrag (amount = qty * rate)
-						if item.qty and item.rate:
-							item.amount = flt(item.qty) * flt(item.rate)
-							item.base_amount = item.amount
-		
-		# Auch für die Gastgeberin-Tabelle den UOM Conversion Factor setzen
-		if hasattr(self, "produktauswahl_für_gastgeberin") and self.produktauswahl_für_gastgeberin:
-			for item in self.produktauswahl_für_gastgeberin:
-				if item.item_code:
-					# Standard-UOM und Item-Daten vom Item abfragen
-					item_doc = frappe.get_cached_doc("Item", item.item_code)
-					
-					# Immer explizit den UOM und UOM Conversion Factor setzen
-					item.uom = item.uom or item_doc.stock_uom or "Nos"
-					item.stock_uom = item_doc.stock_uom
-					item.uom_conversion_factor = 1.0
-					
-					# Falls Item Name fehlt
-					if not item.item_name:
-						item.item_name = item_doc.item_name or item.item_code
-					
-					# WICHTIG: Normalisiere delivery_date Format für Datenbank-Kompatibilität
-					if hasattr(item, 'delivery_date') and item.delivery_date:
-						try:
-							# Konvertiere ISO-String zu Date-Objekt falls nötig
-							if isinstance(item.delivery_date, str):
-								# Parse ISO-String und konvertiere zu Date
-								item.delivery_date = frappe.utils.getdate(item.delivery_date)
-							else:
-								# Stelle sicher, dass es ein Date-Objekt ist
-								item.delivery_date = frappe.utils.getdate(item.delivery_date)
-						except Exception as e:
-							# Fallback bei Parse-Fehlern
-							frappe.log_error(f"Delivery Date Parse Fehler für {item.item_code}: {str(e)}", "WARNING: delivery_date_parse")
-							item.delivery_date = frappe.utils.getdate(frappe.utils.add_days(frappe.utils.today(), 7))
-					
-					# Weitere erforderliche Standardfelder für Sales Order Item setzen
-					if not item.conversion_factor:
-						item.conversion_factor = 1.0
-					if not item.stock_qty:
-						item.stock_qty = flt(item.qty) * flt(item.conversion_factor)
-					
-					# Berechne den Betrag (amount = qty * rate)
-					if item.qty and item.rate:
-						item.amount = flt(item.qty) * flt(item.rate)
-						item.base_amount = item.amount
-	
-	def calculate_totals(self):
-		"""Berechnet Gesamtumsatz und Gutscheinwert für die Gastgeberin"""
-		total_amount = 0.0
-		
-		# Berechne Gesamtumsatz aus allen Produkttabellen
-		for i in range(1, 16):  # 1 bis 15
-			field_name = f"produktauswahl_für_gast_{i}"
-			if hasattr(self, field_name) and getattr(self, field_name):
-				table = getattr(self, field_name)
-				for item in table:
-					if item.qty and item.rate:
-						total_amount += flt(item.qty) * flt(item.rate)
-		
-		# Auch Gastgeberin-Tabelle berücksichtigen
-		if hasattr(self, "produktauswahl_für_gastgeberin") and self.produktauswahl_für_gastgeberin:
-			for item in self.produktauswahl_für_gastgeberin:
-				if item.qty and item.rate:
-					total_amount += flt(item.qty) * flt(item.rate)
-		
-		# Setze Gesamtumsatz
-		self.gesamtumsatz = total_amount
-		
-		# Berechne Gutscheinwert basierend auf Präsentationsumsatz-Stufen
-		self.gastgeber_gutschein_wert = self.calculate_gutschein_value(total_amount)
-	
 	def calculate_gutschein_value(self, total_amount):
 		"""
 		Berechnet den Gutscheinwert basierend auf Präsentationsumsatz-Stufen
@@ -403,15 +396,17 @@ class Party(Document):
 		Prüft die Gutschein-Nutzung und wendet Rabatte an
 		Gibt True zurück wenn alles OK ist, False wenn der Benutzer noch Produkte hinzufügen möchte
 		"""
-		if not hasattr(self, "produktauswahl_für_gastgeberin") or not self.produktauswahl_für_gastgeberin:
+		gastgeberin_produkte = self.get_produkte_nach_teilnehmer().get(self.gastgeberin, [])
+		if not gastgeberin_produkte:
 			return True
 		
 		if not self.gastgeber_gutschein_wert or self.gastgeber_gutschein_wert <= 0:
 			return True
 		
 		# Sammle alle rabattfähigen Produkte der Gastgeberin
+		item_stammdaten = self.get_item_stammdaten()
 		rabattfaehige_produkte = []
-		for item in self.produktauswahl_für_gastgeberin:
+		for item in gastgeberin_produkte:
 			if item.item_code and item.qty and item.rate:
 				# Prüfe, ob das Produkt rabattfähig ist
 				try:
@@ -419,13 +414,10 @@ class Party(Document):
 					if getattr(produkt_doc, "custom_considered_for_action", 0):
 						rabattfaehige_produkte.append(item)
 				except:
-					# Falls Produkt-Doctype nicht existiert, prüfe Item-Doctype
-					try:
-						item_doc = frappe.get_cached_doc("Item", item.item_code)
-						if getattr(item_doc, "custom_considered_for_action", 0):
-							rabattfaehige_produkte.append(item)
-					except:
-						continue
+					# Falls Produkt-Doctype nicht existiert, prüfe die vorab geladenen Item-Daten
+					item_doc = item_stammdaten.get(item.item_code)
+					if item_doc and item_doc.get("custom_considered_for_action"):
+						rabattfaehige_produkte.append(item)
 		
 		# Berechne Gesamtwert der rabattfähigen Produkte
 		gesamtwert_rabattfaehig = sum(flt(item.qty) * flt(item.rate) for item in rabattfaehige_produkte) if rabattfaehige_produkte else 0
@@ -541,9 +533,12 @@ class Party(Document):
 		
 		teilnehmer_ohne_adresse = []
 		
+		# Alle Adressen mit einer Abfrage laden statt einer Suche pro Teilnehmer
+		party_addresses = resolve_party_addresses(self)
+		
 		# 1. Prüfe Gastgeberin
 		if self.gastgeberin:
-			if not find_existing_address(self.gastgeberin, "Billing"):
+			if not party_addresses.get(self.gastgeberin, (None, None))[0]:
 				teilnehmer_ohne_adresse.append(f"Gastgeberin ({self.gastgeberin})")
 		
 		# 2. Prüfe alle Gäste
@@ -553,7 +548,7 @@ class Party(Document):
 					continue
 					
 				# Prüfe Billing-Adresse (mindestens eine Adresse muss vorhanden sein)
-				if not find_existing_address(kunde_row.kunde, "Billing"):
+				if not party_addresses.get(kunde_row.kunde, (None, None))[0]:
 					teilnehmer_ohne_adresse.append(f"Gast ({kunde_row.kunde})")
 		
 		# REDUZIERT: Nur noch bei VIELEN fehlenden Adressen warnen, einzelne ignorieren
@@ -571,11 +566,11 @@ class Party(Document):
 			# 	indicator="blue"
 			# )
 			
-			frappe.log_error(f"Adress-Info für Party {self.name}: {fehlende_adressen}", "INFO: address_check")
+			logger.info("Adress-Info für Party %s: %s", self.name, fehlende_adressen, title="address_check")
 		else:
 			# Bei wenigen fehlenden Adressen: Nur stilles Logging
 			if teilnehmer_ohne_adresse:
-				frappe.log_error(f"Vereinzelte Adress-Hinweise für Party {self.name}: {', '.join(teilnehmer_ohne_adresse)}", "INFO: few_address_hints")
+				logger.info("Vereinzelte Adress-Hinweise für Party %s: %s", self.name, ', '.join(teilnehmer_ohne_adresse), title="few_address_hints")
 
 # VERALTET: Diese Funktion erstellt automatisch Adressen - NICHT MEHR VERWENDEN!
 def get_or_create_address(customer_name, address_type="Billing"):
@@ -583,7 +578,7 @@ def get_or_create_address(customer_name, address_type="Billing"):
 	VERALTET: Verwende find_existing_address() stattdessen!
 	Diese Funktion erstellt KEINE neuen Adressen mehr.
 	"""
-	frappe.log_error(f"WARNUNG: get_or_create_address ist veraltet! Verwende find_existing_address für '{customer_name}'", "WARNING: deprecated_function")
+	logger.warn(f"WARNUNG: get_or_create_address ist veraltet! Verwende find_existing_address für '{customer_name}'", title="deprecated_function")
 	return find_existing_address(customer_name, address_type)
 
 def create_robust_fallback_address(customer_name, address_type):
@@ -591,15 +586,15 @@ def create_robust_fallback_address(customer_name, address_type):
 	GEÄNDERT: Erstellt KEINE neuen Adressen mehr!
 	Sucht nur nach existierenden Adressen und gibt None zurück wenn keine gefunden wird
 	"""
-	frappe.log_error(f"WARNUNG: create_robust_fallback_address aufgerufen für '{customer_name}' - suche nur nach existierenden Adressen", "WARNING: no_auto_create")
+	logger.warn(f"WARNUNG: create_robust_fallback_address aufgerufen für '{customer_name}' - suche nur nach existierenden Adressen", title="no_auto_create")
 	
 	# Verwende die neue find_existing_address Funktion
 	existing_address = find_existing_address(customer_name, address_type)
 	if existing_address:
-		frappe.log_error(f"Existierende Adresse gefunden für '{customer_name}': {existing_address}", "INFO: existing_found")
+		logger.info("Existierende Adresse gefunden für '%s': %s", customer_name, existing_address, title="existing_found")
 		return existing_address
 	else:
-		frappe.log_error(f"KEINE Adresse für '{customer_name}' gefunden - erstelle KEINE neue Adresse!", "ERROR: no_address_available")
+		logger.error(f"KEINE Adresse für '{customer_name}' gefunden - erstelle KEINE neue Adresse!", title="no_address_available")
 		return None
 
 def get_available_country():
@@ -607,19 +602,19 @@ def get_available_country():
 	VERALTET: Diese Funktion wird nicht mehr benötigt,
 	da wir keine neuen Adressen mehr erstellen
 	"""
-	frappe.log_error("get_available_country ist veraltet - keine neuen Adressen mehr!", "WARNING: deprecated")
+	logger.warn("get_available_country ist veraltet - keine neuen Adressen mehr!", title="deprecated")
 	return "Germany"
 
 # ENTFERNT: Diese Funktion erstellt neue Adressen - nicht mehr verwenden!
 def create_new_address(customer_name, address_type):
 	"""VERALTET: Erstellt KEINE neuen Adressen mehr!"""
-	frappe.log_error(f"create_new_address für '{customer_name}' aufgerufen - erstelle KEINE Adresse!", "ERROR: no_auto_create")
+	logger.error(f"create_new_address für '{customer_name}' aufgerufen - erstelle KEINE Adresse!", title="no_auto_create")
 	return None
 
 # ENTFERNT: Diese Funktion erstellt neue Adressen - nicht mehr verwenden!
 def create_fallback_address():
 	"""VERALTET: Erstellt KEINE neuen Adressen mehr!"""
-	frappe.log_error("create_fallback_address aufgerufen - erstelle KEINE Adresse!", "ERROR: no_auto_create")
+	logger.error("create_fallback_address aufgerufen - erstelle KEINE Adresse!", title="no_auto_create")
 	return None
 
 # Neue Funktion für das Verknüpfen einer Adresse mit einem Kunden
@@ -680,87 +675,33 @@ def calculate_shipping_costs_for_party(party_doc):
     """
     all_orders = []
     
-    frappe.log_error(f"=== CALCULATE_SHIPPING_COSTS START für {party_doc.name} ===", "DEBUG: shipping_start")
+    logger.debug("=== CALCULATE_SHIPPING_COSTS START für %s ===", party_doc.name, title="shipping_start")
     
-    # Gastgeberin verarbeiten
-    if party_doc.gastgeberin and hasattr(party_doc, 'produktauswahl_für_gastgeberin') and party_doc.produktauswahl_für_gastgeberin:
-        frappe.log_error(f"Verarbeite Gastgeberin: {party_doc.gastgeberin}", "DEBUG: process_host")
-        
-        produkte_gastgeberin = []
-        total_gastgeberin = 0
-        
-        for idx_prod, produkt in enumerate(party_doc.produktauswahl_für_gastgeberin):
-            frappe.log_error(f"  Gastgeberin Zeile {idx_prod}: item_code={produkt.item_code}, qty={produkt.qty}, rate={produkt.rate}", "DEBUG: host_item")
-            if produkt.item_code and produkt.qty and produkt.qty > 0:
-                frappe.log_error(f"  -> Gastgeberin Produkt akzeptiert: {produkt.item_code}", "DEBUG: host_accepted")
-                # WICHTIG: Übertrage ALLE Produktdaten, nicht nur die Basics!
-                product_dict = {
-                    "item_code": produkt.item_code,
-                    "item_name": produkt.item_name or produkt.item_code,
-                    "qty": produkt.qty,
-                    "rate": produkt.rate or 0,
-                    "amount": produkt.amount or (flt(produkt.qty) * flt(produkt.rate or 0)),
-                    "uom": getattr(produkt, 'uom', 'Stk'),
-                    "stock_uom": getattr(produkt, 'stock_uom', 'Stk'),
-                    "conversion_factor": getattr(produkt, 'conversion_factor', 1.0),
-                    "stock_qty": getattr(produkt, 'stock_qty', flt(produkt.qty)),
-                    "base_amount": getattr(produkt, 'base_amount', produkt.amount or (flt(produkt.qty) * flt(produkt.rate or 0))),
-                    "base_rate": getattr(produkt, 'base_rate', produkt.rate or 0),
-                    "warehouse": getattr(produkt, 'warehouse', get_default_warehouse()),
-                    "delivery_date": frappe.utils.getdate(getattr(produkt, 'delivery_date', frappe.utils.add_days(frappe.utils.today(), 7))),
-                    # WICHTIG: Flag für Gutschein-reduzierte 0€-Artikel
-                    "_force_zero_rate": float(produkt.rate or 0) == 0.0
-                }
-                
-                produkte_gastgeberin.append(product_dict)
-                total_gastgeberin += flt(produkt.qty) * flt(produkt.rate or 0)
-                frappe.log_error(f"  -> Gastgeberin Produkt hinzugefügt, neue Summe: {total_gastgeberin}", "DEBUG: host_added")
-        
-        if produkte_gastgeberin:
-            # Versandziel für Gastgeberin
-            versand_ziel = getattr(party_doc, 'versand_gastgeberin', party_doc.gastgeberin)
-            if not versand_ziel:
-                versand_ziel = party_doc.gastgeberin
-                
-            frappe.log_error(f"Gastgeberin ({party_doc.gastgeberin}) hat {len(produkte_gastgeberin)} Produkte, Total: {total_gastgeberin}", "DEBUG: host_order")
-                
-            all_orders.append({
-                "customer": party_doc.gastgeberin,
-                "shipping_target": versand_ziel,
-                "products": produkte_gastgeberin,
-                "total": total_gastgeberin,
-                "order_type": "gastgeberin"
-            })
-        else:
-            frappe.log_error(f"Gastgeberin: Keine gültigen Produkte gefunden", "DEBUG: host_no_products")
+    produkte_nach_teilnehmer = party_doc.get_produkte_nach_teilnehmer()
+    default_warehouse = None
     
-    # Gäste verarbeiten
-    frappe.log_error(f"Verarbeite {len(party_doc.kunden)} Gäste", "DEBUG: process_guests")
-    for idx, kunde_row in enumerate(party_doc.kunden):
+    # Teilnehmer in fester Reihenfolge: erst Gastgeberin, dann alle Gäste
+    # (customer, versand_ziel, order_type, guest_index)
+    teilnehmer_liste = []
+    if party_doc.gastgeberin:
+        teilnehmer_liste.append((party_doc.gastgeberin, party_doc.versand_gastgeberin, "gastgeberin", None))
+    for idx, kunde_row in enumerate(party_doc.kunden or []):
         if not kunde_row.kunde:
-            frappe.log_error(f"Gast {idx+1}: Kein Kunde angegeben - überspringe", "DEBUG: guest_no_customer")
-            continue
-            
-        index = idx + 1
-        field_name = f"produktauswahl_für_gast_{index}"
-        versand_field = f"versand_gast_{index}"
-        
-        frappe.log_error(f"=== Verarbeite Gast {index}: {kunde_row.kunde} ===", "DEBUG: guest_start")
-        
-        if not hasattr(party_doc, field_name) or not getattr(party_doc, field_name):
-            frappe.log_error(f"Gast {index} ({kunde_row.kunde}): Keine Produkttabelle {field_name} gefunden", "DEBUG: no_product_table")
+            logger.debug("Gast %s: Kein Kunde angegeben - überspringe", idx+1, title="guest_no_customer")
             continue
+        teilnehmer_liste.append((kunde_row.kunde, kunde_row.versand_zu, "gast", idx + 1))
+    
+    logger.debug("Verarbeite %s Teilnehmer", len(teilnehmer_liste), title="process_guests")
+    for customer, versand_ziel, order_type, guest_index in teilnehmer_liste:
+        produkte = []
+        total = 0
         
-        produkte_gast = []
-        total_gast = 0
-        
-        tabelle_inhalt = getattr(party_doc, field_name)
-        frappe.log_error(f"Gast {index} ({kunde_row.kunde}) - Anzahl Zeilen in {field_name}: {len(tabelle_inhalt)}", "DEBUG: table_check")
-        
-        for idx_prod, produkt in enumerate(getattr(party_doc, field_name)):
-            frappe.log_error(f"  Gast {index} Zeile {idx_prod}: item_code={produkt.item_code}, qty={produkt.qty}, rate={produkt.rate}", "DEBUG: guest_item")
+        for idx_prod, produkt in enumerate(produkte_nach_teilnehmer.get(customer, [])):
+            logger.debug("  %s Zeile %s: item_code=%s, qty=%s, rate=%s", customer, idx_prod, produkt.item_code, produkt.qty, produkt.rate, title="guest_item")
             if produkt.item_code and produkt.qty and produkt.qty > 0:
-                frappe.log_error(f"  -> Gast {index} Produkt akzeptiert: {produkt.item_code}", "DEBUG: guest_accepted")
+                if not produkt.warehouse and not default_warehouse:
+                    default_warehouse = get_default_warehouse()
+                
                 # WICHTIG: Übertrage ALLE Produktdaten, nicht nur die Basics!
                 product_dict = {
                     "item_code": produkt.item_code,
@@ -768,40 +709,36 @@ def calculate_shipping_costs_for_party(party_doc):
                     "qty": produkt.qty,
                     "rate": produkt.rate or 0,
                     "amount": produkt.amount or (flt(produkt.qty) * flt(produkt.rate or 0)),
-                    "uom": getattr(produkt, 'uom', 'Stk'),
-                    "stock_uom": getattr(produkt, 'stock_uom', 'Stk'),
-                    "conversion_factor": getattr(produkt, 'conversion_factor', 1.0),
-                    "stock_qty": getattr(produkt, 'stock_qty', flt(produkt.qty)),
-                    "base_amount": getattr(produkt, 'base_amount', produkt.amount or (flt(produkt.qty) * flt(produkt.rate or 0))),
-                    "base_rate": getattr(produkt, 'base_rate', produkt.rate or 0),
-                    "warehouse": getattr(produkt, 'warehouse', get_default_warehouse()),
-                    "delivery_date": frappe.utils.getdate(getattr(produkt, 'delivery_date', frappe.utils.add_days(frappe.utils.today(), 7))),
+                    "uom": produkt.uom or "Stk",
+                    "stock_uom": produkt.stock_uom or "Stk",
+                    "conversion_factor": produkt.conversion_factor or 1.0,
+                    "stock_qty": produkt.stock_qty or flt(produkt.qty),
+                    "base_amount": produkt.base_amount or produkt.amount or (flt(produkt.qty) * flt(produkt.rate or 0)),
+                    "base_rate": produkt.base_rate or produkt.rate or 0,
+                    "warehouse": produkt.warehouse or default_warehouse,
+                    "delivery_date": frappe.utils.getdate(produkt.delivery_date or frappe.utils.add_days(frappe.utils.today(), 7)),
                     # WICHTIG: Flag für Gutschein-reduzierte 0€-Artikel
                     "_force_zero_rate": float(produkt.rate or 0) == 0.0
                 }
                 
-                produkte_gast.append(product_dict)
-                total_gast += flt(produkt.qty) * flt(produkt.rate or 0)
-                frappe.log_error(f"  -> Gast {index} Produkt hinzugefügt, neue Summe: {total_gast}", "DEBUG: guest_added")
+                produkte.append(product_dict)
+                total += flt(produkt.qty) * flt(produkt.rate or 0)
         
-        if produkte_gast:
-            # Versandziel für Gast
-            versand_ziel = getattr(party_doc, versand_field, kunde_row.kunde)
-            if not versand_ziel:
-                versand_ziel = kunde_row.kunde
-                
-            frappe.log_error(f"Gast {index} ({kunde_row.kunde}) hat {len(produkte_gast)} Produkte, Total: {total_gast}", "DEBUG: guest_order")
-                
-            all_orders.append({
-                "customer": kunde_row.kunde,
-                "shipping_target": versand_ziel,
-                "products": produkte_gast,
-                "total": total_gast,
-                "order_type": "gast",
-                "guest_index": index
-            })
-        else:
-            frappe.log_error(f"Gast {index} ({kunde_row.kunde}): Keine gültigen Produkte in {field_name} gefunden", "DEBUG: guest_no_products")
+        if not produkte:
+            logger.debug("%s: Keine gültigen Produkte gefunden", customer, title="guest_no_products")
+            continue
+        
+        logger.debug("%s (%s) hat %s Produkte, Total: %s", customer, order_type, len(produkte), total, title="guest_order")
+        
+        all_orders.append({
+            "customer": customer,
+            # Versandziel: ohne Auswahl geht der Versand an den Teilnehmer selbst
+            "shipping_target": versand_ziel or customer,
+            "products": produkte,
+            "total": total,
+            "order_type": order_type,
+            "guest_index": guest_index
+        })
     
     # Gruppiere Bestellungen nach Versandziel
     shipping_groups = {}
@@ -811,24 +748,25 @@ def calculate_shipping_costs_for_party(party_doc):
             shipping_groups[target] = []
         shipping_groups[target].append(order)
     
-    frappe.log_error(f"=== SHIPPING GROUPS ERSTELLUNG ===", "DEBUG: shipping_groups")
-    frappe.log_error(f"Anzahl Orders vor Gruppierung: {len(all_orders)}", "DEBUG: orders_count")
-    for target, orders in shipping_groups.items():
-        frappe.log_error(f"Versandziel {target}: {len(orders)} Orders", "DEBUG: group_detail")
+    logger.debug("=== SHIPPING GROUPS ERSTELLUNG ===", title="shipping_groups")
+    logger.debug("Anzahl Orders vor Gruppierung: %s", len(all_orders), title="orders_count")
+    if logger.is_enabled(logger.DEBUG):
+        for target, orders in shipping_groups.items():
+            logger.debug("Versandziel %s: %s Orders", target, len(orders), title="group_detail")
     
     # NEUE VERSANDLOGIK: Berechne Versandkosten pro Gruppe und füge Versandartikel hinzu
     for target, orders in shipping_groups.items():
         total_value_for_target = sum(order["total"] for order in orders)
         num_orders = len(orders)
         
-        frappe.log_error(f"Versandziel {target}: {num_orders} Aufträge, Gesamtwert: {total_value_for_target}€", "DEBUG: shipping_calculation")
+        logger.debug("Versandziel %s: %s Aufträge, Gesamtwert: %s€", target, num_orders, total_value_for_target, title="shipping_calculation")
         
         if total_value_for_target >= 200:
             # Versandkostenfrei für alle Bestellungen an dieses Ziel
             shipping_cost_per_order = 0.0
             shipping_item_code = None
             shipping_note = f"Versandkostenfrei (Gesamtwert: {total_value_for_target:.2f}€ >= 200€)"
-            frappe.log_error(f"Versandkostenfrei für {target}", "DEBUG: shipping_free")
+            logger.debug("Versandkostenfrei für %s", target, title="shipping_free")
         else:
             # 7€ Versandkosten aufteilen - bestimme den richtigen Versandartikel
             shipping_cost_per_order = round(7.0 / num_orders, 2)
@@ -848,7 +786,7 @@ def calculate_shipping_costs_for_party(party_doc):
             shipping_item_code = shipping_items.get(num_orders, "shipping-1")
             
             shipping_note = f"Versandkosten aufgeteilt: {num_orders} Bestellung(en) à {shipping_cost_per_order:.2f}€ (Gesamtwert: {total_value_for_target:.2f}€ < 200€) - Artikel: {shipping_item_code}"
-            frappe.log_error(f"Versandkosten für {target}: {shipping_item_code} à {shipping_cost_per_order}€", "DEBUG: shipping_charged")
+            logger.debug("Versandkosten für %s: %s à %s€", target, shipping_item_code, shipping_cost_per_order, title="shipping_charged")
         
         # Versandkosten zu jeder Bestellung hinzufügen
         for order in orders:
@@ -884,10 +822,10 @@ def calculate_shipping_costs_for_party(party_doc):
                     order["products"].append(shipping_product)
                     order["total"] += shipping_cost_per_order  # Gesamtsumme des Auftrags aktualisieren
                     
-                    frappe.log_error(f"Versandartikel {shipping_item_code} hinzugefügt zu {order['customer']}: {shipping_cost_per_order}€", "DEBUG: shipping_item_added")
+                    logger.debug("Versandartikel %s hinzugefügt zu %s: %s€", shipping_item_code, order['customer'], shipping_cost_per_order, title="shipping_item_added")
                     
                 except Exception as e:
-                    frappe.log_error(f"Fehler beim Laden des Versandartikels {shipping_item_code}: {str(e)}", "ERROR: shipping_item_error")
+                    logger.error(f"Fehler beim Laden des Versandartikels {shipping_item_code}: {str(e)}", title="shipping_item_error")
                     # Fallback: Verwende Standard-Versandartikel-Daten
                     shipping_product = {
                         "item_code": shipping_item_code,
@@ -909,238 +847,117 @@ def calculate_shipping_costs_for_party(party_doc):
                     order["products"].append(shipping_product)
                     order["total"] += shipping_cost_per_order
     
-    frappe.log_error(f"=== ENDERGEBNIS calculate_shipping_costs_for_party ===", "DEBUG: shipping_calc_end")
-    frappe.log_error(f"FINALE Anzahl Orders: {len(all_orders)}", "DEBUG: orders_count")
-    for i, order in enumerate(all_orders):
-        frappe.log_error(f"Order {i+1}: Customer={order['customer']}, Produkte={len(order['products'])}, Total={order['total']}", "DEBUG: final_order")
-    frappe.log_error(f"SUCCESS: final_result", "SUCCESS: final_result")
+    logger.debug("=== ENDERGEBNIS calculate_shipping_costs_for_party ===", title="shipping_calc_end")
+    logger.debug("FINALE Anzahl Orders: %s", len(all_orders), title="orders_count")
+    if logger.is_enabled(logger.DEBUG):
+        for i, order in enumerate(all_orders):
+            logger.debug("Order %s: Customer=%s, Produkte=%s, Total=%s", i+1, order['customer'], len(order['products']), order['total'], title="final_order")
+    logger.info("SUCCESS: final_result", title="final_result")
     return all_orders
 
 @frappe.whitelist()
-def create_invoices(party, from_submit=False, from_button=False):
+def create_invoices(party, from_submit=False, from_button=False, enqueue=False):
     """
     Erstellt Sales Orders für eine Party
     - party: Name des Party-Dokuments
     - from_submit: Ob die Funktion vom Submit-Button aufgerufen wurde
     - from_button: Ob die Funktion vom "Aufträge erstellen"-Button aufgerufen wurde
+    - enqueue: Buchung als Hintergrund-Job starten (siehe enqueue_party_booking)
     """
-    # BACKEND-SICHERUNG: Setze skip_total_calculation Flag falls vom Button aufgerufen
-    if from_button:
-        try:
-            party_doc = frappe.get_doc("Party", party)
-            if not getattr(party_doc, 'skip_total_calculation', False):
-                frappe.log_error(f"Backend-Sicherung: Setze skip_total_calculation für {party}", "INFO: backend_flag_set")
-                party_doc.skip_total_calculation = 1
-                party_doc.flags.ignore_permissions = True
-                party_doc.save()
-                frappe.db.commit()
-        except Exception as e:
-            frappe.log_error(f"Backend-Sicherung Fehler: {str(e)}", "WARNING: backend_flag_failed")
+    if frappe.utils.cint(enqueue) and not from_submit:
+        return enqueue_party_booking(party)
+    
+    # Nur eine Buchung pro Party gleichzeitig - über alle Worker hinweg
+    booking_lock = acquire_party_booking_lock(party)
+    # Rechnungen dieser Buchung nicht einzeln kommissionieren - create_picklists_for_party gruppiert sie
+    begin_party_buchung(party)
     
     try:
         # Grundlegende Fehlerprotokollierung aktivieren
-        frappe.log_error(f"Starte Auftragserstellung für Party {party} (from_submit={from_submit}, from_button={from_button})", "DEBUG: create_orders Start")
-        
-        # Prüfen, ob die Party bereits Aufträge hat
-        existing_orders = frappe.get_all(
-            "Sales Order",
-            filters={"docstatus": ["!=", 2]},
-            or_filters=[
-                {"po_no": party},  # Versuche, in verschiedenen Feldern zu suchen
-                {"customer_name": party}
-            ],
-            limit=1
-        )
+        logger.debug("Starte Auftragserstellung für Party %s (from_submit=%s, from_button=%s)", party, from_submit, from_button, title="create_orders Start")
         
-        # Wenn es bereits Aufträge gibt und der Aufruf vom Button kommt, blockieren
-        if existing_orders and from_button:
-            frappe.log_error(f"Aufträge gefunden: {existing_orders}", "DEBUG: create_orders - Gefundene Aufträge")
-            # ENTFERNT: frappe.msgprint("Diese Party hat bereits Aufträge. Es werden keine neuen Aufträge erstellt.", alert=True)
-            return existing_orders
+        # Idempotenz: bereits gebuchte Kunden dieser Party (indizierter Lookup statt OR-Scan über Sales Order)
+        buchungen = get_party_buchungen(party)
         
         # Wenn die Funktion sowohl von before_submit als auch vom Button aufgerufen wird, 
         # verhindere Doppelausführung
         if from_button and from_submit:
-            frappe.log_error("Verhinderte doppelte Ausführung (from_button und from_submit sind beide True)", "DEBUG: create_orders")
+            logger.debug("Verhinderte doppelte Ausführung (from_button und from_submit sind beide True)", title="create_orders")
             return []
         
         # Hole Standard-Einstellungen
         company = frappe.defaults.get_user_default("Company")
         if not company:
-            frappe.log_error("Keine Standard-Firma gefunden!", "ERROR: create_orders")
+            logger.error("Keine Standard-Firma gefunden!", title="create_orders")
             frappe.throw("Bitte legen Sie eine Standard-Firma in Ihren Einstellungen fest.")
             
         currency = frappe.defaults.get_user_default("Currency")
         if not currency:
-            frappe.log_error("Keine Standard-Währung gefunden!", "ERROR: create_orders")
+            logger.error("Keine Standard-Währung gefunden!", title="create_orders")
             frappe.throw("Bitte legen Sie eine Standard-Währung in Ihren Einstellungen fest.")
             
         # Party-Dokument laden
         try:
             party_doc = frappe.get_doc("Party", party)
-            party_doc.skip_total_calculation = 1  # <-- HIER!
+            # Summen während der Buchung einfrieren (nur für diese Instanz, wird nicht gespeichert)
+            party_doc.flags.totals_frozen = True
+            party_doc.flags.in_party_booking = True
                 
         except Exception as e:
-            frappe.log_error(f"Party-Dokument konnte nicht geladen werden: {str(e)}", "ERROR: create_orders")
+            logger.error(f"Party-Dokument konnte nicht geladen werden: {str(e)}", title="create_orders")
             frappe.throw("Das Party-Dokument konnte nicht geladen werden.")
         
         # Prüfen, ob die Party bereits abgeschlossen ist
         if party_doc.status == "Abgeschlossen" and party_doc.docstatus == 1:
             # ENTFERNT: frappe.msgprint("Diese Party ist bereits abgeschlossen und hat wahrscheinlich bereits Aufträge.", alert=True)
-            return []
-        
-        # Gästeliste prüfen
-        if not party_doc.kunden or len(party_doc.kunden) < 3:
-            frappe.throw("Es müssen mindestens 3 Gäste/Kunden zur Party hinzugefügt werden.")
-            
-        # Prüfe, ob die Gastgeberin existiert
-        if not party_doc.gastgeberin:
-            frappe.throw("Es wurde keine Gastgeberin angegeben.")
-            
-        # Vollständige Produktvalidierung für alle Teilnehmer
-        teilnehmer_ohne_produkte = []
-        
-        # Prüfe Gastgeberin
-        if party_doc.gastgeberin:
-            hat_gastgeberin_produkte = False
-            if hasattr(party_doc, "produktauswahl_für_gastgeberin") and party_doc.produktauswahl_für_gastgeberin:
-                for produkt in party_doc.produktauswahl_für_gastgeberin:
-                    if produkt.item_code and produkt.qty and produkt.qty > 0:
-                        hat_gastgeberin_produkte = True
-                        break
-            
-            if not hat_gastgeberin_produkte:
-                teilnehmer_ohne_produkte.append(f"Gastgeberin ({party_doc.gastgeberin})")
-        
-        # Prüfe alle Gäste
-        for idx, kunde_row in enumerate(party_doc.kunden):
-            if not kunde_row.kunde:
-                continue
-                
-            index = idx + 1
-            field_name = f"produktauswahl_für_gast_{index}"
-            
-            # Prüfen ob die Tabelle existiert und Produkte enthält
-            hat_produkte = False
-            if hasattr(party_doc, field_name) and getattr(party_doc, field_name):
-                for produkt in getattr(party_doc, field_name):
-                    if produkt.item_code and produkt.qty and produkt.qty > 0:
-                        hat_produkte = True
-                        break
-            
-            # Wenn keine Produkte gefunden wurden, zur Liste hinzufügen
-            if not hat_produkte:
-                teilnehmer_ohne_produkte.append(f"Gast {index} ({kunde_row.kunde})")
-        
-        # Wenn Teilnehmer ohne Produkte gefunden wurden, Fehlermeldung anzeigen
-        if teilnehmer_ohne_produkte:
-            frappe.throw(
-                f"Die folgenden Teilnehmer haben noch keine Produkte ausgewählt: {', '.join(teilnehmer_ohne_produkte)}. "
-                f"Bitte wählen Sie für jeden Teilnehmer (Gastgeberin und alle Gäste) mindestens ein Produkt aus, "
-                f"bevor Sie die Aufträge erstellen. Sie können auch Gäste ohne Bestellung aus der Gästeliste entfernen."
-            )
-        
-        # Produkte-Check: Hat irgendein Kunde oder die Gastgeberin Produkte?
-        produkte_vorhanden = False
-        
-        # Prüfe Gastgeberin
-        if hasattr(party_doc, "produktauswahl_für_gastgeberin") and party_doc.produktauswahl_für_gastgeberin:
-            for produkt in party_doc.produktauswahl_für_gastgeberin:
-                if produkt.item_code and produkt.qty and produkt.qty > 0:
-                    produkte_vorhanden = True
-                    break
-        
-        # Prüfe alle Kunden
-        if not produkte_vorhanden:
-            for idx, _ in enumerate(party_doc.kunden or []):
-                field_name = f"produktauswahl_für_gast_{idx+1}"
-                if hasattr(party_doc, field_name) and getattr(party_doc, field_name):
-                    for produkt in getattr(party_doc, field_name):
-                        if produkt.item_code and produkt.qty and produkt.qty > 0:
-                            produkte_vorhanden = True
-                            break
-                    if produkte_vorhanden:
-                        break
-        
-        if not produkte_vorhanden:
-            frappe.throw("Es wurden keine Produkte ausgewählt. Bitte wählen Sie mindestens ein Produkt aus, bevor Sie Aufträge erstellen.")
-        
-        # NEUE VERSANDKOSTENLOGIK
-        # Sammle alle Bestellungen mit ihren Versandzielen und berechne Versandkosten
-        frappe.log_error(f"=== AUFRUF calculate_shipping_costs_for_party ===", "DEBUG: before_calc")
-        all_orders_with_shipping = calculate_shipping_costs_for_party(party_doc)
-        frappe.log_error(f"=== RÜCKKEHR von calculate_shipping_costs_for_party ===", "DEBUG: after_calc")
+            # Vom Button: die bestehenden Aufträge zurückgeben statt neu zu buchen
+            return [b.sales_order for b in buchungen.values() if b.sales_order] if from_button else []
         
-        frappe.log_error(f"Anzahl Orders mit Versandkosten: {len(all_orders_with_shipping)}", "DEBUG: orders_count")
-        for i, order in enumerate(all_orders_with_shipping):
-            frappe.log_error(f"Erhaltene Order {i+1}: Customer={order.get('customer')}, Products={len(order.get('products', []))}, Total={order.get('total')}", "DEBUG: received_order")
+        # Buchungsplan frisch berechnen - dieselbe Logik wie preview_party_booking, aber nie aus dem Cache:
+        # Adressen, die seit der Vorschau angelegt wurden, ändern den Cache-Schlüssel nicht
+        booking_plan = get_booking_plan(party_doc, use_cache=False)
+        all_orders_with_shipping = booking_plan["orders"]
         
         if not all_orders_with_shipping:
-            frappe.log_error("Keine Bestellungen gefunden - calculate_shipping_costs_for_party gab leere Liste zurück", "ERROR: no_orders_calculated")
+            logger.error("Keine Bestellungen gefunden - calculate_shipping_costs_for_party gab leere Liste zurück", title="no_orders_calculated")
             # ENTFERNT: frappe.msgprint("Keine Bestellungen gefunden. Bitte prüfe die Logs und versuche es erneut.", alert=True)
             return []
         
-        # Debug: Zeige Details der ersten Bestellung
-        if all_orders_with_shipping:
-            first_order = all_orders_with_shipping[0]
-            frappe.log_error(f"Erste Bestellung: Customer={first_order.get('customer')}, Products={len(first_order.get('products', []))}", "DEBUG: first_order")
-        
         # Erstelle eine Liste für die erstellten Aufträge
         created_orders = []
         
         # Erstelle Aufträge basierend auf der Versandkostenberechnung
-        for order_info in all_orders_with_shipping:
+        for order_index, order_info in enumerate(all_orders_with_shipping, start=1):
             try:
                 customer = order_info["customer"]
+                publish_booking_progress(party, order_index, len(all_orders_with_shipping), f"Auftrag für {customer}")
                 shipping_target = order_info["shipping_target"]
                 products = order_info["products"]
                 shipping_cost = order_info["shipping_cost"]
                 shipping_note = order_info["shipping_note"]
                 
-                frappe.log_error(f"Verarbeite: Customer={customer}, Shipping_Target={shipping_target}", "DEBUG: order_processing")
-                
-                # NEUE EINFACHE ADRESS-LOGIK:
-                # Rechnungsadresse: IMMER Billing vom Kunden (der bestellt)
-                # Versandadresse: Shipping vom Versandziel, Fallback auf Billing vom Versandziel
-                
-                billing_address = None
-                shipping_address = None
-                
-                frappe.log_error(f"=== ADRESS-DEBUG START für Customer: {customer}, Shipping_Target: {shipping_target} ===", "DEBUG: address_search")
-                
-                # 1. RECHNUNGSADRESSE: Immer vom Kunden der bestellt
-                frappe.log_error(f"Suche Billing-Adresse für Customer: '{customer}'", "DEBUG: billing_search")
-                billing_address = find_existing_address(customer, "Billing")
-                frappe.log_error(f"DEBUG: billing_address für {customer} = {billing_address} (Typ: {type(billing_address)})", "DEBUG: address_result")
-                
-                if not billing_address:
-                    frappe.log_error(f"KRITISCH: Keine Adresse für Kunde '{customer}' gefunden", "ERROR: no_billing")
-                    # ENTFERNT: frappe.msgprint(f"Kunde {customer} hat keine Adresse hinterlegt. Auftrag wird übersprungen.", alert=True)
+                # Wiederaufnahme: Auftrag wurde bei einem früheren Versuch bereits erstellt
+                buchung = buchungen.get(customer)
+                if buchung and buchung.sales_order:
+                    logger.info("Auftrag für '%s' existiert bereits: %s - überspringe", customer, buchung.sales_order, title="booking_resume")
+                    if not buchung.sales_invoice and frappe.db.get_value("Sales Order", buchung.sales_order, "docstatus") == 1:
+                        invoice_name = create_invoice_for_order(frappe.get_doc("Sales Order", buchung.sales_order))
+                        if invoice_name:
+                            record_party_buchung(party, customer, sales_invoice=invoice_name)
+                    created_orders.append(buchung.sales_order)
                     continue
                 
-                frappe.log_error(f"✅ Billing-Adresse für Kunde '{customer}': {billing_address}", "INFO: billing_found")
+                logger.debug("Verarbeite: Customer=%s, Shipping_Target=%s", customer, shipping_target, title="order_processing")
                 
-                # 2. VERSANDADRESSE: Erst Shipping vom Versandziel, dann Billing vom Versandziel
-                frappe.log_error(f"Suche Shipping-Adresse für Versandziel: '{shipping_target}'", "DEBUG: shipping_search")
-                shipping_address = find_existing_address(shipping_target, "Shipping")
-                frappe.log_error(f"DEBUG: shipping_address (Shipping) für {shipping_target} = {shipping_address} (Typ: {type(shipping_address)})", "DEBUG: address_result")
+                # Adressen stehen bereits im Buchungsplan (siehe plan_order_addresses)
+                billing_address = order_info.get("billing_address")
+                shipping_address = order_info.get("shipping_address")
                 
-                if not shipping_address:
-                    # Fallback: Billing-Adresse vom Versandziel
-                    frappe.log_error(f"Suche Billing-Fallback für Versandziel: '{shipping_target}'", "DEBUG: shipping_fallback_search")
-                    shipping_address = find_existing_address(shipping_target, "Billing")
-                    frappe.log_error(f"DEBUG: shipping_address (Billing Fallback) für {shipping_target} = {shipping_address} (Typ: {type(shipping_address)})", "DEBUG: address_result")
-                    
-                    if shipping_address:
-                        frappe.log_error(f"✅ Versand-Fallback: Billing-Adresse von '{shipping_target}': {shipping_address}", "INFO: shipping_fallback")
-                    else:
-                        frappe.log_error(f"KRITISCH: Keine Adresse für Versandziel '{shipping_target}' gefunden", "ERROR: no_shipping")
-                        # ENTFERNT: frappe.msgprint(f"Versandziel {shipping_target} hat keine Adresse hinterlegt. Auftrag wird übersprungen.", alert=True)
-                        continue
-                else:
-                    frappe.log_error(f"✅ Shipping-Adresse für Versandziel '{shipping_target}': {shipping_address}", "INFO: shipping_found")
+                if order_info.get("skip_reason"):
+                    logger.error(f"KRITISCH: {order_info['skip_reason']} - Auftrag für '{customer}' wird übersprungen", title="missing_address")
+                    continue
                 
-                frappe.log_error(f"=== FINALE ADRESSEN: Billing={billing_address}, Shipping={shipping_address} ===", "DEBUG: final_addresses")
+                logger.debug("=== FINALE ADRESSEN: Billing=%s, Shipping=%s ===", billing_address, shipping_address, title="final_addresses")
 
                 # Auftragsdaten mit klarer Adress-Dokumentation
                 order_data = {
@@ -1169,8 +986,8 @@ def create_invoices(party, from_submit=False, from_button=False):
                     "custom_calculated_shipping_cost": shipping_cost,
                 }
                 
-                frappe.log_error(f"DEBUG: Order-Daten für {customer}: customer_address={billing_address}, shipping_address_name={shipping_address}", "DEBUG: order_data")
-                frappe.log_error(f"Erstelle Auftrag für '{customer}'", "INFO: creating_order")
+                logger.debug("DEBUG: Order-Daten für %s: customer_address=%s, shipping_address_name=%s", customer, billing_address, shipping_address, title="order_data")
+                logger.info("Erstelle Auftrag für '%s'", customer, title="creating_order")
                 
                 # Auftrag erstellen
                 order = frappe.get_doc(order_data)
@@ -1183,15 +1000,15 @@ def create_invoices(party, from_submit=False, from_button=False):
                     # DEBUG: Spezifisches Logging für Aktionsartikel + Versandartikel Kombination
                     is_shipping = original_product.get('_shipping_item', False)
                     item_code = original_product.get('item_code', 'Unknown')
-                    frappe.log_error(f"DEBUG COMBO: Item {i}: {item_code}, Shipping: {is_shipping}, Rate: {original_product.get('rate', 'N/A')}", "DEBUG: combo_check")
+                    logger.debug("DEBUG COMBO: Item %s: %s, Shipping: %s, Rate: %s", i, item_code, is_shipping, original_product.get('rate', 'N/A'), title="combo_check")
                     
                     # DEBUG: Zeige Flag-Status für jedes Produkt
                     force_zero = original_product.get('_force_zero_rate', False)
-                    frappe.log_error(f"DEBUG: Item {item.item_code}, Rate: {original_product.get('rate', 'N/A')}, Force Zero: {force_zero}", "DEBUG: flag_check")
+                    logger.debug("DEBUG: Item %s, Rate: %s, Force Zero: %s", item.item_code, original_product.get('rate', 'N/A'), force_zero, title="flag_check")
                     
                     # NEUE LOGIK: Prüfe das _force_zero_rate Flag für Gutschein-reduzierte 0€-Artikel
                     if force_zero:
-                        frappe.log_error(f"Setze Gutschein-Preis für {item.item_code}: 0€ (Force Zero Flag)", "INFO: gutschein_price")
+                        logger.info("Setze Gutschein-Preis für %s: 0€ (Force Zero Flag)", item.item_code, title="gutschein_price")
                         # Setze alle preis-relevanten Felder explizit auf 0
                         item.rate = 0
                         item.price_list_rate = 0
@@ -1211,9 +1028,10 @@ def create_invoices(party, from_submit=False, from_button=False):
                             item.base_amount = item.amount
                 
                 # DEBUG: Zeige finale Order-Daten vor dem Insert
-                frappe.log_error(f"DEBUG FINAL ORDER: Customer={order.customer}, Items={len(order.items)}", "DEBUG: final_order_data")
-                for i, item in enumerate(order.items):
-                    frappe.log_error(f"  Item {i}: {item.item_code}, Qty: {item.qty}, Rate: {item.rate}, Amount: {item.amount}", "DEBUG: final_item_data")
+                logger.debug("DEBUG FINAL ORDER: Customer=%s, Items=%s", order.customer, len(order.items), title="final_order_data")
+                if logger.is_enabled(logger.DEBUG):
+                    for i, item in enumerate(order.items):
+                        logger.debug("  Item %s: %s, Qty: %s, Rate: %s, Amount: %s", i, item.item_code, item.qty, item.rate, item.amount, title="final_item_data")
                 
                 # SAUBERE LÖSUNG: Nur spezifische Adress-Validierungen umgehen, 
                 # aber Sales Partner Provisionsberechnung NICHT beeinträchtigen
@@ -1221,17 +1039,17 @@ def create_invoices(party, from_submit=False, from_button=False):
                 
                 def safe_validate_party_address(self, *args, **kwargs):
                     # Nur kritische Adress-Validierung überspringen, falls Adressen existieren
-                    frappe.log_error(f"Überspringe party_address für {self.customer}", "INFO: skip_validation")
+                    logger.info("Überspringe party_address für %s", self.customer, title="skip_validation")
                     pass
                 
                 def safe_validate_shipping_address(self, *args, **kwargs):
                     # Nur Versandadress-Validierung überspringen
-                    frappe.log_error(f"Überspringe shipping_address für {self.customer}", "INFO: skip_validation")
+                    logger.info("Überspringe shipping_address für %s", self.customer, title="skip_validation")
                     pass
                 
                 def safe_validate_billing_address(self, *args, **kwargs):
                     # Nur Rechnungsadress-Validierung überspringen  
-                    frappe.log_error(f"Überspringe billing_address für {self.customer}", "INFO: skip_validation")
+                    logger.info("Überspringe billing_address für %s", self.customer, title="skip_validation")
                     pass
                 
                 # Nur die spezifischen Adress-Validierungen deaktivieren
@@ -1242,112 +1060,37 @@ def create_invoices(party, from_submit=False, from_button=False):
                 # WICHTIG: validate(), validate_links(), Sales Partner Validierung etc. NICHT deaktivieren!
                 # Diese sind für Provisionsberechnung essentiell
                 
-                frappe.log_error(f"Führe order.insert() aus für '{customer}'...", "INFO: order_insert")
+                logger.info("Führe order.insert() aus für '%s'...", customer, title="order_insert")
                 
                 try:
                     order.insert()
-                    frappe.log_error(f"Order.insert() erfolgreich für '{customer}': {order.name}", "INFO: order_created")
+                    logger.info("Order.insert() erfolgreich für '%s': %s", customer, order.name, title="order_created")
                     
                     # Versuche den Auftrag einzureichen
-                    frappe.log_error(f"Führe order.submit() aus für '{customer}'...", "INFO: order_submit")
+                    logger.info("Führe order.submit() aus für '%s'...", customer, title="order_submit")
                     order.submit()
-                    frappe.log_error(f"Auftrag für {customer} eingereicht: {order.name}", "SUCCESS: order_complete")
+                    logger.info("Auftrag für %s eingereicht: %s", customer, order.name, title="order_complete")
+                    
+                    record_party_buchung(party, customer, sales_order=order.name)
+                    
+                    # Automatische Sales Invoice Erstellung
+                    invoice_name = create_invoice_for_order(order)
+                    if invoice_name:
+                        record_party_buchung(party, customer, sales_invoice=invoice_name)
+                    
+                    # Fortschritt festschreiben, damit ein erneuter Versuch hier weitermacht
+                    if not from_submit:
+                        frappe.db.commit()
                     
-                    # ========== NEU: AUTOMATISCHE SALES INVOICE ERSTELLUNG ==========
-                    try:
-                        frappe.log_error(f"Starte automatische Sales Invoice Erstellung für Sales Order: {order.name}", "INFO: auto_invoice_start")
-                        
-                        # Prüfe ob bereits eine Sales Invoice für diesen Sales Order existiert
-                        existing_invoices = frappe.get_all(
-                            "Sales Invoice",
-                            filters={
-                                "docstatus": ["!=", 2],
-                                "sales_order": order.name  # Prüfe nur auf diesen spezifischen Sales Order
-                            },
-                            fields=["name", "customer"],
-                            limit=1
-                        )
-                        
-                        if not existing_invoices:
-                            # Erstelle Sales Invoice basierend auf Sales Order
-                            invoice_data = {
-                                "doctype": "Sales Invoice",
-                                "customer": order.customer,
-                                "posting_date": frappe.utils.today(),
-                                "due_date": frappe.utils.today(),
-                                "customer_address": order.customer_address,
-                                "shipping_address_name": order.shipping_address_name,
-                                "po_no": order.po_no,
-                                "po_date": order.transaction_date,
-                                "company": order.company,
-                                "currency": order.currency,
-                                "selling_price_list": order.selling_price_list,
-                                "sales_partner": order.sales_partner,
-                                "remarks": f"Automatisch erstellt aus Sales Order: {order.name}",
-                                "items": []
-                            }
-                            
-                            # Sichere Behandlung von custom fields
-                            if hasattr(order, 'custom_party_reference') and order.custom_party_reference:
-                                # Prüfe ob die Party noch aktiv ist (nicht cancelled)
-                                try:
-                                    party_ref_doc = frappe.get_doc("Party", order.custom_party_reference)
-                                    if party_ref_doc.docstatus != 2:  # Nicht cancelled
-                                        invoice_data["custom_party_reference"] = order.custom_party_reference
-                                    else:
-                                        frappe.log_error(f"Party {order.custom_party_reference} ist cancelled - überspringe Referenz", "WARNING: cancelled_party_in_invoice")
-                                except Exception as e:
-                                    frappe.log_error(f"Fehler beim Laden der Party {order.custom_party_reference}: {str(e)}", "WARNING: party_ref_load_error")
-                                    
-                            if hasattr(order, 'custom_calculated_shipping_cost') and order.custom_calculated_shipping_cost:
-                                invoice_data["custom_calculated_shipping_cost"] = order.custom_calculated_shipping_cost
-                            
-                            # Kopiere alle Items vom Sales Order
-                            for item in order.items:
-                                invoice_item = {
-                                    "doctype": "Sales Invoice Item",
-                                    "item_code": item.item_code,
-                                    "item_name": item.item_name,
-                                    "description": item.description,
-                                    "qty": item.qty,
-                                    "rate": item.rate,
-                                    "amount": item.amount,
-                                    "uom": item.uom,
-                                    "conversion_factor": item.conversion_factor,
-                                    "warehouse": item.warehouse,
-                                    "cost_center": item.cost_center,
-                                    "income_account": item.income_account,
-                                    "sales_order": order.name,
-                                    "so_detail": item.name
-                                }
-                                invoice_data["items"].append(invoice_item)
-                            
-                            # Erstelle die Sales Invoice
-                            invoice = frappe.get_doc(invoice_data)
-                            invoice.insert()
-                            frappe.log_error(f"Sales Invoice erstellt: {invoice.name}", "INFO: invoice_created")
-                            
-                            # Reiche die Sales Invoice ein
-                            invoice.submit()
-                            frappe.log_error(f"Sales Invoice eingereicht: {invoice.name}", "SUCCESS: invoice_submitted")
-                            
-                            frappe.log_error(f"✅ Automatische Rechnung für {customer} erstellt: {invoice.name}", "SUCCESS: auto_invoice_complete")
-                            
-                        else:
-                            frappe.log_error(f"Sales Invoice existiert bereits für Sales Order {order.name}: {existing_invoices[0]['name']}", "INFO: invoice_already_exists")
-                            
-                    except Exception as invoice_error:
-                        frappe.log_error(f"❌ Fehler bei automatischer Rechnungserstellung für {order.name}: {str(invoice_error)}\n{frappe.get_traceback()}", "ERROR: auto_invoice_failed")
-                        # Fehler nicht weiterwerfen - Sales Order soll trotzdem erfolgreich sein
-                    # ========== ENDE: AUTOMATISCHE SALES INVOICE ERSTELLUNG ==========
                     
                 except Exception as e:
-                    frappe.log_error(f"KRITISCHER FEHLER bei Order für {customer}: {str(e)}\nTraceback: {frappe.get_traceback()}", "ERROR: order_error_detailed")
+                    logger.error(f"KRITISCHER FEHLER bei Order für {customer}: {str(e)}\nTraceback: {frappe.get_traceback()}", title="order_error_detailed")
                     # Den Auftrag trotzdem zur Liste hinzufügen wenn er erstellt wurde
                     if hasattr(order, 'name') and order.name:
                         # ENTFERNT: frappe.msgprint(f"Auftrag für {customer} wurde erstellt ({order.name}), konnte aber nicht eingereicht werden: {str(e)}", alert=True)
+                        record_party_buchung(party, customer, sales_order=order.name)
                         created_orders.append(order.name)  # WICHTIG: Auch fehlerhafte Orders hinzufügen!
-                        frappe.log_error(f"Fehlerhafter Auftrag {order.name} trotzdem hinzugefügt. Anzahl: {len(created_orders)}", "INFO: error_order_added")
+                        logger.info("Fehlerhafter Auftrag %s trotzdem hinzugefügt. Anzahl: %s", order.name, len(created_orders), title="error_order_added")
                     else:
                         # ENTFERNT: frappe.msgprint(f"Auftrag für {customer} konnte nicht erstellt werden: {str(e)}", alert=True)
                         continue
@@ -1355,10 +1098,10 @@ def create_invoices(party, from_submit=False, from_button=False):
                 # Zur Liste der erstellten Aufträge hinzufügen (nur wenn nicht schon bei Fehler hinzugefügt)
                 if not (hasattr(order, 'name') and order.name in created_orders):
                     created_orders.append(order.name)
-                    frappe.log_error(f"Auftrag {order.name} hinzugefügt. Anzahl: {len(created_orders)}", "INFO: order_added")
+                    logger.info("Auftrag %s hinzugefügt. Anzahl: %s", order.name, len(created_orders), title="order_added")
                 
             except Exception as e:
-                frappe.log_error(f"Kritischer Fehler für {order_info.get('customer', 'Unbekannt')}: {str(e)}", "ERROR: critical_order_error")
+                logger.error(f"Kritischer Fehler für {order_info.get('customer', 'Unbekannt')}: {str(e)}", title="critical_order_error")
                 # Bei kritischen Fehlern den Auftrag überspringen, aber weitermachen mit den anderen
                 # ENTFERNT: frappe.msgprint(f"Auftrag für {order_info.get('customer', 'Unbekannt')} konnte nicht erstellt werden: {str(e)}", alert=True)
                 continue
@@ -1367,11 +1110,12 @@ def create_invoices(party, from_submit=False, from_button=False):
         if created_orders:
             # NEU: Erstelle Picklists (Auswahllisten) nach Versandzielen gruppiert
             try:
-                frappe.log_error(f"Starte Picklist Erstellung für {len(created_orders)} Aufträge", "INFO: picklist_start")
+                publish_booking_progress(party, len(all_orders_with_shipping), len(all_orders_with_shipping), "Erstelle Auswahllisten")
+                logger.info("Starte Picklist Erstellung für %s Aufträge", len(created_orders), title="picklist_start")
                 created_picklists = create_picklists_for_party(party_doc, all_orders_with_shipping, created_orders)
-                frappe.log_error(f"Picklists erstellt: {created_picklists}", "INFO: picklists_created")
+                logger.info("Picklists erstellt: %s", created_picklists, title="picklists_created")
             except Exception as e:
-                frappe.log_error(f"Fehler bei Picklist Erstellung: {str(e)}", "ERROR: picklist_creation")
+                logger.error(f"Fehler bei Picklist Erstellung: {str(e)}", title="picklist_creation")
                 created_picklists = []  # Fallback für Fehlerfälle
             
             # Status auf "Abgeschlossen" setzen
@@ -1388,18 +1132,13 @@ def create_invoices(party, from_submit=False, from_button=False):
                 indicator="green"
             )
         else:
-            frappe.log_error(f"Keine Aufträge erstellt für Party {party}. Einträge: {len(all_orders_with_shipping)}", "ERROR: no_orders_created")
+            logger.error(f"Keine Aufträge erstellt für Party {party}. Einträge: {len(all_orders_with_shipping)}", title="no_orders_created")
             if all_orders_with_shipping:
-                frappe.log_error(f"Fehlgeschlagene Kunden: {[order.get('customer', 'Unknown') for order in all_orders_with_shipping]}", "ERROR: failed_customers")
+                logger.error(f"Fehlgeschlagene Kunden: {[order.get('customer', 'Unknown') for order in all_orders_with_shipping]}", title="failed_customers")
             # ENTFERNT: frappe.msgprint("Es wurden keine Aufträge erstellt. Bitte prüfe die Logs und versuche es erneut.", alert=True)
         
         frappe.db.commit()
-        frappe.log_error(f"create_invoices beendet. Rückgabe: {created_orders}", "INFO: function_end")
-        
-        # WICHTIG: Räume das skip_total_calculation Flag auf, damit es nicht hängen bleibt
-        if hasattr(party_doc, 'skip_total_calculation'):
-            delattr(party_doc, 'skip_total_calculation')
-            frappe.log_error("skip_total_calculation Flag aufgeräumt", "INFO: flag_cleanup")
+        logger.info("create_invoices beendet. Rückgabe: %s", created_orders, title="function_end")
         
         # === FILTER FÜR STÖRENDE _SERVER_MESSAGES ===
         # Entferne die störenden "Adresse -100539 nicht gefunden" Meldungen
@@ -1421,22 +1160,14 @@ def create_invoices(party, from_submit=False, from_button=False):
             ]
             filtered_count = original_count - len(frappe.local.message_log)
             if filtered_count > 0:
-                frappe.log_error(f"FILTERED: {filtered_count} störende Adressmeldungen entfernt", "INFO: messages_filtered")
+                logger.info("FILTERED: %s störende Adressmeldungen entfernt", filtered_count, title="messages_filtered")
         
         return created_orders
         
     except Exception as e:
         # Bei Fehlern Rollback und Fehlermeldung
         frappe.db.rollback()
-        frappe.log_error(f"Allgemeiner Fehler: {str(e)}\n{frappe.get_traceback()}", f"ERROR: Auftragserstellung für Party {party}")
-        
-        # WICHTIG: Auch bei Fehlern das Flag aufräumen
-        try:
-            if hasattr(party_doc, 'skip_total_calculation'):
-                delattr(party_doc, 'skip_total_calculation')
-                frappe.log_error("skip_total_calculation Flag bei Fehler aufgeräumt", "INFO: error_flag_cleanup")
-        except:
-            pass  # Falls party_doc nicht existiert, ignoriere den Fehler
+        logger.error(f"Allgemeiner Fehler: {str(e)}\n{frappe.get_traceback()}", title=f"Auftragserstellung für Party {party}")
         
         # Wenn der Aufruf aus before_submit kommt, müssen wir den Fehler einfach weiterreichen
         if from_submit:
@@ -1444,6 +1175,431 @@ def create_invoices(party, from_submit=False, from_button=False):
         else:
             # Nur bei direktem Aufruf über die API eine Fehlermeldung anzeigen
             frappe.throw(f"Fehler beim Erstellen der Aufträge: {str(e)}")
+    
+    finally:
+        end_party_buchung()
+        release_party_booking_lock(booking_lock)
+
+
+def create_invoice_for_order(order):
+	"""
+	Erstellt und reicht die Sales Invoice zu einem eingereichten Sales Order ein.
+	Fehler werden protokolliert und nicht weitergeworfen - der Auftrag bleibt gültig.
+
+	Returns:
+		Name der (bereits bestehenden oder neuen) Sales Invoice oder None
+	"""
+	try:
+		logger.info("Starte automatische Sales Invoice Erstellung für Sales Order: %s", order.name, title="auto_invoice_start")
+
+		# Prüfe ob bereits eine Sales Invoice für diesen Sales Order existiert
+		existing_invoices = frappe.get_all(
+			"Sales Invoice",
+			filters={
+				"docstatus": ["!=", 2],
+				"sales_order": order.name  # Prüfe nur auf diesen spezifischen Sales Order
+			},
+			fields=["name", "customer"],
+			limit=1
+		)
+
+		if not existing_invoices:
+			# Erstelle Sales Invoice basierend auf Sales Order
+			invoice_data = {
+				"doctype": "Sales Invoice",
+				"customer": order.customer,
+				"posting_date": frappe.utils.today(),
+				"due_date": frappe.utils.today(),
+				"customer_address": order.customer_address,
+				"shipping_address_name": order.shipping_address_name,
+				"po_no": order.po_no,
+				"po_date": order.transaction_date,
+				"company": order.company,
+				"currency": order.currency,
+				"selling_price_list": order.selling_price_list,
+				"sales_partner": order.sales_partner,
+				"remarks": f"Automatisch erstellt aus Sales Order: {order.name}",
+				"items": []
+			}
+
+			# Sichere Behandlung von custom fields
+			if hasattr(order, 'custom_party_reference') and order.custom_party_reference:
+				# Prüfe ob die Party noch aktiv ist (nicht cancelled)
+				try:
+					party_ref_doc = frappe.get_doc("Party", order.custom_party_reference)
+					if party_ref_doc.docstatus != 2:  # Nicht cancelled
+						invoice_data["custom_party_reference"] = order.custom_party_reference
+					else:
+						logger.warn(f"Party {order.custom_party_reference} ist cancelled - überspringe Referenz", title="cancelled_party_in_invoice")
+				except Exception as e:
+					logger.warn(f"Fehler beim Laden der Party {order.custom_party_reference}: {str(e)}", title="party_ref_load_error")
+
+			if hasattr(order, 'custom_calculated_shipping_cost') and order.custom_calculated_shipping_cost:
+				invoice_data["custom_calculated_shipping_cost"] = order.custom_calculated_shipping_cost
+
+			# Kopiere alle Items vom Sales Order
+			for item in order.items:
+				invoice_item = {
+					"doctype": "Sales Invoice Item",
+					"item_code": item.item_code,
+					"item_name": item.item_name,
+					"description": item.description,
+					"qty": item.qty,
+					"rate": item.rate,
+					"amount": item.amount,
+					"uom": item.uom,
+					"conversion_factor": item.conversion_factor,
+					"warehouse": item.warehouse,
+					"cost_center": item.cost_center,
+					"income_account": item.income_account,
+					"sales_order": order.name,
+					"so_detail": item.name
+				}
+				invoice_data["items"].append(invoice_item)
+
+			# Erstelle die Sales Invoice
+			invoice = frappe.get_doc(invoice_data)
+			invoice.insert()
+			logger.info("Sales Invoice erstellt: %s", invoice.name, title="invoice_created")
+
+			# Reiche die Sales Invoice ein
+			invoice.submit()
+			logger.info("Sales Invoice eingereicht: %s", invoice.name, title="invoice_submitted")
+
+			logger.info("✅ Automatische Rechnung für %s erstellt: %s", order.customer, invoice.name, title="auto_invoice_complete")
+			return invoice.name
+		else:
+			logger.info("Sales Invoice existiert bereits für Sales Order %s: %s", order.name, existing_invoices[0]['name'], title="invoice_already_exists")
+			return existing_invoices[0]["name"]
+
+	except Exception as invoice_error:
+		logger.error(f"❌ Fehler bei automatischer Rechnungserstellung für {order.name}: {str(invoice_error)}\n{frappe.get_traceback()}", title="auto_invoice_failed")
+		# Fehler nicht weiterwerfen - Sales Order soll trotzdem erfolgreich sein
+		return None
+
+
+# Lock läuft spätestens nach dieser Zeit ab, falls ein Worker hart beendet wird
+BOOKING_LOCK_TIMEOUT = 30 * 60
+
+
+def acquire_party_booking_lock(party):
+	"""
+	Redis-Lock pro Party über alle Gunicorn-/RQ-Worker hinweg.
+	Ist die Party bereits gesperrt, bricht der zweite Aufruf sofort ab statt doppelt zu buchen.
+	"""
+	lock = frappe.cache().lock(
+		frappe.cache().make_key(f"party_booking_lock::{party}"),
+		timeout=BOOKING_LOCK_TIMEOUT
+	)
+	if not lock.acquire(blocking=False):
+		frappe.throw(
+			f"Die Präsentation {party} wird gerade gebucht. Bitte warten Sie, bis die laufende Buchung abgeschlossen ist.",
+			title="Buchung läuft bereits"
+		)
+	return lock
+
+
+def release_party_booking_lock(lock):
+	try:
+		lock.release()
+	except Exception:
+		# Lock ist bereits abgelaufen
+		pass
+
+
+def get_party_buchungen(party):
+	"""
+	Bereits gebuchte Kunden einer Party (Unique-Index auf party, customer)
+
+	Returns:
+		dict: {customer: {"name", "customer", "sales_order", "sales_invoice", "pick_list"}}
+	"""
+	return {
+		buchung.customer: buchung
+		for buchung in frappe.get_all(
+			"Party Buchung",
+			filters={"party": party},
+			fields=["name", "customer", "sales_order", "sales_invoice", "pick_list"]
+		)
+	}
+
+
+def record_party_buchung(party, customer, **values):
+	"""Legt den Buchungseintrag für Party und Kunde an oder ergänzt ihn (sales_order, sales_invoice, pick_list)"""
+	name = frappe.db.get_value("Party Buchung", {"party": party, "customer": customer})
+	if name:
+		frappe.db.set_value("Party Buchung", name, values)
+		return name
+
+	buchung = frappe.get_doc({"doctype": "Party Buchung", "party": party, "customer": customer, **values})
+	buchung.insert(ignore_permissions=True)
+	return buchung.name
+
+
+# Gültigkeit eines gecachten Buchungsplans (Adressen/Artikel können sich außerhalb der Party ändern)
+BOOKING_PLAN_CACHE_SECONDS = 600
+
+
+def get_booking_plan_cache_key(party_doc):
+	"""Cache-Schlüssel pro Party, Inhalts-Hash und Tag (Lieferdaten hängen vom Datum ab)"""
+	return f"party_booking_plan::{party_doc.name}::{party_doc.produkt_hash or party_doc.get_produkt_hash()}::{today()}"
+
+
+def get_booking_plan(party_doc, use_cache=True):
+	"""
+	Liefert den Buchungsplan der Party: aus dem Cache, solange sich Produkte/Teilnehmer
+	nicht geändert haben, sonst frisch berechnet über build_booking_plan.
+	Der Cache dient nur der Vorschau (preview_party_booking) - create_invoices bucht mit use_cache=False.
+	"""
+	cache_key = get_booking_plan_cache_key(party_doc)
+	if use_cache:
+		plan = frappe.cache().get_value(cache_key)
+		if plan:
+			logger.debug("Buchungsplan für %s aus dem Cache", party_doc.name, title="booking_plan_cache")
+			return plan
+
+	plan = build_booking_plan(party_doc)
+	frappe.cache().set_value(cache_key, plan, expires_in_sec=BOOKING_PLAN_CACHE_SECONDS)
+	return plan
+
+
+def build_booking_plan(party_doc):
+	"""
+	Berechnet ohne Schreibzugriffe, welche Aufträge eine Buchung erzeugen würde:
+	Gruppierung pro Kunde, Versandkosten, Gutschein-Preise (_force_zero_rate) und Adressen.
+	Wird von create_invoices ausgeführt und von preview_party_booking angezeigt.
+
+	Returns:
+		dict: {"party", "produkt_hash", "orders": [Auftrag wie calculate_shipping_costs_for_party,
+			ergänzt um billing_address, shipping_address und skip_reason]}
+	"""
+	# Gästeliste prüfen
+	if not party_doc.kunden or len(party_doc.kunden) < 3:
+		frappe.throw("Es müssen mindestens 3 Gäste/Kunden zur Party hinzugefügt werden.")
+
+	# Prüfe, ob die Gastgeberin existiert
+	if not party_doc.gastgeberin:
+		frappe.throw("Es wurde keine Gastgeberin angegeben.")
+
+	# Vollständige Produktvalidierung für alle Teilnehmer
+	teilnehmer_ohne_produkte = []
+	produkte_nach_teilnehmer = party_doc.get_produkte_nach_teilnehmer()
+
+	def hat_produkte(kunde):
+		return any(p.item_code and p.qty and p.qty > 0 for p in produkte_nach_teilnehmer.get(kunde, []))
+
+	# Prüfe Gastgeberin
+	if not hat_produkte(party_doc.gastgeberin):
+		teilnehmer_ohne_produkte.append(f"Gastgeberin ({party_doc.gastgeberin})")
+
+	# Prüfe alle Gäste
+	for idx, kunde_row in enumerate(party_doc.kunden):
+		if kunde_row.kunde and not hat_produkte(kunde_row.kunde):
+			teilnehmer_ohne_produkte.append(f"Gast {idx + 1} ({kunde_row.kunde})")
+
+	# Wenn Teilnehmer ohne Produkte gefunden wurden, Fehlermeldung anzeigen
+	if teilnehmer_ohne_produkte:
+		frappe.throw(
+			f"Die folgenden Teilnehmer haben noch keine Produkte ausgewählt: {', '.join(teilnehmer_ohne_produkte)}. "
+			f"Bitte wählen Sie für jeden Teilnehmer (Gastgeberin und alle Gäste) mindestens ein Produkt aus, "
+			f"bevor Sie die Aufträge erstellen. Sie können auch Gäste ohne Bestellung aus der Gästeliste entfernen."
+		)
+
+	# Produkte-Check: Hat irgendein Kunde oder die Gastgeberin Produkte?
+	if not any(hat_produkte(kunde) for kunde in party_doc.get_teilnehmer()):
+		frappe.throw("Es wurden keine Produkte ausgewählt. Bitte wählen Sie mindestens ein Produkt aus, bevor Sie Aufträge erstellen.")
+
+	# Sammle alle Bestellungen mit ihren Versandzielen und berechne Versandkosten
+	orders = calculate_shipping_costs_for_party(party_doc)
+	logger.debug("Anzahl Orders mit Versandkosten: %s", len(orders), title="orders_count")
+
+	# Alle Rechnungs- und Versandadressen mit einer Abfrage vorab laden
+	party_addresses = resolve_party_addresses(party_doc)
+	for order in orders:
+		plan_order_addresses(order, party_addresses)
+
+	return {
+		"party": party_doc.name,
+		"produkt_hash": party_doc.produkt_hash,
+		"orders": orders,
+	}
+
+
+def plan_order_addresses(order, party_addresses):
+	"""
+	Rechnungsadresse: IMMER Billing vom Kunden (der bestellt)
+	Versandadresse: Shipping vom Versandziel, Fallback auf Billing vom Versandziel
+	Fehlt eine Adresse, wird der Auftrag mit skip_reason markiert und bei der Buchung übersprungen.
+	"""
+	customer = order["customer"]
+	shipping_target = order["shipping_target"]
+
+	billing_address = party_addresses.get(customer, (None, None))[0]
+	target_billing, target_shipping = party_addresses.get(shipping_target, (None, None))
+	shipping_address = target_shipping or target_billing
+
+	order["billing_address"] = billing_address
+	order["shipping_address"] = shipping_address
+	order["skip_reason"] = None
+
+	if not billing_address:
+		order["skip_reason"] = f"Keine Adresse für Kunde '{customer}' gefunden"
+	elif not shipping_address:
+		order["skip_reason"] = f"Keine Adresse für Versandziel '{shipping_target}' gefunden"
+	elif not target_shipping:
+		logger.info("Versand-Fallback: Billing-Adresse von '%s': %s", shipping_target, shipping_address, title="shipping_fallback")
+
+
+@frappe.whitelist()
+def preview_party_booking(party):
+	"""
+	Trockenlauf der Buchung: zeigt, welche Aufträge mit welchen Positionen, Versandkosten
+	und Adressen erstellt würden, ohne etwas zu schreiben.
+	"""
+	party_doc = frappe.get_doc("Party", party)
+	party_doc.check_permission("read")
+
+	plan = get_booking_plan(party_doc)
+
+	orders = []
+	for order in plan["orders"]:
+		lines = []
+		for product in order["products"]:
+			# Gutschein-reduzierte Artikel werden bei der Buchung fest auf 0€ gesetzt
+			rate = 0 if product.get("_force_zero_rate") else flt(product.get("rate"))
+			lines.append({
+				"item_code": product["item_code"],
+				"item_name": product.get("item_name"),
+				"qty": flt(product.get("qty")),
+				"rate": rate,
+				"amount": flt(product.get("qty")) * rate,
+				"is_shipping": bool(product.get("_shipping_item")),
+				"force_zero_rate": bool(product.get("_force_zero_rate")),
+			})
+
+		orders.append({
+			"customer": order["customer"],
+			"order_type": order["order_type"],
+			"shipping_target": order["shipping_target"],
+			"billing_address": order.get("billing_address"),
+			"shipping_address": order.get("shipping_address"),
+			"skip_reason": order.get("skip_reason"),
+			"shipping": {
+				"item_code": order.get("shipping_item_code"),
+				"cost": flt(order.get("shipping_cost")),
+				"note": order.get("shipping_note"),
+			},
+			"lines": lines,
+			"total": sum(line["amount"] for line in lines),
+		})
+
+	gebuchte_orders = [order for order in orders if not order["skip_reason"]]
+	return {
+		"party": party,
+		"produkt_hash": plan["produkt_hash"],
+		"orders": orders,
+		"totals": {
+			"orders": len(gebuchte_orders),
+			"skipped": len(orders) - len(gebuchte_orders),
+			"grand_total": sum(order["total"] for order in gebuchte_orders),
+			"shipping_total": sum(order["shipping"]["cost"] for order in gebuchte_orders),
+		},
+	}
+
+
+def get_booking_job_id(party):
+	"""Feste Job-ID pro Party, damit wiederholte Klicks denselben Job finden"""
+	return f"party_booking::{party}"
+
+
+@frappe.whitelist()
+def enqueue_party_booking(party):
+	"""
+	Startet die Buchung (create_invoices) als Hintergrund-Job auf der "long"-Queue.
+	Läuft für diese Party bereits ein Job, wird kein zweiter gestartet - der Aufrufer
+	hängt sich über die Realtime-Events an den laufenden Job an.
+	
+	Returns:
+		dict: {"job_id": ..., "joined": True wenn bereits ein Job lief}
+	"""
+	from frappe.utils.background_jobs import is_job_enqueued
+	
+	frappe.has_permission("Party", "submit", party, throw=True)
+	
+	job_id = get_booking_job_id(party)
+	if is_job_enqueued(job_id):
+		logger.info("Buchung für Party %s läuft bereits (%s)", party, job_id, title="booking_joined")
+		return {"job_id": job_id, "joined": True}
+	
+	frappe.db.set_value("Party", party, "booking_job_id", job_id, update_modified=False)
+	frappe.enqueue(
+		"enjo_party.enjo_party.doctype.party.party.run_party_booking",
+		queue="long",
+		timeout=3600,
+		job_id=job_id,
+		deduplicate=True,
+		enqueue_after_commit=True,
+		party=party
+	)
+	logger.info("Buchung für Party %s eingereiht (%s)", party, job_id, title="booking_enqueued")
+	return {"job_id": job_id, "joined": False}
+
+
+@frappe.whitelist()
+def get_party_booking_status(party):
+	"""
+	Liefert den Status eines Buchungs-Jobs für das Formular (z.B. nach einem Reload).
+	Eine hängengebliebene Job-ID (Worker abgestürzt) wird dabei aufgeräumt.
+	"""
+	from frappe.utils.background_jobs import is_job_enqueued
+	
+	job_id = frappe.db.get_value("Party", party, "booking_job_id")
+	if not job_id:
+		return {"running": False}
+	
+	if is_job_enqueued(job_id):
+		return {"running": True, "job_id": job_id}
+	
+	frappe.db.set_value("Party", party, "booking_job_id", None, update_modified=False)
+	return {"running": False}
+
+
+def run_party_booking(party):
+	"""
+	Hintergrund-Job: führt create_invoices aus und meldet das Ergebnis per Realtime
+	(party_booking_done / party_booking_error) an alle offenen Formulare dieser Party.
+	"""
+	try:
+		created_orders = create_invoices(party, from_button=True)
+		frappe.publish_realtime(
+			"party_booking_done",
+			{"party": party, "orders": created_orders or []},
+			doctype="Party",
+			docname=party
+		)
+	except Exception as e:
+		frappe.db.rollback()
+		frappe.publish_realtime(
+			"party_booking_error",
+			{"party": party, "error": str(e)},
+			doctype="Party",
+			docname=party
+		)
+		raise
+	finally:
+		frappe.db.set_value("Party", party, "booking_job_id", None, update_modified=False)
+		frappe.db.commit()
+
+
+def publish_booking_progress(party, current, total, description):
+	"""Fortschritt pro Teilnehmer an das Party-Formular senden"""
+	frappe.publish_realtime(
+		"party_booking_progress",
+		{"party": party, "current": current, "total": total, "description": description},
+		doctype="Party",
+		docname=party
+	)
+
 
 @frappe.whitelist()
 def cancel_multiple_parties(parties):
@@ -1481,7 +1637,7 @@ def cancel_multiple_parties(parties):
                 failed_count += 1
                 
         except Exception as e:
-            frappe.log_error(f"Fehler beim Abbrechen der Party {party_name}: {str(e)}\n{frappe.get_traceback()}", "ERROR: cancel_party")
+            logger.error(f"Fehler beim Abbrechen der Party {party_name}: {str(e)}\n{frappe.get_traceback()}", title="cancel_party")
             failed_count += 1
             
     frappe.db.commit()
@@ -1501,129 +1657,137 @@ def find_existing_address(customer_name, preferred_type="Billing"):
     - Falls preferred_type nicht gefunden wird, nimm andere verfügbare Adresse
     - NIEMALS neue Adressen erstellen!
     - ERWEITERT: Sucht auch in Contact-verknüpften Adressen
-    """
-    frappe.log_error(f"=== find_existing_address START: Customer='{customer_name}', Type='{preferred_type}' ===", "DEBUG: find_address_start")
     
+    Für mehrere Kunden (z.B. alle Teilnehmer einer Party) stattdessen
+    resolve_party_addresses() verwenden - das braucht nur eine Abfrage.
+    """
     try:
-        # Prüfen, ob der Customer überhaupt existiert
-        if not frappe.db.exists("Customer", customer_name):
-            frappe.log_error(f"❌ Customer '{customer_name}' existiert nicht!", "ERROR: find_address")
-            return None
-        
-        frappe.log_error(f"✅ Customer '{customer_name}' existiert", "DEBUG: customer_exists")
+        addresses = get_customer_addresses([customer_name]).get(customer_name, [])
+        result = pick_address(addresses, preferred_type)
         
-        # Hole den echten Kundennamen für bessere Fehlermeldungen
-        customer_doc = frappe.get_doc("Customer", customer_name)
-        display_name = customer_doc.customer_name or customer_name
-        frappe.log_error(f"Customer Display Name: '{display_name}'", "DEBUG: customer_name")
+        if not result:
+            logger.warn(f"❌ RÜCKGABE: None - Keine verwendbaren Adressen für '{customer_name}' gefunden", title="no_usable_address")
         
-        # ERWEITERT: Finde alle Adressen für diesen Kunden (Customer + Contact Links)
-        address_links = []
+        return result
         
-        # 1. Direkte Customer-Links
-        frappe.log_error(f"Suche direkte Customer-Links für '{customer_name}'...", "DEBUG: search_customer_links")
-        customer_links = frappe.get_all(
-            "Dynamic Link",
-            filters={"link_doctype": "Customer", "link_name": customer_name},
-            fields=["parent"]
-        )
-        frappe.log_error(f"Gefunden: {len(customer_links)} direkte Customer-Links: {[link['parent'] for link in customer_links]}", "DEBUG: customer_links_found")
-        address_links.extend(customer_links)
-        
-        # 2. Contact-Links (Adressen die über Kontakte verknüpft sind)
-        try:
-            frappe.log_error(f"Suche Contact-Links für '{customer_name}'...", "DEBUG: search_contact_links")
-            contact_links = frappe.get_all(
-                "Dynamic Link", 
-                filters={"link_doctype": "Contact"},
-                fields=["parent", "link_name"]
-            )
-            frappe.log_error(f"Alle Contact-Links gefunden: {len(contact_links)}", "DEBUG: all_contacts")
-            
-            # Prüfe welche Kontakte zu diesem Customer gehören
-            contact_count = 0
-            for contact_link in contact_links:
-                if contact_link.parent and frappe.db.exists("Contact", contact_link.link_name):
-                    # Prüfe, ob dieser Contact mit unserem Customer verknüpft ist
-                    contact_customer_links = frappe.get_all(
-                        "Dynamic Link",
-                        filters={
-                            "parent": contact_link.link_name,
-                            "parenttype": "Contact", 
-                            "link_doctype": "Customer",
-                            "link_name": customer_name
-                        },
-                        fields=["parent"]
-                    )
-                    
-                    if contact_customer_links:
-                        # Dieser Contact gehört zu unserem Customer, also verwende seine Adresse
-                        address_links.append({"parent": contact_link.parent})
-                        contact_count += 1
-                        frappe.log_error(f"✅ Contact-Adresse #{contact_count} gefunden für '{display_name}': {contact_link.parent}", "INFO: contact_address_found")
-            
-            frappe.log_error(f"Gefunden: {contact_count} Contact-Adressen für '{customer_name}'", "DEBUG: contact_summary")
-        except Exception as e:
-            frappe.log_error(f"❌ Fehler beim Suchen von Contact-Adressen für '{display_name}': {str(e)}", "WARNING: contact_search_error")
-        
-        # Entferne Duplikate
-        unique_addresses = list({link["parent"]: link for link in address_links if link.get("parent")}.values())
-        frappe.log_error(f"Unique Adressen gefunden: {len(unique_addresses)} - {[link['parent'] for link in unique_addresses]}", "DEBUG: unique_addresses")
-        
-        if not unique_addresses:
-            frappe.log_error(f"❌ Keine Adressen für Customer '{display_name}' gefunden", "WARNING: no_addresses")
-            return None
-        
-        # Sammle Adressen nach Typ
-        preferred_addresses = []
-        other_addresses = []
-        
-        frappe.log_error(f"Analysiere {len(unique_addresses)} Adressen nach Typ '{preferred_type}'...", "DEBUG: analyze_addresses")
-        
-        for i, link in enumerate(unique_addresses):
-            try:
-                addr_name = link["parent"]
-                frappe.log_error(f"Lade Adresse #{i+1}: {addr_name}...", "DEBUG: load_address")
-                addr = frappe.get_doc("Address", addr_name)
-                
-                # Prüfe, ob die Adresse vollständig ist
-                if not addr.address_line1 or not addr.city or not addr.country:
-                    frappe.log_error(f"❌ Unvollständige Adresse #{i+1} für '{display_name}': {addr.name} (Line1: {bool(addr.address_line1)}, City: {bool(addr.city)}, Country: {bool(addr.country)})", "WARNING: incomplete_address")
-                    continue
-                
-                frappe.log_error(f"✅ Vollständige Adresse #{i+1}: {addr.name}, Typ: {addr.address_type}", "DEBUG: complete_address")
-                    
-                if addr.address_type == preferred_type:
-                    preferred_addresses.append(addr.name)
-                    frappe.log_error(f"✅ {preferred_type}-Adresse gefunden: {addr.name}", "DEBUG: preferred_found")
-                else:
-                    other_addresses.append(addr.name)
-                    frappe.log_error(f"📋 Andere Adresse gefunden: {addr.name} (Typ: {addr.address_type})", "DEBUG: other_found")
-            except Exception as e:
-                frappe.log_error(f"❌ Fehler beim Laden der Adresse {link['parent']}: {str(e)}", "ERROR: load_address")
-                continue
-        
-        # Rückgabe-Logik
-        frappe.log_error(f"Adress-Analyse abgeschlossen: {len(preferred_addresses)} {preferred_type}, {len(other_addresses)} andere", "DEBUG: analysis_complete")
-        
-        if preferred_addresses:
-            result = preferred_addresses[0]
-            frappe.log_error(f"🎯 RÜCKGABE: {preferred_type}-Adresse für '{display_name}': {result}", "INFO: address_found")
-            return result
-        elif other_addresses:
-            result = other_addresses[0]
-            frappe.log_error(f"🔄 RÜCKGABE: Fallback-Adresse für '{display_name}': {result} (kein {preferred_type} gefunden)", "INFO: address_fallback")
-            return result
-        else:
-            frappe.log_error(f"❌ RÜCKGABE: None - Keine verwendbaren Adressen für '{display_name}' gefunden", "WARNING: no_usable_address")
-            return None
-            
     except Exception as e:
-        frappe.log_error(f"❌ Kritischer Fehler beim Suchen von Adressen für '{customer_name}': {str(e)}\n{frappe.get_traceback()}", "ERROR: find_address_error")
+        logger.error(f"❌ Kritischer Fehler beim Suchen von Adressen für '{customer_name}': {str(e)}\n{frappe.get_traceback()}", title="find_address_error")
         return None
-    
-    finally:
-        frappe.log_error(f"=== find_existing_address ENDE für '{customer_name}' ===", "DEBUG: find_address_end")
+
+
+def get_customer_addresses(customers):
+	"""
+	Lädt alle vollständigen Adressen (address_line1, city, country) für mehrere Kunden
+	mit einer einzigen Abfrage.
+	Berücksichtigt direkt mit dem Customer verknüpfte Adressen und Adressen,
+	die über einen Contact des Customers verknüpft sind.
+	
+	Args:
+		customers: Liste von Customer-Namen
+	
+	Returns:
+		dict: {customer: [{"address": ..., "address_type": ...}, ...]}
+		Direkte Adressen stehen vor Contact-Adressen, jeweils die neueste Verknüpfung zuerst.
+	"""
+	customers = list(dict.fromkeys(c for c in customers if c))
+	if not customers:
+		return {}
+	
+	rows = frappe.db.sql(
+		"""
+		SELECT customer, address, address_type
+		FROM (
+			SELECT
+				dl.link_name AS customer,
+				a.name AS address,
+				a.address_type,
+				0 AS quelle,
+				dl.modified AS link_modified
+			FROM `tabDynamic Link` dl
+			INNER JOIN `tabAddress` a ON a.name = dl.parent
+			WHERE dl.parenttype = 'Address'
+				AND dl.link_doctype = 'Customer'
+				AND dl.link_name IN %(customers)s
+				AND IFNULL(a.address_line1, '') != ''
+				AND IFNULL(a.city, '') != ''
+				AND IFNULL(a.country, '') != ''
+			
+			UNION ALL
+			
+			SELECT
+				cl.link_name AS customer,
+				a.name AS address,
+				a.address_type,
+				1 AS quelle,
+				al.modified AS link_modified
+			FROM `tabDynamic Link` cl
+			INNER JOIN `tabContact` c ON c.name = cl.parent
+			INNER JOIN `tabDynamic Link` al
+				ON al.link_doctype = 'Contact'
+				AND al.link_name = c.name
+				AND al.parenttype = 'Address'
+			INNER JOIN `tabAddress` a ON a.name = al.parent
+			WHERE cl.parenttype = 'Contact'
+				AND cl.link_doctype = 'Customer'
+				AND cl.link_name IN %(customers)s
+				AND IFNULL(a.address_line1, '') != ''
+				AND IFNULL(a.city, '') != ''
+				AND IFNULL(a.country, '') != ''
+		) adressen
+		ORDER BY customer, quelle, link_modified DESC
+		""",
+		{"customers": customers},
+		as_dict=True
+	)
+	
+	addresses = {}
+	for row in rows:
+		customer_addresses = addresses.setdefault(row.customer, [])
+		# Duplikate entfernen (Adresse direkt UND über Contact verknüpft)
+		if not any(a["address"] == row.address for a in customer_addresses):
+			customer_addresses.append({"address": row.address, "address_type": row.address_type})
+	
+	return addresses
+
+
+def pick_address(addresses, preferred_type="Billing"):
+	"""
+	Wählt aus den Adressen eines Kunden die passende aus:
+	zuerst eine Adresse vom preferred_type, sonst die erste andere vollständige Adresse.
+	"""
+	for address in addresses:
+		if address["address_type"] == preferred_type:
+			return address["address"]
+	
+	return addresses[0]["address"] if addresses else None
+
+
+def resolve_party_addresses(party_doc):
+	"""
+	Ermittelt Rechnungs- und Versandadresse für alle Teilnehmer einer Party
+	(Gastgeberin, alle Gäste und deren Versandziele) mit einer einzigen Abfrage.
+	
+	Returns:
+		dict: {customer: (billing_address, shipping_address)}
+		Beide Adressen fallen auf eine andere vollständige Adresse zurück,
+		wenn der bevorzugte Typ fehlt (wie bei find_existing_address).
+	"""
+	teilnehmer = [party_doc.gastgeberin, party_doc.versand_gastgeberin]
+	for kunde_row in party_doc.kunden or []:
+		teilnehmer.append(kunde_row.kunde)
+		teilnehmer.append(kunde_row.versand_zu)
+	
+	addresses = get_customer_addresses(teilnehmer)
+	
+	return {
+		customer: (
+			pick_address(addresses.get(customer, []), "Billing"),
+			pick_address(addresses.get(customer, []), "Shipping")
+		)
+		for customer in teilnehmer
+		if customer
+	}
+
 
 def create_picklists_for_party(party_doc, all_orders_with_shipping, created_order_names):
 	"""
@@ -1631,6 +1795,9 @@ def create_picklists_for_party(party_doc, all_orders_with_shipping, created_orde
 	WICHTIG: Aufträge werden NICHT vermischt - jeder Sales Order behält seine eigenen Items
 	NEU: Zeigt Rechnungsnummern im Header an
 	
+	Die Gruppierung kommt aus dem Buchungsplan, Positionen und Picklist aus utils/picklist
+	(derselbe Weg wie für einzeln eingereichte Rechnungen).
+	
 	Args:
 		party_doc: Das Party-Dokument
 		all_orders_with_shipping: Liste der Order-Infos mit Versandziel
@@ -1640,192 +1807,75 @@ def create_picklists_for_party(party_doc, all_orders_with_shipping, created_orde
 		Liste der erstellten Picklist Namen
 	"""
 	try:
-		frappe.log_error(f"🎯 create_picklists_for_party gestartet", "INFO: picklist_function")
+		logger.info("🎯 create_picklists_for_party gestartet", title="picklist_function")
+		
+		index = get_picklist_index(created_order_names)
+		
+		# Erster Auftrag pro Kunde (Reihenfolge der erstellten Aufträge)
+		auftrag_pro_kunde = {}
+		for sales_order, eintrag in index.items():
+			auftrag_pro_kunde.setdefault(eintrag.customer, sales_order)
 		
 		# Gruppiere nach Versandziel
 		shipping_groups = {}
-		
-		# Erstelle ein Mapping von Customer zu Sales Order Name
 		for order_info in all_orders_with_shipping:
 			customer = order_info["customer"]
-			shipping_target = order_info["shipping_target"]
-			
-			# Finde den entsprechenden Sales Order Namen
-			sales_order_name = None
-			for order_name in created_order_names:
-				try:
-					order_doc = frappe.get_doc("Sales Order", order_name)
-					if order_doc.customer == customer:
-						sales_order_name = order_name
-						break
-				except:
-					continue
-			
-			if sales_order_name:
-				if shipping_target not in shipping_groups:
-					shipping_groups[shipping_target] = []
-				shipping_groups[shipping_target].append({
-					"customer": customer,
-					"sales_order": sales_order_name,
-					"order_info": order_info
-				})
+			if customer not in auftrag_pro_kunde:
+				continue
+			shipping_groups.setdefault(order_info["shipping_target"], []).append({
+				"customer": customer,
+				"sales_order": auftrag_pro_kunde[customer]
+			})
 		
-		frappe.log_error(f"📦 Picklist Shipping Groups: {list(shipping_groups.keys())}", "INFO: picklist_groups")
+		logger.info("📦 Picklist Shipping Groups: %s", list(shipping_groups.keys()), title="picklist_groups")
 		
 		created_picklists = []
+		buchungen = get_party_buchungen(party_doc.name)
 		
 		# Erstelle eine Picklist pro Versandziel
 		for shipping_target, orders_for_target in shipping_groups.items():
 			try:
-				frappe.log_error(f"🏭 Erstelle Picklist für Versandziel: {shipping_target}", "INFO: creating_picklist")
-				
-				# Sammle alle Items für dieses Versandziel (OHNE Vermischung!)
-				all_picklist_items = []
-				invoice_data = []  # Ändere zu Liste mit Customer-Info
-				order_numbers = []
-				
-				for order_data in orders_for_target:
-					customer = order_data["customer"]
-					sales_order_name = order_data["sales_order"]
-					order_info = order_data["order_info"]
-					
-					order_numbers.append(sales_order_name)
-					
-					# Finde Sales Invoices für diesen Sales Order
-					try:
-						frappe.log_error(f"🔍 Suche Sales Invoices für SO: {sales_order_name}", "DEBUG: invoice_search_start")
-						current_invoices = frappe.get_all(
-							"Sales Invoice",
-							filters={
-								"sales_order": sales_order_name,
-								"docstatus": 1  # Nur eingereichte Rechnungen
-							},
-							fields=["name"]  # order_by entfernt - verursacht SQL Fehler
-						)
-						
-						frappe.log_error(f"📋 Gefundene Invoices für SO {sales_order_name}: {len(current_invoices)} - {[inv.name for inv in current_invoices]}", "DEBUG: invoice_search_result")
-						
-						for inv in current_invoices:
-							# Sammle Invoice mit Kundenname
-							customer_name = customer
-							try:
-								customer_doc = frappe.get_doc("Customer", customer)
-								customer_display_name = customer_doc.customer_name or customer
-							except:
-								customer_display_name = customer
-							
-							invoice_with_customer = f"{inv.name} ({customer_display_name})"
-							invoice_data.append(invoice_with_customer)
-							frappe.log_error(f"💳 Sales Invoice für SO {sales_order_name} gefunden: {invoice_with_customer}", "INFO: invoice_found_for_picklist")
-							
-					except Exception as e:
-						frappe.log_error(f"⚠️ Fehler beim Finden der Sales Invoice für {sales_order_name}: {str(e)}", "WARNING: invoice_search")
-					
-					# Hole den Sales Order für Warehouse-Info
-					try:
-						so_doc = frappe.get_doc("Sales Order", sales_order_name)
-					except:
-						frappe.log_error(f"❌ Sales Order {sales_order_name} nicht gefunden", "ERROR: so_not_found")
-						continue
-					
-					# Füge alle Produkte dieses Kunden hinzu (OHNE Vermischung mit anderen!)
-					for product in order_info["products"]:
-						# Überspringe Versandartikel für die Picklist (nur echte Produkte)
-						if product.get("_shipping_item", False):
-							frappe.log_error(f"📦 Versandartikel übersprungen für Picklist: {product['item_code']}", "INFO: shipping_item_skipped")
-							continue
-						
-						# Finde das entsprechende SO Item für Warehouse
-						so_warehouse = product.get("warehouse", get_default_warehouse())
-						so_item_name = None
-						for so_item in so_doc.items:
-							if so_item.item_code == product["item_code"] and so_item.qty == product["qty"]:
-								so_warehouse = so_item.warehouse or get_default_warehouse()
-								so_item_name = so_item.name  # Wichtig: Sales Order Item Reference!
-								break
-						
-						picklist_item = {
-							"doctype": "Pick List Item",  # WICHTIG: DocType
-							"item_code": product["item_code"],
-							"item_name": product["item_name"],
-							"qty": float(product["qty"]),  # WICHTIG: Als Float!
-							"stock_qty": float(product.get("stock_qty", product["qty"])),
-							"picked_qty": 0.0,  # Standardwert
-							"stock_reserved_qty": 0.0,  # Standardwert  
-							"uom": product.get("uom", "Stk"),
-							"stock_uom": product.get("stock_uom", "Stk"),
-							"conversion_factor": float(product.get("conversion_factor", 1.0)),
-							"warehouse": so_warehouse,
-							"sales_order": sales_order_name,
-							"sales_order_item": so_item_name,  # WICHTIG: SO Item Reference
-							"batch_no": None,
-							"serial_no": None,
-							"use_serial_batch_fields": 0,  # Standardwert
-							"serial_and_batch_bundle": None,  # Standardwert
-							"product_bundle_item": None,  # Standardwert
-							"material_request": None,  # Standardwert
-							"material_request_item": None  # Standardwert
-						}
-						
-						all_picklist_items.append(picklist_item)
-						frappe.log_error(f"✅ Picklist Item hinzugefügt: {product['item_code']} (SO: {sales_order_name}, SO-Item: {so_item_name}, Customer: {customer})", "INFO: picklist_item_added")
-				
-				if not all_picklist_items:
-					frappe.log_error(f"⚠️ Keine Items für Versandziel {shipping_target} gefunden", "WARNING: no_picklist_items")
+				# Wiederaufnahme: Picklist für dieses Versandziel wurde bereits erstellt
+				vorhandene_buchungen = [buchungen.get(order_data["customer"]) for order_data in orders_for_target]
+				if all(buchung and buchung.pick_list for buchung in vorhandene_buchungen):
+					vorhandene_picklists = sorted({buchung.pick_list for buchung in vorhandene_buchungen})
+					logger.info("Picklist für Versandziel %s existiert bereits: %s", shipping_target, vorhandene_picklists, title="picklist_resume")
+					created_picklists.extend(vorhandene_picklists)
 					continue
 				
-				# Entferne Duplikate und sortiere
-				invoice_data = list(set(invoice_data))
-				order_numbers = list(set(order_numbers))
+				logger.info("🏭 Erstelle Picklist für Versandziel: %s", shipping_target, title="creating_picklist")
+				
+				auftraege = {order_data["sales_order"]: index[order_data["sales_order"]] for order_data in orders_for_target}
+				rechnungen = [
+					{"sales_invoice": sales_invoice, "customer": eintrag.customer, "customer_name": eintrag.customer_name}
+					for eintrag in auftraege.values()
+					for sales_invoice in eintrag.invoices
+				]
 				
 				# Erstelle Header-Bemerkung mit Rechnungsnummern im Fokus
-				if invoice_data:
-					invoice_text = "\n".join(sorted(invoice_data))  # Zeilenumbruch statt Komma
+				if rechnungen:
 					# Einfache remarks - Details stehen im Custom Field
-					remarks = f"Party: {party_doc.name} | {len(invoice_data)} Rechnungen"
-					frappe.log_error(f"✅ Picklist mit {len(invoice_data)} Rechnungen erstellt", "INFO: picklist_created_with_invoices")
+					remarks = f"Party: {party_doc.name} | {len(rechnungen)} Rechnungen"
 				else:
 					# Fallback falls keine Rechnungen gefunden
-					order_text = ", ".join(sorted(order_numbers))
-					remarks = f"Party: {party_doc.name} | {len(order_numbers)} Aufträge"
-					frappe.log_error(f"⚠️ Picklist ohne Rechnungen - {len(order_numbers)} Aufträge", "WARNING: picklist_no_invoices")
-				
-				# Picklist Daten
-				picklist_data = {
-					"doctype": "Pick List",
-					"purpose": "Delivery",
-					"company": frappe.defaults.get_user_default("Company"),
-					"customer": shipping_target,  # Das Versandziel als Customer
-					"custom_invoice_references": "\n".join(sorted(invoice_data)) if invoice_data else None,  # Zeilenumbruch statt Komma!
-					"remarks": remarks,  # Zusätzlich in Bemerkungen
-					"locations": all_picklist_items  # DIREKT verwenden!
-				}
-				
-				frappe.log_error(f"🎯 Erstelle Picklist für {shipping_target} mit {len(all_picklist_items)} Items", "INFO: picklist_creation")
-				
-				# Erstelle Picklist
-				picklist = frappe.get_doc(picklist_data)
-				picklist.insert()
-				frappe.log_error(f"✅ Picklist erstellt: {picklist.name}", "SUCCESS: picklist_created")
+					remarks = f"Party: {party_doc.name} | {len(auftraege)} Aufträge"
+					logger.warn(f"⚠️ Picklist ohne Rechnungen - {len(auftraege)} Aufträge", title="picklist_no_invoices")
 				
-				# Reiche die Picklist ein
-				try:
-					picklist.submit()
-					frappe.log_error(f"🎉 Picklist eingereicht: {picklist.name}", "SUCCESS: picklist_submitted")
-				except Exception as e:
-					frappe.log_error(f"⚠️ Picklist konnte nicht eingereicht werden: {str(e)}", "WARNING: picklist_submit_failed")
-					# Trotzdem weitermachen - Picklist ist erstellt
+				picklist = create_picklist(shipping_target, auftraege, rechnungen, remarks)
+				if not picklist:
+					continue
 				
-				created_picklists.append(picklist.name)
+				created_picklists.append(picklist)
+				for order_data in orders_for_target:
+					record_party_buchung(party_doc.name, order_data["customer"], pick_list=picklist)
 				
 			except Exception as e:
-				frappe.log_error(f"❌ Fehler beim Erstellen der Picklist für {shipping_target}: {str(e)}", "ERROR: picklist_creation_error")
+				logger.error(f"❌ Fehler beim Erstellen der Picklist für {shipping_target}: {str(e)}", title="picklist_creation_error")
 				continue
 		
-		frappe.log_error(f"🎉 Picklists erstellt: {created_picklists}", "SUCCESS: all_picklists_created")
+		logger.info("🎉 Picklists erstellt: %s", created_picklists, title="all_picklists_created")
 		return created_picklists
 		
 	except Exception as e:
-		frappe.log_error(f"💥 Allgemeiner Fehler in create_picklists_for_party: {str(e)}\n{frappe.get_traceback()}", "ERROR: picklist_function_error")
+		logger.error(f"💥 Allgemeiner Fehler in create_picklists_for_party: {str(e)}\n{frappe.get_traceback()}", title="picklist_function_error")
 		return []
-
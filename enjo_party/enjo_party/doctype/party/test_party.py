@@ -0,0 +1,164 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from enjo_party.enjo_party.doctype.party import party
+
+# On IntegrationTestCase, the doctype test records and all
+# link-field test record dependencies are recursively loaded
+# Use these module variables to add/remove to/from that list
+EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+
+
+def adresse(customer, address, address_type):
+	return frappe._dict(customer=customer, address=address, address_type=address_type)
+
+
+def party_doc(**werte):
+	doc = party.Party(
+		{"doctype": "Party", "status": "Gäste", "gastgeberin": "Gastgeberin", "versand_gastgeberin": None}
+	)
+	doc.kunden = [
+		frappe._dict(kunde="Gast 1", versand_zu="Gastgeberin"),
+		frappe._dict(kunde="Gast 2", versand_zu=None),
+	]
+	doc.produktauswahl = [
+		frappe._dict(
+			teilnehmer="Gast 1",
+			item_code="TEST-ITEM",
+			item_name="Test",
+			qty=2,
+			rate=10,
+			uom="Stk",
+			conversion_factor=1,
+			delivery_date=None,
+			warehouse="Lager - T",
+		)
+	]
+	for feld, wert in werte.items():
+		setattr(doc, feld, wert)
+	return doc
+
+
+class UnitTestParty(UnitTestCase):
+	"""
+	Unit tests for Party.
+	Use this class for testing individual functions and methods.
+	"""
+
+	def test_adressen_aller_teilnehmer_mit_einer_abfrage(self):
+		db = MagicMock()
+		db.sql.return_value = [
+			adresse("Gastgeberin", "ADR-GG-Rechnung", "Billing"),
+			adresse("Gastgeberin", "ADR-GG-Versand", "Shipping"),
+			adresse("Gast 1", "ADR-G1", "Billing"),
+			# Direkt und über einen Contact verknüpft - nur einmal übernehmen
+			adresse("Gast 1", "ADR-G1", "Billing"),
+		]
+
+		with patch.object(party.frappe, "db", db):
+			adressen = party.resolve_party_addresses(party_doc())
+
+		self.assertEqual(db.sql.call_count, 1)
+		self.assertEqual(db.sql.call_args.args[1]["customers"], ["Gastgeberin", "Gast 1", "Gast 2"])
+		self.assertEqual(adressen["Gastgeberin"], ("ADR-GG-Rechnung", "ADR-GG-Versand"))
+		# Fehlender Typ fällt auf die andere vollständige Adresse zurück
+		self.assertEqual(adressen["Gast 1"], ("ADR-G1", "ADR-G1"))
+		self.assertEqual(adressen["Gast 2"], (None, None))
+
+	def test_keine_abfrage_ohne_kunden(self):
+		db = MagicMock()
+		with patch.object(party.frappe, "db", db):
+			self.assertEqual(party.get_customer_addresses([None, ""]), {})
+		db.sql.assert_not_called()
+
+	def test_auftragsadressen(self):
+		adressen = {"Gast 1": ("ADR-G1", None), "Gastgeberin": ("ADR-GG-Rechnung", "ADR-GG-Versand")}
+
+		order = {"customer": "Gast 1", "shipping_target": "Gastgeberin"}
+		party.plan_order_addresses(order, adressen)
+		self.assertEqual((order["billing_address"], order["shipping_address"]), ("ADR-G1", "ADR-GG-Versand"))
+		self.assertIsNone(order["skip_reason"])
+
+		ohne_adresse = {"customer": "Gast 2", "shipping_target": "Gast 2"}
+		party.plan_order_addresses(ohne_adresse, adressen)
+		self.assertIn("Gast 2", ohne_adresse["skip_reason"])
+
+	def test_produkt_hash_ohne_status(self):
+		doc = party_doc()
+		produkt_hash = doc.get_produkt_hash()
+
+		doc.status = "Produkte"
+		self.assertEqual(doc.get_produkt_hash(), produkt_hash)
+
+		doc.produktauswahl[0].qty = 3
+		self.assertNotEqual(doc.get_produkt_hash(), produkt_hash)
+
+	def test_summen_eingefroren_nur_serverseitig(self):
+		doc = party_doc()
+		# Vom Formular mitgesendete Werte zählen nicht
+		doc._totals_frozen = 1
+		self.assertFalse(doc.is_totals_frozen())
+
+		doc.flags.totals_frozen = True
+		self.assertTrue(doc.is_totals_frozen())
+
+	def test_summen_eingefroren_nach_gutschein(self):
+		doc = party_doc()
+		doc.produktauswahl[0].price_list_rate = 10
+		doc.produktauswahl[0].rate = 0
+		# Gäste bekommen keinen Gutschein
+		self.assertFalse(doc.is_totals_frozen())
+
+		doc.produktauswahl[0].teilnehmer = "Gastgeberin"
+		self.assertTrue(doc.is_totals_frozen())
+
+
+class IntegrationTestParty(IntegrationTestCase):
+	"""
+	Integration tests for Party.
+	Use this class for testing interactions between multiple components.
+	"""
+
+	def test_stornierter_auftrag_gibt_buchung_frei(self):
+		from enjo_party.enjo_party.utils import sales_order_hooks
+
+		frappe.db.bulk_insert(
+			"Party Buchung",
+			["name", "party", "customer", "sales_order", "sales_invoice", "pick_list"],
+			[["TEST-PB-1", "TEST-PARTY-1", "Gast 1", "TEST-SO-1", "TEST-SINV-1", "TEST-PICK-1"]],
+		)
+		self.assertTrue(
+			frappe.db.exists("Party Buchung", {"party": "TEST-PARTY-1", "sales_order": ["is", "set"]})
+		)
+
+		sales_order_hooks.clear_party_buchung(frappe._dict(name="TEST-SO-1"), "on_cancel")
+
+		self.assertFalse(
+			frappe.db.exists("Party Buchung", {"party": "TEST-PARTY-1", "sales_order": ["is", "set"]})
+		)
+		self.assertEqual(party.get_party_buchungen("TEST-PARTY-1")["Gast 1"].sales_invoice, None)
+
+	def test_buchung_pro_kunde_nur_einmal(self):
+		frappe.db.bulk_insert(
+			"Party Buchung", ["name", "party", "customer"], [["TEST-PB-2", "TEST-PARTY-2", "Gast 2"]]
+		)
+
+		# Wiederholte Buchungsschritte ergänzen den vorhandenen Eintrag statt einen zweiten anzulegen
+		self.assertEqual(
+			party.record_party_buchung("TEST-PARTY-2", "Gast 2", sales_order="TEST-SO-2"), "TEST-PB-2"
+		)
+		self.assertEqual(
+			party.record_party_buchung("TEST-PARTY-2", "Gast 2", sales_invoice="TEST-SINV-2"), "TEST-PB-2"
+		)
+
+		buchungen = party.get_party_buchungen("TEST-PARTY-2")
+		self.assertEqual(list(buchungen), ["Gast 2"])
+		self.assertEqual(
+			(buchungen["Gast 2"].sales_order, buchungen["Gast 2"].sales_invoice), ("TEST-SO-2", "TEST-SINV-2")
+		)
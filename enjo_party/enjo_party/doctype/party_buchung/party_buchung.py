@@ -0,0 +1,14 @@
+# Copyright (c) 2025, Elia and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class PartyBuchung(Document):
+	pass
+
+
+def on_doctype_update():
+	# Pro Party und Kunde gibt es genau einen Buchungseintrag (Idempotenz bei Wiederholungen)
+	frappe.db.add_unique("Party Buchung", ["party", "customer"], constraint_name="unique_party_customer")
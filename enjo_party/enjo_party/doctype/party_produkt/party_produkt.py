@@ -0,0 +1,14 @@
+# Copyright (c) 2025, Elia and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class PartyProdukt(Document):
+	pass
+
+
+def on_doctype_update():
+	# Produkte werden immer pro Party und Teilnehmer gelesen
+	frappe.db.add_index("Party Produkt", ["parent", "teilnehmer"])
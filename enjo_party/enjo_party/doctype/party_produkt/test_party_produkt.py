@@ -0,0 +1,42 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+from frappe.tests import UnitTestCase
+
+from enjo_party.patches import migrate_party_produktauswahl
+
+
+class UnitTestPartyProdukt(UnitTestCase):
+	"""
+	Unit tests für die Übernahme der alten Produkttabellen (patches/migrate_party_produktauswahl).
+	Die Datenbank ist gemockt - geprüft werden Reihenfolge und Form der Abfragen.
+	"""
+
+	def migrieren(self, alte_zeilen=True, spalten=()):
+		db = MagicMock()
+		db.exists.return_value = alte_zeilen
+		db.has_column.side_effect = lambda doctype, column: column in spalten
+		with patch.object(migrate_party_produktauswahl.frappe, "db", db):
+			migrate_party_produktauswahl.execute()
+		return [" ".join(call.args[0].split()) for call in db.sql.call_args_list]
+
+	def test_ohne_alte_zeilen_nichts_zu_tun(self):
+		self.assertEqual(self.migrieren(alte_zeilen=False), [])
+
+	def test_produkte_und_versandziele_uebernehmen(self):
+		abfragen = self.migrieren(spalten=("versand_gast_1", "versand_gast_3"))
+
+		self.assertEqual(len(abfragen), 3)
+		self.assertTrue(abfragen[0].startswith("INSERT IGNORE INTO `tabParty Produkt`"))
+		self.assertIn("CONCAT('produktauswahl_für_gast_', pk.idx)", abfragen[0])
+		# Fehlende Spalten stehen als NULL an ihrer Position in ELT()
+		self.assertIn("ELT(pk.idx, p.`versand_gast_1`, NULL, p.`versand_gast_3`, NULL", abfragen[1])
+		self.assertEqual(abfragen[2], "DELETE FROM `tabSales Order Item` WHERE parenttype = 'Party'")
+
+	def test_ohne_versandspalten_kein_update(self):
+		abfragen = self.migrieren()
+
+		self.assertEqual(len(abfragen), 2)
+		self.assertFalse(any(abfrage.startswith("UPDATE") for abfrage in abfragen))
@@ -0,0 +1,10 @@
+# Copyright (c) 2025, Elia and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class PickListRechnung(Document):
+	# Zuordnung Pick List -> Sales Invoice (Custom Field custom_rechnungen an Pick List)
+	pass
@@ -0,0 +1,10 @@
+# Copyright (c) 2025, Elia and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class PickListZuordnung(Document):
+	# Aufteilung einer zusammengefassten Pick List Position auf die Auftragspositionen (Custom Field custom_zuordnung an Pick List)
+	pass
@@ -5,11 +5,35 @@ import frappe
 from frappe import _
 from frappe.utils import flt, getdate
 
+from enjo_party.enjo_party.utils import punkte_cache
+from enjo_party.enjo_party.utils.punkte_periode import get_perioden
+
 
 def execute(filters=None):
-	columns = get_columns()
-	data = get_data(filters)
-	return columns, data
+	filters = frappe._dict(filters or {})
+	
+	# Unverändertes Ledger und gleiche Filter: Ergebnis aus dem Cache.
+	# Lange Laufzeiten übernimmt Frappe über den Prepared Report (prepared_report im Report-JSON).
+	result = punkte_cache.get_result(filters)
+	if result:
+		return result
+	
+	return berechnen(filters)
+
+
+def berechnen(filters, version=None):
+	"""Berechnet den Report und legt das Ergebnis unter der Ledger-Version vom Start der Berechnung ab"""
+	if version is None:
+		version = punkte_cache.get_ledger_version()
+	
+	# Monats-/Quartalsansicht: Partnerinnen gegen Perioden aus ENJO Punkte Periode pivotiert
+	if filters.get("ansicht") in ("Monate", "Quartale"):
+		result = get_pivot(filters)
+	else:
+		result = get_columns(), get_data(filters)
+	
+	punkte_cache.set_result(filters, result, version)
+	return result
 
 
 def get_columns():
@@ -58,33 +82,13 @@ def get_columns():
 
 def get_data(filters):
 	"""Holt die Daten für den Report"""
-	conditions = get_conditions(filters)
-	
-	# SQL Query um Punkte pro Sales Partner zu aggregieren
-	query = f"""
-		SELECT 
-			t.sales_partner,
-			sp.partner_name,
-			SUM(CASE WHEN t.is_cancelled = 0 THEN t.punkte_gesamt ELSE 0 END) as total_points,
-			COUNT(CASE WHEN t.is_cancelled = 0 THEN 1 ELSE NULL END) as transaction_count,
-			MAX(CASE WHEN t.is_cancelled = 0 THEN t.transaction_date ELSE NULL END) as last_transaction,
-			(
-				SELECT t2.sales_invoice 
-				FROM `tabENJO Punkte Transaktion` t2 
-				WHERE t2.sales_partner = t.sales_partner 
-				AND t2.is_cancelled = 0 
-				ORDER BY t2.transaction_date DESC 
-				LIMIT 1
-			) as last_invoice
-		FROM `tabENJO Punkte Transaktion` t
-		LEFT JOIN `tabSales Partner` sp ON t.sales_partner = sp.name
-		WHERE 1=1 {conditions}
-		GROUP BY t.sales_partner, sp.partner_name
-		HAVING total_points > 0
-		ORDER BY total_points DESC, sp.partner_name ASC
-	"""
+	filters = filters or {}
 	
-	data = frappe.db.sql(query, filters, as_dict=True)
+	# Ohne Datumsfilter reicht der materialisierte Saldo (eine Zeile pro Partnerin)
+	if not filters.get("from_date") and not filters.get("to_date"):
+		data = get_data_from_saldo(filters)
+	else:
+		data = get_data_from_ledger(filters)
 	
 	# Falls keine Daten vorhanden sind, zeige eine Info-Zeile
 	if not data:
@@ -100,9 +104,67 @@ def get_data(filters):
 	return data
 
 
+def get_data_from_saldo(filters):
+	"""Liest den Punktestand aus ENJO Punkte Saldo statt das Ledger zu aggregieren"""
+	conditions = ""
+	if filters.get("sales_partner"):
+		conditions += " AND s.sales_partner = %(sales_partner)s"
+	
+	return frappe.db.sql(f"""
+		SELECT 
+			s.sales_partner,
+			sp.partner_name,
+			s.total_points,
+			s.transaction_count,
+			s.last_transaction,
+			s.last_invoice
+		FROM `tabENJO Punkte Saldo` s
+		LEFT JOIN `tabSales Partner` sp ON s.sales_partner = sp.name
+		WHERE s.total_points > 0 {conditions}
+		ORDER BY s.total_points DESC, sp.partner_name ASC
+	""", filters, as_dict=True)
+
+
+def get_data_from_ledger(filters):
+	"""Aggregiert das Ledger für einen Zeitraum (der Saldo kennt keine Datumsgrenzen)"""
+	conditions = get_conditions(filters)
+	
+	# Ein Durchlauf über das Ledger: letzte Rechnung per ROW_NUMBER statt korrelierter Unterabfrage pro Partnerin
+	# (nutzt den Index sales_partner, is_cancelled, transaction_date)
+	query = f"""
+		SELECT 
+			x.sales_partner,
+			sp.partner_name,
+			SUM(x.punkte_gesamt) as total_points,
+			COUNT(*) as transaction_count,
+			MAX(x.transaction_date) as last_transaction,
+			MAX(CASE WHEN x.rn = 1 THEN x.sales_invoice END) as last_invoice
+		FROM (
+			SELECT
+				t.sales_partner,
+				t.punkte_gesamt,
+				t.transaction_date,
+				t.sales_invoice,
+				ROW_NUMBER() OVER (
+					PARTITION BY t.sales_partner
+					ORDER BY t.transaction_date DESC, t.creation DESC
+				) as rn
+			FROM `tabENJO Punkte Transaktion` t
+			WHERE t.is_cancelled = 0 {conditions}
+		) x
+		LEFT JOIN `tabSales Partner` sp ON x.sales_partner = sp.name
+		GROUP BY x.sales_partner, sp.partner_name
+		HAVING total_points > 0
+		ORDER BY total_points DESC, sp.partner_name ASC
+	"""
+	
+	return frappe.db.sql(query, filters, as_dict=True)
+
+
 def get_conditions(filters):
 	"""Erstellt WHERE-Bedingungen basierend auf den Filtern"""
-	conditions = ""
+	# Zeiträume zeigen erzielte Punkte - Verfall mindert nur den Punktestand (Saldo)
+	conditions = " AND t.transaktionsart != 'Verfall'"
 	
 	if filters.get("sales_partner"):
 		conditions += " AND t.sales_partner = %(sales_partner)s"
@@ -113,4 +175,48 @@ def get_conditions(filters):
 	if filters.get("to_date"):
 		conditions += " AND t.transaction_date <= %(to_date)s"
 	
-	return conditions 
\ No newline at end of file
+	return conditions
+
+
+def get_pivot(filters):
+	"""Partnerinnen als Zeilen, Monate bzw. Quartale als Spalten - gelesen aus den Monatsrollups"""
+	quartale = filters.get("ansicht") == "Quartale"
+	perioden = get_perioden(filters.get("from_date"), filters.get("to_date"), filters.get("sales_partner"))
+	
+	spalten = {}
+	zeilen = {}
+	for periode in perioden:
+		datum = getdate(periode.periode)
+		if quartale:
+			schluessel = f"q_{datum.year}_{(datum.month - 1) // 3 + 1}"
+			label = f"Q{(datum.month - 1) // 3 + 1} {datum.year}"
+		else:
+			schluessel = f"m_{datum.year}_{datum.month:02d}"
+			label = datum.strftime("%m/%Y")
+		spalten.setdefault(schluessel, label)
+		
+		zeile = zeilen.setdefault(periode.sales_partner, {"sales_partner": periode.sales_partner, "total_points": 0})
+		zeile[schluessel] = zeile.get(schluessel, 0) + periode.total_points
+		zeile["total_points"] += periode.total_points
+	
+	if zeilen:
+		namen = dict(frappe.get_all(
+			"Sales Partner",
+			filters={"name": ["in", list(zeilen)]},
+			fields=["name", "partner_name"],
+			as_list=True
+		))
+		for zeile in zeilen.values():
+			zeile["partner_name"] = namen.get(zeile["sales_partner"])
+	
+	basis = get_columns()
+	columns = basis[:2] + [
+		{"fieldname": schluessel, "label": label, "fieldtype": "Int", "width": 100}
+		for schluessel, label in sorted(spalten.items())
+	] + [basis[2]]
+	
+	data = sorted(
+		(zeile for zeile in zeilen.values() if zeile["total_points"]),
+		key=lambda zeile: (-zeile["total_points"], zeile.get("partner_name") or "")
+	)
+	return columns, data
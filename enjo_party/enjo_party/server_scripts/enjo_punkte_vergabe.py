@@ -1,88 +1,308 @@
 # ENJO Punkte Vergabe - Server Script
-# Wird bei Sales Invoice Submit ausgelöst
+# Wird bei Sales Invoice Submit ausgelöst. Die eigentliche Vergabe läuft als Hintergrund-Job nach dem
+# Commit, damit die Submit-Dauer nicht von der Anzahl der Positionen abhängt.
 
 import frappe
-from frappe.utils import flt, today
+from frappe.utils import add_days, add_to_date, cint, flt, now, now_datetime, today
+
+from enjo_party.enjo_party.utils import logger, punkte_cache, punkte_periode, punkte_rangliste, punkte_saldo
+
+# Tage, die der tägliche Abgleich rückwirkend nach Rechnungen ohne Punkte sucht
+RECONCILE_TAGE = 7
+
+
+def get_vergabe_job_id(sales_invoice):
+	"""Feste Job-ID pro Rechnung, damit die Vergabe nicht doppelt eingereiht wird"""
+	return f"enjo_punkte_vergabe::{sales_invoice}"
 
 
 def award_points_on_invoice_submit(doc, method):
 	"""
-	Vergibt ENJO Punkte basierend auf verkauften Produkten mit custom_punkte
+	Reiht die ENJO Punkte Vergabe für die Rechnung ein (erst nach erfolgreichem Commit des Submits)
 	Wird bei Sales Invoice Submit ausgelöst
 	"""
+	if not doc.get("sales_partner"):
+		logger.info("Invoice %s hat keinen Sales Partner - keine Punkte vergeben", doc.name, title="enjo_points")
+		return
+	
+	# Rechnungen aus der Folgebeleg-Kette (utils/folgebelege) vergeben ihre Punkte als eigenen Schritt
+	if doc.flags.folgebelege_im_job:
+		return
+	
+	enqueue_award_points(doc.name)
+
+
+def enqueue_award_points(sales_invoice):
+	frappe.enqueue(
+		"enjo_party.enjo_party.server_scripts.enjo_punkte_vergabe.award_points_for_invoice",
+		queue="short",
+		job_id=get_vergabe_job_id(sales_invoice),
+		deduplicate=True,
+		enqueue_after_commit=True,
+		sales_invoice=sales_invoice
+	)
+
+
+def award_points_for_invoice(sales_invoice):
+	"""
+	Hintergrund-Job: vergibt ENJO Punkte basierend auf verkauften Produkten mit custom_punkte.
+	Idempotent pro Rechnungsposition - ein wiederholter Job schreibt nur Positionen, die noch fehlen.
+	
+	Returns:
+		int: Anzahl neu geschriebener Transaktionen
+	"""
 	try:
-		frappe.log_error(f"ENJO Punkte: Verarbeite Invoice {doc.name}", "INFO: enjo_points")
+		logger.info("ENJO Punkte: Verarbeite Invoice %s", sales_invoice, title="enjo_points")
 		
-		# Prüfe ob Sales Partner vorhanden ist
-		sales_partner = doc.get("sales_partner")
-		if not sales_partner:
-			frappe.log_error(f"Invoice {doc.name} hat keinen Sales Partner - keine Punkte vergeben", "INFO: enjo_points")
-			return
+		# Rechnung sperren: serialisiert wiederholte Jobs und wartet auf ein gleichzeitiges Storno
+		rechnung = frappe.db.sql(
+			"""
+			SELECT name, docstatus, sales_partner, posting_date
+			FROM `tabSales Invoice`
+			WHERE name = %s
+			FOR UPDATE
+			""",
+			sales_invoice,
+			as_dict=True
+		)
+		if not rechnung or rechnung[0].docstatus != 1 or not rechnung[0].sales_partner:
+			logger.info("Invoice %s nicht (mehr) gebucht oder ohne Sales Partner - keine Punkte vergeben", sales_invoice, title="enjo_points")
+			return 0
+		rechnung = rechnung[0]
+		
+		items = frappe.get_all(
+			"Sales Invoice Item",
+			filters={"parent": sales_invoice, "parenttype": "Sales Invoice"},
+			fields=["name", "item_code", "item_name", "qty"],
+			order_by="idx"
+		)
+		
+		# custom_punkte aller Artikel mit einer Abfrage laden
+		punkte_pro_artikel = get_punkte_pro_artikel({item.item_code for item in items if item.item_code})
+		zeilen = build_punkte_zeilen(sales_invoice, rechnung.sales_partner, rechnung.posting_date, items, punkte_pro_artikel)
+		
+		# Bereits vergebene Positionen überspringen (Wiederholung nach Fehler oder doppelter Job)
+		vergeben = set(frappe.get_all(
+			"ENJO Punkte Transaktion",
+			filters={"sales_invoice": sales_invoice, "is_cancelled": 0},
+			pluck="sales_invoice_item"
+		))
+		zeilen = [zeile for zeile in zeilen if zeile["sales_invoice_item"] not in vergeben]
+		if not zeilen:
+			return 0
+		
+		# Alle Transaktionen mit einem mehrzeiligen INSERT schreiben
+		insert_punkte_transaktionen(zeilen)
+		punkte_saldo.add_transaktionen(zeilen)
+		punkte_periode.add_transaktionen(zeilen)
+		punkte_rangliste.add_transaktionen(zeilen)
+		punkte_cache.invalidate_ledger_version()
+		
+		logger.info(
+			"ENJO Punkte vergeben: %s erhält %s Punkte für %s Positionen aus %s",
+			rechnung.sales_partner, sum(z["punkte_gesamt"] for z in zeilen), len(zeilen), sales_invoice,
+			title="enjo_points"
+		)
+		return len(zeilen)
 		
-		# Durchlaufe alle Invoice Items
-		for item_row in doc.items:
-			if not item_row.item_code or not item_row.qty or item_row.qty <= 0:
-				continue
-				
-			# Hole custom_punkte vom Item
-			try:
-				item_doc = frappe.get_cached_doc("Item", item_row.item_code)
-				custom_punkte = getattr(item_doc, "custom_punkte", 0)
-				
-				if custom_punkte and custom_punkte > 0:
-					# Erstelle ENJO Punkte Transaktion
-					punkte_transaktion = frappe.get_doc({
-						"doctype": "ENJO Punkte Transaktion",
-						"sales_partner": sales_partner,
-						"sales_invoice": doc.name,
-						"item_code": item_row.item_code,
-						"item_name": item_row.item_name or item_row.item_code,
-						"qty": item_row.qty,
-						"punkte_pro_item": custom_punkte,
-						"transaction_date": doc.posting_date or today(),
-						"is_cancelled": 0
-					})
-					
-					punkte_transaktion.insert(ignore_permissions=True)
-					
-					frappe.log_error(
-						f"ENJO Punkte vergeben: {sales_partner} erhält {flt(item_row.qty) * custom_punkte} Punkte für {item_row.item_code}",
-						"SUCCESS: enjo_points"
-					)
-					
-			except Exception as e:
-				frappe.log_error(f"Fehler beim Verarbeiten von Item {item_row.item_code}: {str(e)}", "ERROR: enjo_points")
-				continue
-				
 	except Exception as e:
-		frappe.log_error(f"Allgemeiner Fehler bei ENJO Punkte Vergabe für Invoice {doc.name}: {str(e)}", "ERROR: enjo_points")
+		# Job als fehlgeschlagen markieren - reconcile_punkte_vergabe reiht ihn erneut ein
+		logger.error(f"Allgemeiner Fehler bei ENJO Punkte Vergabe für Invoice {sales_invoice}: {str(e)}", title="enjo_points")
+		raise
+
+
+def reconcile_punkte_vergabe(tage=RECONCILE_TAGE):
+	"""
+	Täglicher Abgleich (scheduler_events): sucht gebuchte Rechnungen der letzten Tage mit punkteberechtigten
+	Positionen, aber ohne offene Transaktionen - d.h. deren Vergabe-Job fehlgeschlagen ist oder verloren ging.
+	Diese Rechnungen werden markiert (Kommentar + Error Log) und erneut eingereiht.
+	
+	Returns:
+		list: betroffene Rechnungen
+	"""
+	from frappe.utils.background_jobs import is_job_enqueued
+	
+	if not frappe.get_meta("Item").has_field("custom_punkte"):
+		return []
+	
+	fehlend = frappe.db.sql_list(
+		"""
+		SELECT si.name
+		FROM `tabSales Invoice` si
+		WHERE si.docstatus = 1
+			AND IFNULL(si.sales_partner, '') != ''
+			AND si.posting_date >= %(from_date)s
+			AND si.modified < %(before)s
+			AND EXISTS (
+				SELECT 1
+				FROM `tabSales Invoice Item` sii
+				INNER JOIN `tabItem` i ON i.name = sii.item_code
+				WHERE sii.parent = si.name AND sii.parenttype = 'Sales Invoice'
+					AND sii.qty > 0 AND i.custom_punkte > 0
+			)
+			AND NOT EXISTS (
+				SELECT 1
+				FROM `tabENJO Punkte Transaktion` t
+				WHERE t.sales_invoice = si.name AND t.is_cancelled = 0
+			)
+		ORDER BY si.name
+		""",
+		{
+			"from_date": add_days(today(), -cint(tage)),
+			# Frisch gebuchte Rechnungen haben ihren Job eventuell noch vor sich
+			"before": add_to_date(now_datetime(), minutes=-15),
+		}
+	)
+	
+	fehlend = [sales_invoice for sales_invoice in fehlend if not is_job_enqueued(get_vergabe_job_id(sales_invoice))]
+	if not fehlend:
+		return []
+	
+	for sales_invoice in fehlend:
+		frappe.get_doc("Sales Invoice", sales_invoice).add_comment(
+			"Info", "ENJO Punkte: Vergabe fehlgeschlagen oder ausstehend - wurde erneut eingereiht"
+		)
+		enqueue_award_points(sales_invoice)
+	
+	logger.error(
+		f"ENJO Punkte Abgleich: {len(fehlend)} Rechnungen ohne Punkte erneut eingereiht: {', '.join(fehlend)}",
+		title="enjo_points_reconcile"
+	)
+	return fehlend
+
+
+def build_punkte_zeilen(sales_invoice, sales_partner, posting_date, items, punkte_pro_artikel):
+	"""
+	Baut die Ledger-Zeilen einer Rechnung - punkte_gesamt wie in ENJOPunkteTransaktion.validate.
+	Wird bei der Vergabe und beim Neuaufbau des Ledgers (utils/punkte_ledger) verwendet.
+	
+	Args:
+		items: Rechnungspositionen mit name, item_code, item_name, qty
+		punkte_pro_artikel: {item_code: custom_punkte} aus get_punkte_pro_artikel
+	"""
+	transaction_date = posting_date or today()
+	zeilen = []
+	for item_row in items:
+		if not item_row.item_code or not item_row.qty or item_row.qty <= 0:
+			continue
+		
+		custom_punkte = punkte_pro_artikel.get(item_row.item_code)
+		if not custom_punkte or custom_punkte <= 0:
+			continue
+		
+		zeilen.append({
+			"sales_partner": sales_partner,
+			"sales_invoice": sales_invoice,
+			"sales_invoice_item": item_row.name,
+			"item_code": item_row.item_code,
+			"item_name": item_row.item_name or item_row.item_code,
+			"qty": flt(item_row.qty),
+			"punkte_pro_item": cint(custom_punkte),
+			"punkte_gesamt": cint(flt(item_row.qty) * flt(custom_punkte)),
+			"transaction_date": transaction_date,
+			"is_cancelled": 0
+		})
+	
+	return zeilen
+
+
+def get_punkte_pro_artikel(item_codes):
+	"""
+	Lädt custom_punkte für alle Artikel mit einer Abfrage.
+	
+	Returns:
+		dict: {item_code: custom_punkte}
+	"""
+	if not item_codes or not frappe.get_meta("Item").has_field("custom_punkte"):
+		return {}
+	
+	return {
+		item.name: flt(item.custom_punkte)
+		for item in frappe.get_all(
+			"Item",
+			filters={"name": ["in", list(item_codes)], "custom_punkte": [">", 0]},
+			fields=["name", "custom_punkte"]
+		)
+	}
+
+
+def insert_punkte_transaktionen(zeilen):
+	"""
+	Schreibt ENJO Punkte Transaktionen als einen mehrzeiligen INSERT statt insert() pro Zeile.
+	Name (Hash wie bei autoname "hash") sowie creation/modified/owner werden wie beim Dokument-Insert gesetzt.
+	"""
+	zeitpunkt = now()
+	benutzer = frappe.session.user
+	
+	felder = ["name", "creation", "modified", "modified_by", "owner", "docstatus", "idx"] + list(zeilen[0])
+	werte = [
+		[frappe.generate_hash(length=10), zeitpunkt, zeitpunkt, benutzer, benutzer, 0, 0] + list(zeile.values())
+		for zeile in zeilen
+	]
+	
+	frappe.db.bulk_insert("ENJO Punkte Transaktion", felder, werte)
 
 
 def cancel_points_on_invoice_cancel(doc, method):
 	"""
 	Storniert ENJO Punkte bei Sales Invoice Cancel
-	Setzt is_cancelled = 1 für alle zugehörigen Transaktionen
+	Setzt is_cancelled = 1 für alle zugehörigen Transaktionen mit einer UPDATE-Abfrage
 	"""
 	try:
-		frappe.log_error(f"ENJO Punkte: Storniere Punkte für Invoice {doc.name}", "INFO: enjo_points_cancel")
+		logger.info("ENJO Punkte: Storniere Punkte für Invoice %s", doc.name, title="enjo_points_cancel")
 		
-		# Finde alle Punktetransaktionen für diese Invoice
-		transactions = frappe.get_all(
-			"ENJO Punkte Transaktion",
-			filters={
-				"sales_invoice": doc.name,
-				"is_cancelled": 0
-			},
-			fields=["name"]
-		)
+		anzahl = cancel_punkte_transaktionen(doc.name)
 		
-		# Markiere alle als storniert
-		for trans in transactions:
-			trans_doc = frappe.get_doc("ENJO Punkte Transaktion", trans.name)
-			trans_doc.is_cancelled = 1
-			trans_doc.save(ignore_permissions=True)
-			
-		frappe.log_error(f"ENJO Punkte: {len(transactions)} Transaktionen storniert für Invoice {doc.name}", "SUCCESS: enjo_points_cancel")
+		# Ein Audit-Eintrag an der Rechnung statt einer Version pro Transaktion
+		if anzahl:
+			doc.add_comment("Info", f"ENJO Punkte: {anzahl} Transaktionen storniert")
+		
+		logger.info("ENJO Punkte: %s Transaktionen storniert für Invoice %s", anzahl, doc.name, title="enjo_points_cancel")
+		return anzahl
 		
 	except Exception as e:
-		frappe.log_error(f"Fehler beim Stornieren von ENJO Punkte für Invoice {doc.name}: {str(e)}", "ERROR: enjo_points_cancel") 
\ No newline at end of file
+		logger.error(f"Fehler beim Stornieren von ENJO Punkte für Invoice {doc.name}: {str(e)}", title="enjo_points_cancel")
+
+
+def cancel_punkte_transaktionen(sales_invoice):
+	"""
+	Markiert alle offenen Punktetransaktionen einer Rechnung als storniert und aktualisiert modified.
+	
+	Returns:
+		int: Anzahl der stornierten Transaktionen
+	"""
+	# Pro Partnerin und Monat aggregiert, um Saldo und Perioden anschließend inkrementell zu verringern.
+	# Verfall-Gegenbuchungen derselben Rechnung werden mit storniert, zählen aber nur bei den Punkten.
+	stornierte = frappe.db.sql(
+		"""
+		SELECT
+			sales_partner,
+			DATE_FORMAT(transaction_date, '%%Y-%%m-01') AS periode,
+			SUM(punkte_gesamt) AS punkte,
+			SUM(CASE WHEN transaktionsart != 'Verfall' THEN punkte_gesamt ELSE 0 END) AS punkte_vergabe,
+			SUM(transaktionsart != 'Verfall') AS anzahl,
+			COUNT(*) AS zeilen
+		FROM `tabENJO Punkte Transaktion`
+		WHERE sales_invoice = %s AND is_cancelled = 0
+		GROUP BY sales_partner, periode
+		""",
+		sales_invoice,
+		as_dict=True
+	)
+	if not stornierte:
+		return 0
+	
+	frappe.db.sql(
+		"""
+		UPDATE `tabENJO Punkte Transaktion`
+		SET is_cancelled = 1, modified = %(modified)s, modified_by = %(modified_by)s
+		WHERE sales_invoice = %(sales_invoice)s AND is_cancelled = 0
+		""",
+		{"modified": now(), "modified_by": frappe.session.user, "sales_invoice": sales_invoice}
+	)
+	punkte_saldo.remove_transaktionen(sales_invoice, stornierte)
+	punkte_periode.remove_transaktionen(stornierte)
+	punkte_rangliste.remove_transaktionen(stornierte)
+	punkte_cache.invalidate_ledger_version()
+	# Das UPDATE trifft genau die oben aggregierten Zeilen
+	return sum(cint(zeile.zeilen) for zeile in stornierte)
@@ -0,0 +1,198 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from enjo_party.enjo_party.server_scripts import enjo_punkte_vergabe
+from enjo_party.enjo_party.utils import punkte_periode, punkte_saldo
+
+RECHNUNG = frappe._dict(
+	name="TEST-SINV-0001", docstatus=1, sales_partner="Test Partnerin", posting_date="2026-10-01"
+)
+POSITIONEN = [
+	frappe._dict(name="TEST-SII-0001", item_code="TEST-ITEM", item_name="Test", qty=2),
+	frappe._dict(name="TEST-SII-0002", item_code="TEST-ITEM", item_name="Test", qty=1),
+	frappe._dict(name="TEST-SII-0003", item_code="TEST-OHNE-PUNKTE", item_name="Test", qty=1),
+]
+
+
+class UnitTestEnjoPunkteVergabe(UnitTestCase):
+	"""
+	Unit tests für Vergabe und Storno der ENJO Punkte (server_scripts/enjo_punkte_vergabe).
+	Datenbank und Rollups sind gemockt - geprüft werden Zeilen, Anzahl der Abfragen und Idempotenz.
+	"""
+
+	def vergeben(self, vergeben=()):
+		mocks = frappe._dict(db=MagicMock(), rollups=MagicMock())
+		mocks.db.sql.return_value = [RECHNUNG]
+		with (
+			patch.object(enjo_punkte_vergabe.frappe, "db", mocks.db),
+			patch.object(enjo_punkte_vergabe.frappe, "get_all", side_effect=[POSITIONEN, list(vergeben)]),
+			patch.object(enjo_punkte_vergabe, "get_punkte_pro_artikel", return_value={"TEST-ITEM": 5}),
+			patch.object(enjo_punkte_vergabe, "punkte_saldo", mocks.rollups.saldo),
+			patch.object(enjo_punkte_vergabe, "punkte_periode", mocks.rollups.periode),
+			patch.object(enjo_punkte_vergabe, "punkte_rangliste", mocks.rollups.rangliste),
+			patch.object(enjo_punkte_vergabe, "punkte_cache", mocks.rollups.cache),
+		):
+			mocks.anzahl = enjo_punkte_vergabe.award_points_for_invoice(RECHNUNG.name)
+		return mocks
+
+	def test_vergabe_mit_einem_insert(self):
+		mocks = self.vergeben()
+
+		self.assertEqual(mocks.anzahl, 2)
+		mocks.db.bulk_insert.assert_called_once()
+		doctype, felder, werte = mocks.db.bulk_insert.call_args.args
+		self.assertEqual(doctype, "ENJO Punkte Transaktion")
+		self.assertEqual(len(werte), 2)
+		zeile = dict(zip(felder, werte[0], strict=True))
+		self.assertEqual((zeile["sales_invoice_item"], zeile["punkte_gesamt"]), ("TEST-SII-0001", 10))
+		mocks.rollups.saldo.add_transaktionen.assert_called_once()
+		mocks.rollups.cache.invalidate_ledger_version.assert_called_once()
+
+	def test_wiederholte_vergabe_schreibt_nur_fehlende(self):
+		mocks = self.vergeben(vergeben=["TEST-SII-0001"])
+
+		self.assertEqual(mocks.anzahl, 1)
+		werte = mocks.db.bulk_insert.call_args.args[2]
+		self.assertEqual(len(werte), 1)
+
+	def test_vollstaendig_vergeben_ist_noop(self):
+		mocks = self.vergeben(vergeben=["TEST-SII-0001", "TEST-SII-0002"])
+
+		self.assertEqual(mocks.anzahl, 0)
+		mocks.db.bulk_insert.assert_not_called()
+		mocks.rollups.saldo.add_transaktionen.assert_not_called()
+
+	def test_storno_mit_einem_update(self):
+		db = MagicMock()
+		stornierte = [
+			frappe._dict(
+				sales_partner="Test Partnerin",
+				periode="2026-10-01",
+				punkte=15,
+				punkte_vergabe=15,
+				anzahl=2,
+				zeilen=2,
+			),
+			frappe._dict(
+				sales_partner="Test Partnerin",
+				periode="2026-11-01",
+				punkte=-5,
+				punkte_vergabe=0,
+				anzahl=0,
+				zeilen=1,
+			),
+		]
+		db.sql.side_effect = [stornierte, None]
+		rollups = MagicMock()
+
+		with (
+			patch.object(enjo_punkte_vergabe.frappe, "db", db),
+			patch.object(enjo_punkte_vergabe, "punkte_saldo", rollups.saldo),
+			patch.object(enjo_punkte_vergabe, "punkte_periode", rollups.periode),
+			patch.object(enjo_punkte_vergabe, "punkte_rangliste", rollups.rangliste),
+			patch.object(enjo_punkte_vergabe, "punkte_cache", rollups.cache),
+		):
+			anzahl = enjo_punkte_vergabe.cancel_punkte_transaktionen(RECHNUNG.name)
+
+		# Vergaben und Verfall-Gegenbuchung
+		self.assertEqual(anzahl, 3)
+		self.assertEqual(db.sql.call_count, 2)
+		rollups.saldo.remove_transaktionen.assert_called_once_with(RECHNUNG.name, stornierte)
+		rollups.periode.remove_transaktionen.assert_called_once_with(stornierte)
+
+	def test_storno_ohne_transaktionen(self):
+		db = MagicMock()
+		db.sql.return_value = []
+
+		with patch.object(enjo_punkte_vergabe.frappe, "db", db):
+			self.assertEqual(enjo_punkte_vergabe.cancel_punkte_transaktionen(RECHNUNG.name), 0)
+		self.assertEqual(db.sql.call_count, 1)
+
+	def test_abgleich_reiht_nur_fehlende_ein(self):
+		db = MagicMock()
+		db.sql_list.return_value = ["TEST-SINV-0001", "TEST-SINV-0002"]
+		rechnung = MagicMock()
+		enqueue = MagicMock()
+
+		with (
+			patch.object(enjo_punkte_vergabe.frappe, "db", db),
+			patch.object(enjo_punkte_vergabe.frappe, "get_doc", return_value=rechnung),
+			patch.object(enjo_punkte_vergabe.frappe, "get_meta", return_value=MagicMock()),
+			patch(
+				"frappe.utils.background_jobs.is_job_enqueued",
+				side_effect=lambda job_id: job_id.endswith("0002"),
+			),
+			patch.object(enjo_punkte_vergabe, "enqueue_award_points", enqueue),
+			patch.object(enjo_punkte_vergabe, "logger"),
+		):
+			fehlend = enjo_punkte_vergabe.reconcile_punkte_vergabe()
+
+		# Bereits eingereihte Vergabe-Jobs werden nicht doppelt eingereiht
+		self.assertEqual(fehlend, ["TEST-SINV-0001"])
+		enqueue.assert_called_once_with("TEST-SINV-0001")
+		rechnung.add_comment.assert_called_once()
+
+
+class IntegrationTestEnjoPunkteVergabe(IntegrationTestCase):
+	"""
+	Integration tests für Vergabe und Storno der ENJO Punkte gegen die Datenbank.
+	Rechnung und Partnerin sind nur Namen - bulk_insert prüft keine Links.
+	"""
+
+	def test_transaktionen_mit_einem_insert_geschrieben(self):
+		zeilen = enjo_punkte_vergabe.build_punkte_zeilen(
+			RECHNUNG.name, RECHNUNG.sales_partner, RECHNUNG.posting_date, POSITIONEN, {"TEST-ITEM": 5}
+		)
+		enjo_punkte_vergabe.insert_punkte_transaktionen(zeilen)
+
+		transaktionen = frappe.get_all(
+			"ENJO Punkte Transaktion",
+			filters={"sales_invoice": RECHNUNG.name},
+			fields=[
+				"name",
+				"owner",
+				"creation",
+				"sales_partner",
+				"sales_invoice_item",
+				"punkte_gesamt",
+				"is_cancelled",
+			],
+			order_by="sales_invoice_item",
+		)
+		self.assertEqual(
+			[(t.sales_invoice_item, t.punkte_gesamt, t.is_cancelled) for t in transaktionen],
+			[("TEST-SII-0001", 10, 0), ("TEST-SII-0002", 5, 0)],
+		)
+		# Name und Standardfelder wie beim Dokument-Insert
+		self.assertEqual(len({t.name for t in transaktionen}), 2)
+		self.assertTrue(all(t.creation and t.owner == frappe.session.user for t in transaktionen))
+
+	def test_storno_setzt_ledger_saldo_und_perioden_zurueck(self):
+		rechnung = "TEST-SINV-STORNO-0001"
+		zeilen = enjo_punkte_vergabe.build_punkte_zeilen(
+			rechnung, "Test Partnerin Storno", "2026-10-01", POSITIONEN, {"TEST-ITEM": 5}
+		)
+		enjo_punkte_vergabe.insert_punkte_transaktionen(zeilen)
+		punkte_saldo.add_transaktionen(zeilen)
+		punkte_periode.add_transaktionen(zeilen)
+
+		self.assertEqual(enjo_punkte_vergabe.cancel_punkte_transaktionen(rechnung), 2)
+
+		self.assertFalse(
+			frappe.db.exists("ENJO Punkte Transaktion", {"sales_invoice": rechnung, "is_cancelled": 0})
+		)
+		# Die stornierte Rechnung war die letzte Aktivität - der Saldo wird aus dem (leeren) Ledger neu berechnet
+		self.assertFalse(frappe.db.exists("ENJO Punkte Saldo", "Test Partnerin Storno"))
+		periode = frappe.db.get_value(
+			"ENJO Punkte Periode",
+			{"sales_partner": "Test Partnerin Storno", "periode": "2026-10-01"},
+			["total_points", "transaction_count"],
+		)
+		self.assertEqual(tuple(periode), (0, 0))
+		# Ein zweites Storno findet nichts mehr
+		self.assertEqual(enjo_punkte_vergabe.cancel_punkte_transaktionen(rechnung), 0)
@@ -0,0 +1,179 @@
+# Benchmark für das ENJO Punkte Ledger (nur Entwicklungs-Sites)
+#
+# Befüllt das Ledger mit synthetischen Transaktionen und misst Storno und Punkte-Übersicht
+# einmal ohne und einmal mit den Lookup-Indizes:
+#
+#   bench --site <site> execute enjo_party.enjo_party.utils.benchmark_punkte_ledger.run --kwargs "{'rows': 500000}"
+#
+# Punkteverfall über ein großes Ledger (Laufzeit gegen das Timeout der Long-Queue):
+#
+#   bench --site <site> execute enjo_party.enjo_party.utils.benchmark_punkte_ledger.run_verfall --kwargs "{'rows': 1000000}"
+#
+# Alle Testdaten tragen das Präfix BENCH- und werden am Ende wieder gelöscht: die erzeugten Zeilen über
+# ihre Namen, Verfall-Gegenbuchungen über verfall_von.
+
+import time
+
+import frappe
+from frappe.utils import add_days, getdate, now
+
+from enjo_party.enjo_party.report.enjo_punkte_uebersicht.enjo_punkte_uebersicht import get_data
+from enjo_party.enjo_party.utils.punkte_verfall import VERFALL_BATCH_SIZE, process_punkte_verfall
+from enjo_party.patches.add_enjo_punkte_transaktion_lookup_indexes import execute as add_lookup_indexes
+
+PREFIX = "BENCH-"
+CLEANUP_CHUNK_SIZE = 10000
+START = "2024-01-01"
+# Standard-Timeout der Long-Queue, auf der scheduler_events "daily_long" laufen
+LONG_QUEUE_TIMEOUT = 1500
+TABLE = "tabENJO Punkte Transaktion"
+LOOKUP_INDEXES = (
+	"sales_invoice",
+	"item_code",
+	"sales_partner_is_cancelled_transaction_date_index",
+	"sales_partner_transaction_date_index",
+)
+
+
+def run(rows=200000, partners=200, lines_per_invoice=5, repeat=5):
+	if not frappe.conf.developer_mode:
+		frappe.throw("Der Benchmark läuft nur auf Sites mit developer_mode.")
+
+	try:
+		seed(rows, partners, lines_per_invoice)
+		invoices = frappe.db.sql_list(
+			f"SELECT DISTINCT sales_invoice FROM `{TABLE}` WHERE sales_invoice LIKE %s LIMIT %s",
+			(f"{PREFIX}%", repeat),
+		)
+
+		drop_lookup_indexes()
+		ohne = measure(invoices, partners)
+
+		add_lookup_indexes()
+		mit = measure(invoices, partners)
+	finally:
+		cleanup(rows)
+
+	return {"rows": rows, "ohne_indizes": ohne, "mit_indizes": mit}
+
+
+def run_verfall(rows=1000000, partners=2000, lines_per_invoice=5, batch_size=VERFALL_BATCH_SIZE):
+	"""Lässt etwa die Hälfte eines synthetischen Ledgers verfallen und misst die Laufzeit"""
+	if not frappe.conf.developer_mode:
+		frappe.throw("Der Benchmark läuft nur auf Sites mit developer_mode.")
+
+	try:
+		seed(rows, partners, lines_per_invoice)
+		start = time.perf_counter()
+		verfallen = process_punkte_verfall(stichtag=add_days(START, 350), batch_size=batch_size)
+		dauer = round(time.perf_counter() - start, 1)
+	finally:
+		cleanup(rows)
+
+	return {
+		"rows": rows,
+		"verfallen": verfallen,
+		"sekunden": dauer,
+		"zeilen_pro_sekunde": round(verfallen / dauer) if dauer else None,
+		"im_zeitfenster": dauer < LONG_QUEUE_TIMEOUT,
+	}
+
+
+def seed(rows, partners, lines_per_invoice):
+	"""Synthetische Ledger-Zeilen in Blöcken per bulk_insert"""
+	zeitpunkt = now()
+	start = getdate(START)
+	felder = [
+		"name",
+		"creation",
+		"modified",
+		"modified_by",
+		"owner",
+		"docstatus",
+		"idx",
+		"sales_partner",
+		"sales_invoice",
+		"item_code",
+		"item_name",
+		"qty",
+		"punkte_pro_item",
+		"punkte_gesamt",
+		"transaction_date",
+		"is_cancelled",
+		"transaktionsart",
+		"verfallen",
+	]
+	# Generator statt Liste - bulk_insert liest blockweise, es liegen nie alle Zeilen im Speicher
+	werte = (
+		(
+			f"{PREFIX}{i}",
+			zeitpunkt,
+			zeitpunkt,
+			"Administrator",
+			"Administrator",
+			0,
+			0,
+			f"{PREFIX}PARTNER-{i % partners}",
+			f"{PREFIX}SINV-{i // lines_per_invoice}",
+			f"{PREFIX}ITEM-{i % 500}",
+			"Benchmark",
+			1,
+			10,
+			10,
+			add_days(start, i % 700),
+			0,
+			"Vergabe",
+			0,
+		)
+		for i in range(rows)
+	)
+	frappe.db.bulk_insert("ENJO Punkte Transaktion", felder, werte, chunk_size=10000)
+	frappe.db.commit()
+
+
+def drop_lookup_indexes():
+	vorhandene = {row.Key_name for row in frappe.db.sql(f"SHOW INDEX FROM `{TABLE}`", as_dict=True)}
+	for index_name in LOOKUP_INDEXES:
+		if index_name in vorhandene:
+			frappe.db.sql_ddl(f"ALTER TABLE `{TABLE}` DROP INDEX `{index_name}`")
+
+
+def measure(invoices, partners):
+	"""Mittlere Laufzeit in Millisekunden für Storno-Lookup und Report mit/ohne Zeitraum"""
+
+	def zeit(funktion):
+		start = time.perf_counter()
+		for _ in range(len(invoices)):
+			funktion()
+		return round((time.perf_counter() - start) * 1000 / max(len(invoices), 1), 2)
+
+	invoice_iter = iter(invoices * 2)
+	return {
+		"storno_lookup_ms": zeit(
+			lambda: frappe.db.sql(
+				f"SELECT sales_partner, SUM(punkte_gesamt), COUNT(*) FROM `{TABLE}` "
+				"WHERE sales_invoice = %s AND is_cancelled = 0 GROUP BY sales_partner",
+				next(invoice_iter),
+			)
+		),
+		"report_zeitraum_ms": zeit(lambda: get_data({"from_date": "2024-03-01", "to_date": "2024-06-30"})),
+		"report_partnerin_ms": zeit(
+			lambda: get_data(
+				{
+					"sales_partner": f"{PREFIX}PARTNER-{partners // 2}",
+					"from_date": "2024-01-01",
+					"to_date": "2025-12-31",
+				}
+			)
+		),
+	}
+
+
+def cleanup(rows):
+	"""Löscht die von seed erzeugten Zeilen und die daran hängenden Verfall-Gegenbuchungen (Hash-Namen)"""
+	for start in range(0, rows, CLEANUP_CHUNK_SIZE):
+		namen = tuple(f"{PREFIX}{i}" for i in range(start, min(start + CLEANUP_CHUNK_SIZE, rows)))
+		frappe.db.sql(f"DELETE FROM `{TABLE}` WHERE verfall_von IN %(namen)s", {"namen": namen})
+		frappe.db.sql(f"DELETE FROM `{TABLE}` WHERE name IN %(namen)s", {"namen": namen})
+		frappe.db.commit()
+	add_lookup_indexes()
@@ -0,0 +1,369 @@
+# Folgebelege eines Sales Orders
+# Der Sales Order on_submit-Hook reiht nur noch eine Job-Kette nach dem Commit ein, statt Rechnung,
+# Punkte und Picklist synchron im Submit zu erstellen:
+#
+#   rechnung  -> Sales Invoice erstellen und einreichen
+#   punkte    -> ENJO Punkte vergeben (award_points_for_invoice)
+#   picklist  -> Picklist für die Rechnung (utils/picklist)
+#
+# Jeder Schritt ist ein eigener Job mit eigenem Commit und reiht den nächsten erst danach ein. Schlägt ein
+# Schritt fehl, wird er bis zu FOLGEBELEGE_VERSUCHE Mal wiederholt - nicht sofort, sondern nach einer mit
+# jedem Versuch verdoppelten Wartezeit: der Sales Order merkt sich den fälligen Versuch
+# (custom_folgebelege_naechster_versuch, custom_folgebelege_versuch) und der Scheduler reiht ihn ein
+# (enqueue_faellige_wiederholungen). Danach steht der Sales Order auf "Fehlgeschlagen"
+# (custom_folgebelege_status / custom_folgebelege_fehler) und kann per retry_folgebelege neu angestoßen
+# werden. Alle Schritte sind idempotent - ein Neustart beginnt vorn.
+#
+# Fehlgeschlagene Läufe werden gezählt (custom_folgebelege_versuche, custom_folgebelege_fehlgeschlagen_am):
+# ein manueller Neustart ist erst nach einer mit jedem Lauf verdoppelten Wartezeit möglich und nach
+# FOLGEBELEGE_WIEDERHOLUNGEN Neustarts nur noch für System Manager.
+#
+# Aufträge einer Party-Buchung sind ausgenommen: create_invoices erstellt deren Rechnungen selbst und
+# kommissioniert sie gruppiert nach Versandziel.
+
+import frappe
+from frappe import _
+from frappe.utils import add_to_date, cint, format_datetime, get_datetime, now, now_datetime
+
+from enjo_party.enjo_party.utils import logger
+
+FOLGEBELEGE_VERSUCHE = 3
+# Manuelle Neustarts nach einem fehlgeschlagenen Lauf und Wartezeit vor dem ersten davon (Sekunden)
+FOLGEBELEGE_WIEDERHOLUNGEN = 3
+FOLGEBELEGE_WARTEZEIT = 300
+
+STATUS_AUSSTEHEND = "Ausstehend"
+STATUS_RECHNUNG = "Rechnung erstellt"
+STATUS_PUNKTE = "Punkte vergeben"
+STATUS_ABGESCHLOSSEN = "Abgeschlossen"
+STATUS_FEHLGESCHLAGEN = "Fehlgeschlagen"
+
+# Status eines Sales Orders, solange ein Schritt noch aussteht
+SCHRITT_STATUS = {"rechnung": STATUS_AUSSTEHEND, "punkte": STATUS_RECHNUNG, "picklist": STATUS_PUNKTE}
+
+
+def get_job_id(sales_order, schritt, versuch):
+	"""Eigene Job-ID pro Schritt und Versuch - der laufende Job blockiert so nicht seinen Nachfolger"""
+	return f"enjo_folgebelege::{sales_order}::{schritt}::{versuch}"
+
+
+def set_status(sales_order, status, fehler=None):
+	frappe.db.set_value(
+		"Sales Order",
+		sales_order,
+		{"custom_folgebelege_status": status, "custom_folgebelege_fehler": fehler},
+		update_modified=False,
+	)
+
+
+def set_fehlgeschlagen(sales_order, fehler):
+	"""Status Fehlgeschlagen setzen und den fehlgeschlagenen Lauf zählen"""
+	versuche = cint(frappe.db.get_value("Sales Order", sales_order, "custom_folgebelege_versuche"))
+	frappe.db.set_value(
+		"Sales Order",
+		sales_order,
+		{
+			"custom_folgebelege_status": STATUS_FEHLGESCHLAGEN,
+			"custom_folgebelege_fehler": fehler,
+			"custom_folgebelege_versuche": versuche + 1,
+			"custom_folgebelege_fehlgeschlagen_am": now(),
+		},
+		update_modified=False,
+	)
+
+
+def get_naechster_versuch(versuche, fehlgeschlagen_am):
+	"""
+	Frühester Zeitpunkt für den nächsten Versuch (Wartezeit verdoppelt sich mit jedem Versuch).
+	Gilt für manuelle Neustarts nach fehlgeschlagenen Läufen wie für automatische Wiederholungen.
+	"""
+	if not fehlgeschlagen_am:
+		return None
+	wartezeit = FOLGEBELEGE_WARTEZEIT * 2 ** max(cint(versuche) - 1, 0)
+	return add_to_date(get_datetime(fehlgeschlagen_am), seconds=wartezeit)
+
+
+def plan_wiederholung(sales_order, schritt, versuch, fehler):
+	"""Automatische Wiederholung des Schritts nach der Wartezeit vormerken (reiht der Scheduler ein)"""
+	frappe.db.set_value(
+		"Sales Order",
+		sales_order,
+		{
+			"custom_folgebelege_status": SCHRITT_STATUS[schritt],
+			"custom_folgebelege_fehler": fehler,
+			"custom_folgebelege_versuch": versuch,
+			"custom_folgebelege_naechster_versuch": get_naechster_versuch(versuch - 1, now_datetime()),
+		},
+		update_modified=False,
+	)
+
+
+def enqueue_faellige_wiederholungen():
+	"""Scheduler: reiht automatische Wiederholungen ein, deren Wartezeit abgelaufen ist"""
+	schritte = {status: schritt for schritt, status in SCHRITT_STATUS.items()}
+	faellig = frappe.get_all(
+		"Sales Order",
+		filters={"docstatus": 1, "custom_folgebelege_naechster_versuch": ["<=", now()]},
+		fields=["name", "custom_folgebelege_status", "custom_folgebelege_versuch"],
+	)
+	for auftrag in faellig:
+		schritt = schritte.get(auftrag.custom_folgebelege_status, "rechnung")
+		sales_invoice = get_invoice_for_order(auftrag.name) if schritt != "rechnung" else None
+		frappe.db.set_value(
+			"Sales Order", auftrag.name, "custom_folgebelege_naechster_versuch", None, update_modified=False
+		)
+		enqueue_folgebelege(
+			auftrag.name, schritt, sales_invoice, cint(auftrag.custom_folgebelege_versuch) or 1
+		)
+
+	if faellig:
+		logger.info(
+			"Folgebelege: %s Wiederholungen eingereiht", len(faellig), title="folgebelege_retry_enqueued"
+		)
+
+
+def enqueue_folgebelege(sales_order, schritt="rechnung", sales_invoice=None, versuch=1):
+	frappe.enqueue(
+		"enjo_party.enjo_party.utils.folgebelege.run_folgebelege",
+		queue="default",
+		job_id=get_job_id(sales_order, schritt, versuch),
+		deduplicate=True,
+		enqueue_after_commit=True,
+		sales_order=sales_order,
+		schritt=schritt,
+		sales_invoice=sales_invoice,
+		versuch=versuch,
+	)
+
+
+def run_folgebelege(sales_order, schritt="rechnung", sales_invoice=None, versuch=1):
+	"""
+	Hintergrund-Job: führt einen Schritt der Kette aus und reiht den nächsten ein.
+	Fehler werden nicht weitergeworfen, sondern als neuer Versuch bzw. Status am Sales Order festgehalten.
+	"""
+	versuch = cint(versuch) or 1
+
+	try:
+		naechster = None
+		status = None
+
+		if schritt == "rechnung":
+			sales_invoice = create_sales_invoice_for_order(
+				frappe.get_doc("Sales Order", sales_order), im_job=True
+			)
+			status = STATUS_RECHNUNG
+			naechster = "punkte" if sales_invoice else None
+
+		elif schritt == "punkte":
+			from enjo_party.enjo_party.server_scripts.enjo_punkte_vergabe import award_points_for_invoice
+
+			if frappe.db.get_value("Sales Invoice", sales_invoice, "sales_partner"):
+				award_points_for_invoice(sales_invoice)
+			status = STATUS_PUNKTE
+			naechster = "picklist"
+
+		elif schritt == "picklist":
+			from enjo_party.enjo_party.utils.picklist import create_picklist_for_invoice
+
+			create_picklist_for_invoice(frappe.get_doc("Sales Invoice", sales_invoice))
+
+		else:
+			frappe.throw(_("Unbekannter Schritt {0}").format(schritt))
+
+		set_status(sales_order, status if naechster else STATUS_ABGESCHLOSSEN)
+		if naechster:
+			enqueue_folgebelege(sales_order, naechster, sales_invoice)
+		frappe.db.commit()
+
+	except Exception as e:
+		frappe.db.rollback()
+
+		if versuch < FOLGEBELEGE_VERSUCHE and schritt in SCHRITT_STATUS:
+			logger.warn(
+				f"Folgebelege {sales_order}: Schritt {schritt} fehlgeschlagen (Versuch {versuch}/{FOLGEBELEGE_VERSUCHE}): {e!s}",
+				title="folgebelege_retry",
+			)
+			plan_wiederholung(sales_order, schritt, versuch + 1, f"{schritt}: {e!s}")
+		else:
+			logger.error(
+				f"Folgebelege {sales_order}: Schritt {schritt} nach {versuch} Versuchen fehlgeschlagen: {e!s}\n{frappe.get_traceback()}",
+				title="folgebelege_failed",
+			)
+			set_fehlgeschlagen(sales_order, f"{schritt}: {e!s}")
+		frappe.db.commit()
+
+
+@frappe.whitelist()
+def retry_folgebelege(sales_order):
+	"""Stößt die Kette für einen Sales Order erneut an (beginnt bei der Rechnung, erledigte Schritte werden übersprungen)"""
+	frappe.has_permission("Sales Order", "write", doc=sales_order, throw=True)
+	auftrag = frappe.db.get_value(
+		"Sales Order",
+		sales_order,
+		[
+			"docstatus",
+			"custom_folgebelege_status",
+			"custom_folgebelege_versuche",
+			"custom_folgebelege_fehlgeschlagen_am",
+		],
+		as_dict=True,
+	)
+	if not auftrag or auftrag.docstatus != 1:
+		frappe.throw(_("Der Auftrag {0} ist nicht eingereicht").format(sales_order))
+	if auftrag.custom_folgebelege_status != STATUS_FEHLGESCHLAGEN:
+		frappe.throw(_("Die Folgebelege für {0} sind nicht fehlgeschlagen").format(sales_order))
+
+	# Jeder manuelle Neustart kam aus einem fehlgeschlagenen Lauf - der erste Lauf ist der automatische
+	if (
+		cint(auftrag.custom_folgebelege_versuche) > FOLGEBELEGE_WIEDERHOLUNGEN
+		and "System Manager" not in frappe.get_roles()
+	):
+		frappe.throw(
+			_(
+				"Die Folgebelege für {0} sind {1} Mal fehlgeschlagen. Bitte den Fehler von einem System Manager prüfen lassen."
+			).format(sales_order, auftrag.custom_folgebelege_versuche)
+		)
+
+	naechster_versuch = get_naechster_versuch(
+		auftrag.custom_folgebelege_versuche, auftrag.custom_folgebelege_fehlgeschlagen_am
+	)
+	if naechster_versuch and naechster_versuch > now_datetime():
+		frappe.throw(_("Ein erneuter Versuch ist ab {0} möglich").format(format_datetime(naechster_versuch)))
+
+	set_status(sales_order, STATUS_AUSSTEHEND)
+	enqueue_folgebelege(sales_order)
+
+
+def get_invoice_for_order(sales_order):
+	"""Nicht stornierte Sales Invoice zu einem Sales Order (über die Rechnungspositionen)"""
+	invoice = frappe.db.sql(
+		"""
+		SELECT sii.parent
+		FROM `tabSales Invoice Item` sii
+		INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
+		WHERE sii.sales_order = %s
+			AND sii.parenttype = 'Sales Invoice'
+			AND si.docstatus != 2
+		LIMIT 1
+		""",
+		sales_order,
+	)
+	return invoice[0][0] if invoice else None
+
+
+def create_sales_invoice_for_order(doc, im_job=False):
+	"""
+	Erstellt die Sales Invoice zu einem eingereichten Sales Order und reicht sie ein.
+
+	Args:
+		doc: Sales Order
+		im_job: Aufruf aus der Folgebeleg-Kette - Punkte und Picklist der Rechnung laufen dann als
+			eigene Schritte statt über die on_submit-Hooks der Rechnung
+
+	Returns:
+		Name der (bereits bestehenden oder neuen) Sales Invoice oder None ohne Positionen
+	"""
+	existing_invoice = get_invoice_for_order(doc.name)
+	if existing_invoice:
+		logger.info(
+			"Sales Invoice already exists for Sales Order %s: %s",
+			doc.name,
+			existing_invoice,
+			title="invoice_exists",
+		)
+		return existing_invoice
+
+	if not doc.items:
+		return None
+
+	logger.info(
+		"No existing invoice found - creating new one for Sales Order %s", doc.name, title="creating_new"
+	)
+
+	# Erstelle Sales Invoice basierend auf Sales Order
+	invoice_data = {
+		"doctype": "Sales Invoice",
+		"customer": doc.customer,
+		"posting_date": frappe.utils.today(),
+		"due_date": frappe.utils.today(),
+		"customer_address": doc.customer_address,
+		"shipping_address_name": doc.shipping_address_name,
+		"po_no": doc.po_no,  # Party-Referenz übernehmen
+		"po_date": doc.transaction_date,
+		"company": doc.company or frappe.defaults.get_user_default("Company"),
+		"currency": doc.currency,
+		"selling_price_list": doc.selling_price_list,
+		"sales_partner": doc.sales_partner,
+		"remarks": f"Automatisch erstellt aus Sales Order: {doc.name}",
+		"items": [],
+	}
+
+	# Party-Referenz nur übernehmen, wenn die Party nicht storniert ist
+	if doc.get("custom_party_reference"):
+		if frappe.db.get_value("Party", doc.custom_party_reference, "docstatus") == 2:
+			logger.warn(
+				f"Party {doc.custom_party_reference} ist cancelled - überspringe Referenz",
+				title="cancelled_party",
+			)
+		else:
+			invoice_data["custom_party_reference"] = doc.custom_party_reference
+
+	if doc.get("custom_calculated_shipping_cost"):
+		invoice_data["custom_calculated_shipping_cost"] = doc.custom_calculated_shipping_cost
+
+	# Kopiere alle Items vom Sales Order
+	for item in doc.items:
+		invoice_item = {
+			"doctype": "Sales Invoice Item",
+			"item_code": item.item_code,
+			"item_name": item.item_name,
+			"description": getattr(item, "description", item.item_name),
+			"qty": item.qty,
+			"rate": item.rate,
+			"amount": item.amount,
+			"uom": item.uom,
+			"conversion_factor": getattr(item, "conversion_factor", 1.0),
+			"warehouse": getattr(item, "warehouse", None),
+			"sales_order": doc.name,  # Referenz zum Sales Order
+			"so_detail": item.name,  # Referenz zum Sales Order Item
+		}
+
+		# Optionale Felder nur hinzufügen wenn sie existieren
+		if getattr(item, "cost_center", None):
+			invoice_item["cost_center"] = item.cost_center
+		if getattr(item, "income_account", None):
+			invoice_item["income_account"] = item.income_account
+
+		invoice_data["items"].append(invoice_item)
+
+	invoice = frappe.get_doc(invoice_data)
+
+	# WICHTIG: Verhindere Preis-Validierung damit Gutschein-Preise erhalten bleiben
+	invoice.flags.ignore_pricing_rule = True
+	invoice.flags.ignore_item_price = True
+	invoice.flags.folgebelege_im_job = im_job
+
+	# Setze die exakten Preise aus dem Sales Order nochmal explizit
+	for invoice_item, so_item in zip(invoice.items, doc.items, strict=True):
+		# Überschreibe mit den exakten Sales Order Preisen (inkl. Gutschein-Rabatte)
+		invoice_item.rate = so_item.rate
+		invoice_item.price_list_rate = so_item.rate
+		invoice_item.base_rate = so_item.rate
+		invoice_item.base_price_list_rate = so_item.rate
+		invoice_item.amount = so_item.amount
+		invoice_item.base_amount = so_item.amount
+		# Markiere als manuell gesetzt um weitere Validierung zu verhindern
+		invoice_item.flags.ignore_pricing_rule = True
+
+	invoice.insert()
+	logger.info("Sales Invoice created: %s", invoice.name, title="invoice_created")
+
+	invoice.submit()
+	logger.info(
+		"✅ SUCCESS: Auto invoice complete for SO %s -> SI %s",
+		doc.name,
+		invoice.name,
+		title="auto_invoice_complete",
+	)
+
+	return invoice.name
@@ -0,0 +1,123 @@
+# ENJO Party Logging
+# Gepuffertes, levelbasiertes Logging statt frappe.log_error für Debug-Ausgaben
+#
+# Site Config (site_config.json):
+#   "enjo_party_log_level": "DEBUG" | "INFO" | "WARN" | "ERROR"   (Standard: "WARN")
+#   "enjo_party_log_sink": "file" | "error_log"                    (Standard: "file")
+#
+# Einträge unterhalb des Levels werden sofort verworfen. Alle anderen werden pro
+# Request/Job in frappe.local gesammelt und am Ende einmal geschrieben:
+#   - "file":      in die rotierende Logdatei logs/enjo_party.log
+#   - "error_log": als ein kompakter Error Log Eintrag pro Request
+# Nur echte Fehler (error) landen zusätzlich sofort im Error Log.
+#
+# Werte werden wie beim logging-Modul erst formatiert, wenn der Eintrag geschrieben wird:
+#   logger.debug("Versandziel %s: %s Aufträge", target, len(orders), title="group_detail")
+# Teure Ausgaben (Schleifen nur fürs Log) zusätzlich mit logger.is_enabled(logger.DEBUG) absichern.
+
+import frappe
+from frappe.utils import now
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARN": WARN, "WARNING": WARN, "ERROR": ERROR}
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARN: "WARN", ERROR: "ERROR"}
+
+# Ab dieser Puffergröße wird auch mitten im Request geschrieben
+MAX_BUFFER_SIZE = 500
+
+
+def get_level():
+	"""Liefert das konfigurierte Log-Level (pro Request gecacht)."""
+	level = getattr(frappe.local, "enjo_party_log_level", None)
+	if level is None:
+		configured = str(frappe.conf.get("enjo_party_log_level") or "WARN").upper()
+		level = LEVELS.get(configured, WARN)
+		frappe.local.enjo_party_log_level = level
+	return level
+
+
+def is_enabled(level):
+	"""True, wenn Einträge dieses Levels geschrieben werden."""
+	return level >= get_level()
+
+
+def debug(message, *args, title=None):
+	_log(DEBUG, message, title, args)
+
+
+def info(message, *args, title=None):
+	_log(INFO, message, title, args)
+
+
+def warn(message, *args, title=None):
+	_log(WARN, message, title, args)
+
+
+def error(message, *args, title=None):
+	"""
+	Echte Fehler: werden unabhängig vom Level sofort ins Error Log geschrieben
+	und zusätzlich im Puffer festgehalten, damit der Kontext im Request-Log steht.
+	"""
+	message = _format(message, args)
+	frappe.log_error(title=f"ERROR: {title}" if title else "ERROR: enjo_party", message=message)
+	_log(ERROR, message, title)
+
+
+def _log(level, message, title, args=()):
+	if level < get_level():
+		return
+
+	buffer = _get_buffer()
+	buffer.append((now(), LEVEL_NAMES[level], title or "", _format(message, args)))
+
+	if len(buffer) >= MAX_BUFFER_SIZE:
+		flush()
+
+
+def _format(message, args):
+	"""message % args - ohne Werte bleibt die Nachricht unverändert (auch mit %)"""
+	if not args:
+		return str(message)
+	try:
+		return str(message) % args
+	except (TypeError, ValueError):
+		# Falsche Platzhalter dürfen keinen Request abbrechen
+		return " ".join(str(teil) for teil in (message, *args))
+
+
+def _get_buffer():
+	buffer = getattr(frappe.local, "enjo_party_log_buffer", None)
+	if buffer is None:
+		buffer = frappe.local.enjo_party_log_buffer = []
+	return buffer
+
+
+def flush(*args, **kwargs):
+	"""
+	Schreibt alle gepufferten Einträge in einem Rutsch.
+	Wird über after_request / after_job in hooks.py aufgerufen.
+	"""
+	buffer = getattr(frappe.local, "enjo_party_log_buffer", None)
+	if not buffer:
+		return
+
+	frappe.local.enjo_party_log_buffer = []
+	lines = "\n".join(
+		f"{timestamp} {level} [{title}] {message}" for timestamp, level, title, message in buffer
+	)
+
+	try:
+		if frappe.conf.get("enjo_party_log_sink") == "error_log":
+			# defer_insert: kein eigener Commit nötig, unabhängig von der laufenden Transaktion
+			frappe.log_error(
+				title=f"enjo_party: {len(buffer)} Log-Einträge", message=lines, defer_insert=True
+			)
+		else:
+			frappe.logger("enjo_party", allow_site=True, file_count=10).info(lines)
+	except Exception:
+		# Logging darf nie den eigentlichen Request abbrechen
+		pass
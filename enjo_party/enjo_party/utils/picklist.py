@@ -0,0 +1,529 @@
+# Pick List Service
+# Einziger Weg, auf dem Picklists zu Rechnungen entstehen. Die Gruppierung kommt vom Aufrufer:
+# - Party-Buchung (create_picklists_for_party): eine Picklist pro Versandziel über alle Aufträge der Gruppe
+# - einzelne Rechnung (on_submit-Hook): eine Picklist für die Aufträge dieser Rechnung
+# Beide laden Auftragspositionen, Rechnungen und Kundennamen mit Sammelabfragen (get_picklist_index)
+# und erstellen die Picklist über create_picklist.
+#
+# Während einer Party-Buchung ist frappe.flags.enjo_picklist_party gesetzt. Die dabei eingereichten
+# Rechnungen bekommen ihre Picklist gruppiert von der Buchung; der on_submit-Hook kehrt ohne Abfrage zurück.
+#
+# Zusammengefasste Kommissionierung ("Gleiche Artikel in Auswahllisten zusammenfassen" in ENJO
+# Aktionseinstellungen): gleiche Positionen (Artikel, Lager, Einheit) werden über alle Aufträge zu einer
+# Zeile mit summierter Menge zusammengefasst. Die Aufteilung auf die Auftragspositionen steht in der
+# Tabelle custom_zuordnung (Pick List Zuordnung); get_auftragszeilen rechnet gepickte Mengen darüber
+# auf die Aufträge zurück, create_delivery_notes erstellt daraus die Lieferscheine pro Auftrag.
+# Zusammengefasste Zeilen haben keine sales_order_item-Verknüpfung, ERPNext zählt ihre gepickte Menge
+# daher nicht am Auftrag. Das übernimmt update_auftrags_picked_qty (Pick List on_submit/on_cancel).
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from enjo_party.enjo_party.utils import logger
+
+# Versandartikel (shipping-7, shipping-3.5, ...) werden nicht kommissioniert
+VERSANDARTIKEL_PRAEFIX = "shipping-"
+
+
+def begin_party_buchung(party):
+	"""Markiert den laufenden Prozess als Party-Buchung - Rechnungen werden vom Hook nicht einzeln kommissioniert"""
+	frappe.flags.enjo_picklist_party = party
+
+
+def end_party_buchung():
+	frappe.flags.enjo_picklist_party = None
+
+
+def get_picklist_for_invoice(sales_invoice):
+	"""
+	Liefert die nicht stornierte Picklist zu einer Sales Invoice (oder None).
+	Gleichheitssuche über die Zuordnungstabelle Pick List Rechnung statt LIKE auf custom_invoice_references.
+	"""
+	picklist = frappe.db.sql(
+		"""
+		SELECT pl.name
+		FROM `tabPick List Rechnung` plr
+		INNER JOIN `tabPick List` pl ON pl.name = plr.parent
+		WHERE plr.sales_invoice = %s
+			AND plr.parenttype = 'Pick List'
+			AND pl.docstatus != 2
+		LIMIT 1
+		""",
+		sales_invoice,
+	)
+	return picklist[0][0] if picklist else None
+
+
+def get_picklist_index(sales_orders, mit_rechnungen=True):
+	"""
+	Lädt alles, was für die Picklists einer Reihe von Aufträgen gebraucht wird, mit bis zu vier Sammelabfragen.
+
+	Args:
+		sales_orders: Namen der Sales Orders
+		mit_rechnungen: gebuchte Rechnungen der Aufträge mitladen (entfällt, wenn die Rechnung bekannt ist)
+
+	Returns:
+		dict: {sales_order: {"customer", "customer_name", "items" (Positionen in idx-Reihenfolge), "invoices"}}
+			in der Reihenfolge von sales_orders
+	"""
+	sales_orders = list(dict.fromkeys(sales_orders or []))
+	if not sales_orders:
+		return {}
+
+	kunde_pro_auftrag = dict(
+		frappe.get_all(
+			"Sales Order", filters={"name": ["in", sales_orders]}, fields=["name", "customer"], as_list=True
+		)
+	)
+
+	index = {
+		sales_order: frappe._dict(
+			customer=kunde_pro_auftrag[sales_order], customer_name=None, items=[], invoices=[]
+		)
+		for sales_order in sales_orders
+		if kunde_pro_auftrag.get(sales_order)
+	}
+	if not index:
+		return {}
+
+	for item in frappe.get_all(
+		"Sales Order Item",
+		filters={"parent": ["in", list(index)], "parenttype": "Sales Order"},
+		fields=[
+			"name",
+			"parent",
+			"item_code",
+			"item_name",
+			"qty",
+			"stock_qty",
+			"uom",
+			"stock_uom",
+			"conversion_factor",
+			"warehouse",
+		],
+		order_by="parent, idx",
+	):
+		index[item.parent]["items"].append(item)
+
+	if mit_rechnungen:
+		# Gebuchte Rechnungen über die Rechnungspositionen (sales_order ist ein Feld der Position)
+		for sales_invoice, sales_order in frappe.db.sql(
+			"""
+			SELECT DISTINCT sii.parent, sii.sales_order
+			FROM `tabSales Invoice Item` sii
+			INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
+			WHERE sii.sales_order IN %(sales_orders)s
+				AND sii.parenttype = 'Sales Invoice'
+				AND si.docstatus = 1
+			ORDER BY sii.parent
+			""",
+			{"sales_orders": tuple(index)},
+		):
+			index[sales_order]["invoices"].append(sales_invoice)
+
+	kundennamen = dict(
+		frappe.get_all(
+			"Customer",
+			filters={"name": ["in", list({eintrag.customer for eintrag in index.values()})]},
+			fields=["name", "customer_name"],
+			as_list=True,
+		)
+	)
+	for eintrag in index.values():
+		eintrag.customer_name = kundennamen.get(eintrag.customer) or eintrag.customer
+
+	return index
+
+
+def build_picklist_items(auftraege):
+	"""
+	Picklist-Positionen aus den Auftragspositionen - jeder Auftrag behält seine eigenen Positionen (keine Vermischung).
+
+	Args:
+		auftraege: {sales_order: Eintrag aus get_picklist_index}
+	"""
+	locations = []
+	default_warehouse = None
+
+	for sales_order, eintrag in auftraege.items():
+		for so_item in eintrag["items"]:
+			# Überspringe Versandartikel (nur echte Produkte)
+			if so_item.item_code and so_item.item_code.startswith(VERSANDARTIKEL_PRAEFIX):
+				continue
+
+			warehouse = so_item.warehouse
+			if not warehouse:
+				if default_warehouse is None:
+					from enjo_party.enjo_party.doctype.party.party import get_default_warehouse
+
+					default_warehouse = get_default_warehouse()
+				warehouse = default_warehouse
+
+			locations.append(
+				{
+					"doctype": "Pick List Item",
+					"item_code": so_item.item_code,
+					"item_name": so_item.item_name,
+					"qty": float(so_item.qty),
+					"stock_qty": float(so_item.stock_qty or so_item.qty),
+					"picked_qty": 0.0,
+					"stock_reserved_qty": 0.0,
+					"uom": so_item.uom or "Stk",
+					"stock_uom": so_item.stock_uom or so_item.uom or "Stk",
+					"conversion_factor": float(so_item.conversion_factor or 1.0),
+					"warehouse": warehouse,
+					"sales_order": sales_order,
+					"sales_order_item": so_item.name,
+					"_customer": eintrag["customer"],
+					"batch_no": None,
+					"serial_no": None,
+					"use_serial_batch_fields": 0,
+					"serial_and_batch_bundle": None,
+					"product_bundle_item": None,
+					"material_request": None,
+					"material_request_item": None,
+				}
+			)
+
+	return locations
+
+
+def is_zusammenfassen_aktiv():
+	return bool(cint(frappe.db.get_single_value("ENJO Aktionseinstellungen", "picklist_zusammenfassen")))
+
+
+def zusammenfassen(locations):
+	"""
+	Fasst Positionen mit gleichem (item_code, warehouse, uom) zu einer Zeile mit summierter Menge zusammen.
+	Die Zuordnungszeilen tragen denselben Schlüssel - nicht den idx, den ERPNext beim Speichern neu vergibt.
+
+	Returns:
+		tuple: (zusammengefasste Positionen, Zuordnungszeilen für Pick List Zuordnung)
+	"""
+	zeilen = {}
+	zuordnung = []
+
+	for location in locations:
+		schluessel = (location["item_code"], location["warehouse"], location["uom"])
+		zeile = zeilen.get(schluessel)
+		if zeile is None:
+			zeilen[schluessel] = dict(location)
+		else:
+			zeile["qty"] += location["qty"]
+			zeile["stock_qty"] += location["stock_qty"]
+			# Zeile gehört zu mehreren Auftragspositionen - die Zuordnung übernimmt custom_zuordnung
+			if zeile["sales_order_item"] != location["sales_order_item"]:
+				zeile["sales_order"] = zeile["sales_order_item"] = None
+
+		zuordnung.append(
+			{
+				"item_code": location["item_code"],
+				"warehouse": location["warehouse"],
+				"uom": location["uom"],
+				"qty": location["qty"],
+				"stock_qty": location["stock_qty"],
+				"sales_order": location["sales_order"],
+				"sales_order_item": location["sales_order_item"],
+				"customer": location.get("_customer"),
+			}
+		)
+
+	return list(zeilen.values()), zuordnung
+
+
+def create_picklist(customer, auftraege, rechnungen, remarks, company=None):
+	"""
+	Erstellt und reicht eine Picklist ein.
+
+	Args:
+		customer: Kunde bzw. Versandziel der Picklist
+		auftraege: {sales_order: Eintrag aus get_picklist_index}
+		rechnungen: [{"sales_invoice", "customer", "customer_name"}] für Header und Pick List Rechnung
+		remarks: Bemerkung
+		company: Firma (Standard: Benutzer-Default)
+
+	Returns:
+		Name der Picklist oder None, wenn es nichts zu kommissionieren gibt
+	"""
+	locations = build_picklist_items(auftraege)
+	if not locations:
+		logger.warn(f"⚠️ Keine Picklist Items für {customer} gefunden", title="no_picklist_items")
+		return None
+
+	zuordnung = []
+	if is_zusammenfassen_aktiv():
+		anzahl = len(locations)
+		locations, zuordnung = zusammenfassen(locations)
+		logger.info(
+			"Picklist für %s: %s Positionen zu %s Zeilen zusammengefasst",
+			customer,
+			anzahl,
+			len(locations),
+			title="picklist_consolidated",
+		)
+
+	# Eine Zeile pro Rechnung
+	rechnungen = list({rechnung["sales_invoice"]: rechnung for rechnung in rechnungen}.values())
+	invoice_references = sorted(
+		f"{rechnung['sales_invoice']} ({rechnung['customer_name']})" for rechnung in rechnungen
+	)
+
+	picklist = frappe.get_doc(
+		{
+			"doctype": "Pick List",
+			"purpose": "Delivery",
+			"company": company or frappe.defaults.get_user_default("Company"),
+			"customer": customer,
+			"custom_invoice_references": "\n".join(invoice_references) or None,
+			"custom_rechnungen": [
+				{"sales_invoice": rechnung["sales_invoice"], "customer": rechnung["customer"]}
+				for rechnung in rechnungen
+			],
+			"custom_zuordnung": zuordnung,
+			# Zusammengefasste Zeilen nicht von set_item_locations neu aufteilen lassen
+			"pick_manually": 1 if zuordnung else 0,
+			"remarks": remarks,
+			"locations": [
+				{k: v for k, v in location.items() if not k.startswith("_")} for location in locations
+			],
+		}
+	)
+
+	logger.info(
+		"🎯 Erstelle Picklist für %s mit %s Items", customer, len(locations), title="picklist_creation"
+	)
+	picklist.insert()
+	logger.info("✅ Picklist erstellt: %s", picklist.name, title="picklist_created")
+
+	try:
+		picklist.submit()
+		logger.info("🎉 Picklist eingereicht: %s", picklist.name, title="picklist_submitted")
+	except Exception as e:
+		# Trotzdem weitermachen - Picklist ist erstellt
+		logger.warn(f"⚠️ Picklist konnte nicht eingereicht werden: {e!s}", title="picklist_submit_failed")
+
+	return picklist.name
+
+
+def create_picklist_for_invoice(doc):
+	"""
+	Picklist für eine einzeln eingereichte Sales Invoice (ohne Party-Buchung).
+
+	Returns:
+		Name der Picklist oder None
+	"""
+	if frappe.flags.enjo_picklist_party:
+		return None
+
+	# Prüfe ob bereits eine Picklist für diese Sales Invoice existiert (Index auf Pick List Rechnung.sales_invoice)
+	existing_picklist = get_picklist_for_invoice(doc.name)
+	if existing_picklist:
+		logger.info(
+			"❌ Picklist existiert bereits für Invoice %s: %s",
+			doc.name,
+			existing_picklist,
+			title="picklist_exists",
+		)
+		return None
+
+	sales_orders = [item.sales_order for item in doc.items if item.sales_order]
+	if not sales_orders:
+		logger.warn(f"❌ Keine Sales Orders gefunden für Invoice {doc.name}", title="no_sales_orders")
+		return None
+
+	auftraege = get_picklist_index(sales_orders, mit_rechnungen=False)
+	customer_name = doc.customer_name or doc.customer
+
+	return create_picklist(
+		doc.customer,
+		auftraege,
+		[{"sales_invoice": doc.name, "customer": doc.customer, "customer_name": customer_name}],
+		f"Automatisch erstellt für Rechnung: {doc.name}",
+		company=doc.company,
+	)
+
+
+def get_auftragszeilen(pick_list):
+	"""
+	Gepickte Mengen (Lagereinheit) einer Picklist pro Auftragsposition.
+	Zusammengefasste Zeilen werden über custom_zuordnung (Schlüssel item_code, warehouse, uom) in
+	Tabellenreihenfolge auf die Auftragspositionen verteilt (jede höchstens mit ihrer Menge); nicht zusammengefasste Zeilen zählen direkt.
+
+	Args:
+		pick_list: Name oder Dokument der Picklist
+
+	Returns:
+		list: [{"sales_order", "sales_order_item", "item_code", "warehouse", "qty", "stock_qty", "picked_qty", "zuordnung"}]
+	"""
+	if isinstance(pick_list, str):
+		pick_list = frappe.get_doc("Pick List", pick_list)
+
+	zuordnung_pro_schluessel = {}
+	for zuordnung in pick_list.get("custom_zuordnung") or []:
+		schluessel = (zuordnung.item_code, zuordnung.warehouse, zuordnung.uom)
+		zuordnung_pro_schluessel.setdefault(schluessel, []).append(zuordnung)
+
+	locations_pro_schluessel = {}
+	for location in pick_list.locations:
+		schluessel = (location.item_code, location.warehouse, location.uom)
+		locations_pro_schluessel.setdefault(schluessel, []).append(location)
+
+	auftragszeilen = []
+	for schluessel, locations in locations_pro_schluessel.items():
+		zuordnungen = zuordnung_pro_schluessel.get(schluessel)
+		# Zeilen mit Auftragsposition (auch einzelne Positionen einer zusammengefassten Picklist) zählen direkt
+		if not zuordnungen or any(location.sales_order_item for location in locations):
+			auftragszeilen.extend(
+				frappe._dict(
+					sales_order=location.sales_order,
+					sales_order_item=location.sales_order_item,
+					item_code=location.item_code,
+					warehouse=location.warehouse,
+					qty=flt(location.qty),
+					stock_qty=flt(location.stock_qty),
+					picked_qty=flt(location.picked_qty),
+					zuordnung=None,
+				)
+				for location in locations
+				if location.sales_order_item
+			)
+			continue
+
+		# ERPNext kann eine Zeile z. B. nach Chargen aufteilen - verteilt wird die Summe pro Schlüssel
+		rest = sum(flt(location.picked_qty) for location in locations)
+		for zuordnung in zuordnungen:
+			menge = min(flt(zuordnung.stock_qty), rest)
+			rest -= menge
+			auftragszeilen.append(
+				frappe._dict(
+					sales_order=zuordnung.sales_order,
+					sales_order_item=zuordnung.sales_order_item,
+					item_code=zuordnung.item_code,
+					warehouse=zuordnung.warehouse,
+					qty=flt(zuordnung.qty),
+					stock_qty=flt(zuordnung.stock_qty),
+					picked_qty=menge,
+					zuordnung=zuordnung.name,
+				)
+			)
+
+	return auftragszeilen
+
+
+@frappe.whitelist()
+def create_delivery_notes(pick_list):
+	"""
+	Erstellt für eine eingereichte Picklist einen Lieferschein-Entwurf pro Auftrag mit den gepickten
+	Mengen je Auftragsposition - auch für zusammengefasste Picklists, deren Zeilen keinem Auftrag zugeordnet sind.
+
+	Returns:
+		list: Namen der erstellten Lieferscheine
+	"""
+	from erpnext.selling.doctype.sales_order.sales_order import make_delivery_note
+
+	frappe.has_permission("Delivery Note", "create", throw=True)
+	pick_list = frappe.get_doc("Pick List", pick_list)
+	if pick_list.docstatus != 1:
+		frappe.throw(_("Die Picklist {0} ist nicht eingereicht").format(pick_list.name))
+
+	mengen_pro_auftrag = {}
+	for zeile in get_auftragszeilen(pick_list):
+		if zeile.picked_qty > 0:
+			mengen = mengen_pro_auftrag.setdefault(zeile.sales_order, {})
+			mengen[zeile.sales_order_item] = mengen.get(zeile.sales_order_item, 0) + zeile.picked_qty
+
+	lieferscheine = []
+	for sales_order, mengen in mengen_pro_auftrag.items():
+		delivery_note = make_delivery_note(sales_order)
+		delivery_note.items = [item for item in delivery_note.items if item.so_detail in mengen]
+		for item in delivery_note.items:
+			# Gepickte Mengen sind in Lagereinheit
+			item.qty = flt(mengen[item.so_detail]) / (flt(item.conversion_factor) or 1)
+			item.against_pick_list = pick_list.name
+		if not delivery_note.items:
+			continue
+		delivery_note.insert()
+		lieferscheine.append(delivery_note.name)
+
+	logger.info(
+		"Lieferscheine aus Picklist %s: %s", pick_list.name, lieferscheine, title="picklist_delivery_notes"
+	)
+	return lieferscheine
+
+
+def update_auftrags_picked_qty(doc, method=None):
+	"""
+	Pick List on_submit/on_cancel: gepickte Mengen der Auftragspositionen inkl. zusammengefasster Zeilen.
+
+	ERPNext summiert picked_qty der Sales Order Items nur über Pick List Items mit sales_order_item - bei
+	zusammengefassten Zeilen fehlt die Verknüpfung. Der Hook schreibt die verteilten Mengen an die
+	Zuordnungszeilen und rechnet picked_qty für alle betroffenen Auftragspositionen aus beiden Tabellen neu
+	(auch nach nicht zusammengefassten Picklists, deren ERPNext-Summe die Zuordnungen nicht kennt).
+	"""
+	if doc.docstatus == 1:
+		for zeile in get_auftragszeilen(doc):
+			if zeile.zuordnung:
+				frappe.db.set_value(
+					"Pick List Zuordnung",
+					zeile.zuordnung,
+					"picked_qty",
+					zeile.picked_qty,
+					update_modified=False,
+				)
+
+	auftragspositionen = {
+		row.sales_order_item: row.sales_order
+		for row in [*doc.locations, *(doc.get("custom_zuordnung") or [])]
+		if row.sales_order_item
+	}
+	if not auftragspositionen:
+		return
+
+	zusammengefasst = dict(
+		frappe.db.sql(
+			"""
+		SELECT plz.sales_order_item, SUM(plz.picked_qty)
+		FROM `tabPick List Zuordnung` plz
+		INNER JOIN `tabPick List` pl ON pl.name = plz.parent
+		WHERE plz.sales_order_item IN %(items)s AND plz.parenttype = 'Pick List' AND pl.docstatus = 1
+		GROUP BY plz.sales_order_item
+		""",
+			{"items": tuple(auftragspositionen)},
+		)
+	)
+	# Ohne Zuordnungen ist die Summe von ERPNext vollständig
+	if not zusammengefasst and not doc.get("custom_zuordnung"):
+		return
+
+	direkt = dict(
+		frappe.db.sql(
+			"""
+		SELECT pli.sales_order_item, SUM(pli.picked_qty)
+		FROM `tabPick List Item` pli
+		INNER JOIN `tabPick List` pl ON pl.name = pli.parent
+		WHERE pli.sales_order_item IN %(items)s AND pli.parenttype = 'Pick List' AND pl.docstatus = 1
+		GROUP BY pli.sales_order_item
+		""",
+			{"items": tuple(auftragspositionen)},
+		)
+	)
+
+	for sales_order_item in auftragspositionen:
+		frappe.db.set_value(
+			"Sales Order Item",
+			sales_order_item,
+			"picked_qty",
+			flt(direkt.get(sales_order_item)) + flt(zusammengefasst.get(sales_order_item)),
+			update_modified=False,
+		)
+
+	for sales_order in set(auftragspositionen.values()):
+		frappe.get_doc("Sales Order", sales_order, for_update=True).update_picking_status()
+
+	logger.info(
+		"Gepickte Mengen für %s Auftragspositionen aus Picklist %s aktualisiert",
+		len(auftragspositionen),
+		doc.name,
+		title="picklist_picked_qty",
+	)
@@ -0,0 +1,55 @@
+# ENJO Punkte Report-Cache
+# Ergebnisse der Punkte-Übersicht werden im Redis-Cache unter (Ledger-Version, Filter) abgelegt.
+# Die Ledger-Version ist der jüngste modified-Zeitstempel von ENJO Punkte Transaktion plus eine Generation;
+# sie wird selbst gecacht und von Vergabe, Storno, Ledger-Abgleich sowie den Neuaufbauten von Saldo und
+# Perioden nach dem Commit verworfen. Die Generation wechselt dabei mit - so landen auch Ergebnisse zu neu
+# aufgebauten Rollups (bei unverändertem Ledger) unter einem neuen Schlüssel.
+
+import hashlib
+import json
+
+import frappe
+
+# Lebensdauer eines Report-Ergebnisses (veraltete Versionen laufen damit von selbst aus)
+RESULT_CACHE_SECONDS = 24 * 60 * 60
+
+LEDGER_VERSION_KEY = "enjo_punkte_ledger_version"
+GENERATION_KEY = "enjo_punkte_ledger_generation"
+
+
+def get_ledger_version():
+	"""Jüngster modified-Zeitstempel des Ledgers (nutzt den Standard-Index auf modified) und Generation"""
+	cache = frappe.cache()
+	version = cache.get_value(LEDGER_VERSION_KEY)
+	if version is None:
+		modified = frappe.db.sql("SELECT MAX(modified) FROM `tabENJO Punkte Transaktion`")[0][0] or ""
+		version = f"{modified}::{cache.get_value(GENERATION_KEY) or ''}"
+		cache.set_value(LEDGER_VERSION_KEY, version)
+	return version
+
+
+def invalidate_ledger_version():
+	"""Verwirft die Ledger-Version erst nach dem Commit, damit kein Ergebnis zum alten Stand neu gecacht wird"""
+	frappe.db.after_commit.add(_verwerfen)
+
+
+def _verwerfen():
+	cache = frappe.cache()
+	cache.set_value(GENERATION_KEY, frappe.generate_hash(length=8))
+	cache.delete_value(LEDGER_VERSION_KEY)
+
+
+def get_result_key(filters, version=None):
+	inhalt = json.dumps({k: v for k, v in (filters or {}).items() if v}, sort_keys=True, default=str)
+	filter_hash = hashlib.sha256(inhalt.encode()).hexdigest()[:16]
+	return (
+		f"enjo_punkte_uebersicht::{version if version is not None else get_ledger_version()}::{filter_hash}"
+	)
+
+
+def get_result(filters):
+	return frappe.cache().get_value(get_result_key(filters))
+
+
+def set_result(filters, result, version=None):
+	frappe.cache().set_value(get_result_key(filters, version), result, expires_in_sec=RESULT_CACHE_SECONDS)
@@ -0,0 +1,185 @@
+# ENJO Punkte Export
+# Streamt das Punkte-Ledger (ENJO Punkte Transaktion) bzw. die Punkte-Übersicht als CSV oder XLSX
+# in einen privaten Dateianhang. Der Export läuft als Hintergrund-Job; die Zeilen werden über einen
+# ungepufferten Server-Cursor gelesen und sofort in die Datei geschrieben, damit der Speicherbedarf
+# unabhängig vom Zeitraum konstant bleibt. Das Ergebnis wird per Realtime (enjo_punkte_export_done)
+# an den anfordernden Benutzer gemeldet.
+
+import csv
+import os
+
+import frappe
+from frappe import _
+from frappe.utils import cint, now_datetime
+
+from enjo_party.enjo_party.utils import logger
+
+FORMATE = ("CSV", "XLSX")
+
+TRANSAKTION_SPALTEN = [
+	("name", "ID"),
+	("transaction_date", "Datum"),
+	("sales_partner", "Vertriebspartnerin"),
+	("partner_name", "Name"),
+	("sales_invoice", "Rechnung"),
+	("item_code", "Artikel"),
+	("item_name", "Artikelname"),
+	("qty", "Menge"),
+	("punkte_pro_item", "Punkte pro Artikel"),
+	("punkte_gesamt", "Punkte Gesamt"),
+	("is_cancelled", "Storniert"),
+	("transaktionsart", "Art"),
+	("verfallen", "Verfallen"),
+]
+
+
+@frappe.whitelist()
+def export_punkte(
+	quelle="Transaktionen",
+	format="CSV",
+	from_date=None,
+	to_date=None,
+	sales_partner=None,
+	include_cancelled=0,
+):
+	"""
+	Reiht einen Export als Hintergrund-Job ein.
+
+	Args:
+		quelle: "Transaktionen" (Ledger-Zeilen) oder "Übersicht" (Punkte-Übersicht pro Partnerin)
+		format: "CSV" oder "XLSX"
+
+	Returns:
+		dict: {"job_id": ...}
+	"""
+	if format not in FORMATE:
+		frappe.throw(_("Unbekanntes Exportformat: {0}").format(format))
+
+	if quelle == "Übersicht":
+		if not frappe.has_permission("Report", "read", "ENJO Punkte Uebersicht"):
+			frappe.throw(_("Keine Berechtigung für die ENJO Punkte Übersicht"), frappe.PermissionError)
+	else:
+		frappe.has_permission("ENJO Punkte Transaktion", "export", throw=True)
+
+	job_id = f"enjo_punkte_export::{frappe.session.user}::{frappe.generate_hash(length=8)}"
+	frappe.enqueue(
+		"enjo_party.enjo_party.utils.punkte_export.run_punkte_export",
+		queue="long",
+		timeout=3600,
+		job_id=job_id,
+		quelle=quelle,
+		format=format,
+		filters={
+			"from_date": from_date,
+			"to_date": to_date,
+			"sales_partner": sales_partner,
+			"include_cancelled": cint(include_cancelled),
+		},
+	)
+	return {"job_id": job_id}
+
+
+def run_punkte_export(quelle, format, filters):
+	"""Hintergrund-Job (läuft als anfordernder Benutzer): schreibt die Exportdatei und legt sie als privaten File-Eintrag an"""
+	user = frappe.session.user
+	dateiname = f"enjo_punkte_{'uebersicht' if quelle == 'Übersicht' else 'transaktionen'}_{now_datetime():%Y%m%d_%H%M%S}.{format.lower()}"
+	pfad = frappe.get_site_path("private", "files", dateiname)
+
+	try:
+		if quelle == "Übersicht":
+			spalten, zeilen = get_uebersicht(filters)
+			anzahl = schreiben(pfad, format, spalten, zeilen)
+		else:
+			# Während der ungepufferte Cursor offen ist, darf auf derselben Verbindung keine andere Abfrage laufen
+			with frappe.db.unbuffered_cursor():
+				anzahl = schreiben(pfad, format, TRANSAKTION_SPALTEN, iter_transaktionen(filters))
+
+		datei = frappe.get_doc(
+			{
+				"doctype": "File",
+				"file_name": dateiname,
+				"file_url": f"/private/files/{dateiname}",
+				"is_private": 1,
+			}
+		)
+		datei.insert(ignore_permissions=True)
+		frappe.db.commit()
+
+		logger.info("ENJO Punkte Export %s: %s Zeilen", dateiname, anzahl, title="enjo_points_export")
+		frappe.publish_realtime(
+			"enjo_punkte_export_done",
+			{"file_url": datei.file_url, "file_name": dateiname, "rows": anzahl},
+			user=user,
+		)
+	except Exception as e:
+		if os.path.exists(pfad):
+			os.remove(pfad)
+		logger.error(f"ENJO Punkte Export fehlgeschlagen: {e!s}", title="enjo_points_export")
+		frappe.publish_realtime("enjo_punkte_export_error", {"error": str(e)}, user=user)
+		raise
+
+
+def iter_transaktionen(filters):
+	"""Ledger-Zeilen als Iterator über den (ungepufferten) Cursor"""
+	conditions = ""
+	if not filters.get("include_cancelled"):
+		conditions += " AND t.is_cancelled = 0"
+	if filters.get("sales_partner"):
+		conditions += " AND t.sales_partner = %(sales_partner)s"
+	if filters.get("from_date"):
+		conditions += " AND t.transaction_date >= %(from_date)s"
+	if filters.get("to_date"):
+		conditions += " AND t.transaction_date <= %(to_date)s"
+
+	felder = ", ".join(
+		"sp.partner_name" if feld == "partner_name" else f"t.{feld}" for feld, _label in TRANSAKTION_SPALTEN
+	)
+	return frappe.db.sql(
+		f"""
+		SELECT {felder}
+		FROM `tabENJO Punkte Transaktion` t
+		LEFT JOIN `tabSales Partner` sp ON t.sales_partner = sp.name
+		WHERE 1=1 {conditions}
+		ORDER BY t.transaction_date, t.name
+	""",
+		filters,
+		as_iterator=True,
+	)
+
+
+def get_uebersicht(filters):
+	"""Punkte-Übersicht über den Report selbst - eine Zeile pro Partnerin, daher ohne Cursor"""
+	from enjo_party.enjo_party.report.enjo_punkte_uebersicht.enjo_punkte_uebersicht import execute
+
+	columns, data = execute(
+		frappe._dict({k: v for k, v in filters.items() if k != "include_cancelled" and v})
+	)
+	spalten = [(column["fieldname"], column["label"]) for column in columns]
+	return spalten, ([zeile.get(feld) for feld, _label in spalten] for zeile in data)
+
+
+def schreiben(pfad, format, spalten, zeilen):
+	"""Schreibt Kopfzeile und Zeilen fortlaufend in die Datei. Gibt die Anzahl der Datenzeilen zurück."""
+	anzahl = 0
+	kopf = [label for _feld, label in spalten]
+
+	if format == "XLSX":
+		from openpyxl import Workbook
+
+		# write_only: Zeilen werden direkt serialisiert statt im Arbeitsblatt gehalten
+		workbook = Workbook(write_only=True)
+		sheet = workbook.create_sheet("ENJO Punkte")
+		sheet.append(kopf)
+		for zeile in zeilen:
+			sheet.append(list(zeile))
+			anzahl += 1
+		workbook.save(pfad)
+	else:
+		with open(pfad, "w", newline="", encoding="utf-8-sig") as datei:
+			writer = csv.writer(datei, delimiter=";")
+			writer.writerow(kopf)
+			for zeile in zeilen:
+				writer.writerow(zeile)
+				anzahl += 1
+
+	return anzahl
@@ -0,0 +1,280 @@
+# ENJO Punkte Ledger - Neuaufbau aus gebuchten Rechnungen
+# Rechnet die Punkte aller gebuchten Sales Invoices mit Vertriebspartnerin neu (z.B. nach einer
+# fehlgeschlagenen Vergabe oder geänderten custom_punkte) und gleicht das Ledger zeilenweise ab:
+# fehlende Transaktionen werden eingefügt, abweichende storniert. Unveränderte bleiben unberührt.
+#
+#   bench --site <site> execute enjo_party.enjo_party.utils.punkte_ledger.rebuild_punkte_ledger
+#   bench --site <site> execute enjo_party.enjo_party.utils.punkte_ledger.enqueue_punkte_ledger_rebuild
+#
+# Die Rechnungen werden per Keyset (name > Cursor) in Blöcken gelesen, nach jedem Block wird
+# committet und der Cursor im Cache abgelegt. Ein abgebrochener Lauf setzt beim nächsten Aufruf
+# dort fort; mit resume=False bzw. after="" beginnt er von vorn. Saldo und Monatsperioden der
+# betroffenen Partnerinnen werden einmal nach dem letzten Block neu aufgebaut (die Partnerinnen
+# liegen bis dahin neben dem Cursor im Cache).
+
+from collections import defaultdict
+
+import frappe
+from frappe.utils import cint, flt, getdate, now
+
+from enjo_party.enjo_party.server_scripts.enjo_punkte_vergabe import (
+	build_punkte_zeilen,
+	get_punkte_pro_artikel,
+	insert_punkte_transaktionen,
+)
+from enjo_party.enjo_party.utils import logger, punkte_cache, punkte_periode, punkte_rangliste, punkte_saldo
+
+# Rechnungen pro Block
+REBUILD_CHUNK_SIZE = 500
+
+
+def get_cursor_key(sales_partner=None):
+	return f"enjo_punkte_ledger_rebuild_cursor::{sales_partner or 'alle'}"
+
+
+def get_betroffene_key(sales_partner=None):
+	return f"enjo_punkte_ledger_rebuild_betroffene::{sales_partner or 'alle'}"
+
+
+def rebuild_punkte_ledger(chunk_size=REBUILD_CHUNK_SIZE, sales_partner=None, resume=True, after=None):
+	"""
+	Gleicht das Ledger blockweise mit den gebuchten Rechnungen ab.
+
+	Args:
+		chunk_size: Rechnungen pro Block (ein Commit pro Block)
+		sales_partner: nur Rechnungen dieser Partnerin (für den Fan-out auf mehrere Worker)
+		resume: beim gespeicherten Cursor fortsetzen
+		after: expliziter Cursor (Rechnungsname), überschreibt den gespeicherten
+
+	Returns:
+		dict: Anzahl geprüfter Rechnungen, eingefügter und stornierter Transaktionen
+	"""
+	chunk_size = max(cint(chunk_size), 1)
+	cursor_key = get_cursor_key(sales_partner)
+	betroffene_key = get_betroffene_key(sales_partner)
+
+	betroffene = set()
+	if after is not None:
+		cursor = after
+	elif cint(resume):
+		cursor = frappe.cache().get_value(cursor_key) or ""
+		if cursor:
+			betroffene.update(frappe.cache().get_value(betroffene_key) or [])
+	else:
+		cursor = ""
+
+	if cursor:
+		logger.info(
+			"ENJO Punkte Ledger: setze nach %s fort (%s)",
+			cursor,
+			sales_partner or "alle",
+			title="enjo_points_rebuild",
+		)
+
+	ergebnis = {"rechnungen": 0, "eingefuegt": 0, "storniert": 0}
+	punkte_pro_artikel = {}
+
+	while True:
+		rechnungen = get_rechnungen(cursor, chunk_size, sales_partner)
+		if not rechnungen:
+			break
+
+		eingefuegt, storniert = abgleichen(rechnungen, punkte_pro_artikel, betroffene)
+		ergebnis["rechnungen"] += len(rechnungen)
+		ergebnis["eingefuegt"] += eingefuegt
+		ergebnis["storniert"] += storniert
+
+		cursor = rechnungen[-1].name
+		frappe.db.commit()
+		frappe.cache().set_value(cursor_key, cursor)
+		frappe.cache().set_value(betroffene_key, sorted(betroffene))
+
+	# Saldo und Monatsrollups einmal für alle betroffenen Partnerinnen aus dem Ledger nachziehen
+	if betroffene:
+		punkte_saldo.rebuild_punkte_saldo(sorted(betroffene))
+		punkte_periode.rebuild_punkte_perioden(sorted(betroffene))
+		frappe.db.commit()
+
+	frappe.cache().delete_value(cursor_key)
+	frappe.cache().delete_value(betroffene_key)
+	logger.info(
+		"ENJO Punkte Ledger abgeglichen (%s): %s Rechnungen, %s eingefügt, %s storniert",
+		sales_partner or "alle",
+		ergebnis["rechnungen"],
+		ergebnis["eingefuegt"],
+		ergebnis["storniert"],
+		title="enjo_points_rebuild",
+	)
+	return ergebnis
+
+
+def enqueue_punkte_ledger_rebuild(chunk_size=REBUILD_CHUNK_SIZE, resume=True):
+	"""
+	Verteilt den Neuaufbau auf die "long"-Queue: ein Job pro Vertriebspartnerin mit eigenem Cursor.
+	Bereits laufende Jobs einer Partnerin werden nicht doppelt eingereiht.
+	"""
+	sales_partners = frappe.db.sql_list("""
+		SELECT DISTINCT sales_partner
+		FROM `tabSales Invoice`
+		WHERE docstatus = 1 AND IFNULL(sales_partner, '') != ''
+	""")
+
+	for sales_partner in sales_partners:
+		frappe.enqueue(
+			"enjo_party.enjo_party.utils.punkte_ledger.rebuild_punkte_ledger",
+			queue="long",
+			timeout=3600,
+			job_id=f"enjo_punkte_ledger_rebuild::{sales_partner}",
+			deduplicate=True,
+			chunk_size=chunk_size,
+			sales_partner=sales_partner,
+			resume=resume,
+		)
+
+	logger.info("ENJO Punkte Ledger: %s Jobs eingereiht", len(sales_partners), title="enjo_points_rebuild")
+	return len(sales_partners)
+
+
+def get_rechnungen(cursor, chunk_size, sales_partner=None):
+	"""Nächster Block gebuchter Rechnungen mit Vertriebspartnerin nach dem Cursor (Keyset über name)"""
+	conditions = (
+		"AND sales_partner = %(sales_partner)s" if sales_partner else "AND IFNULL(sales_partner, '') != ''"
+	)
+	return frappe.db.sql(
+		f"""
+		SELECT name, sales_partner, posting_date
+		FROM `tabSales Invoice`
+		WHERE docstatus = 1 AND name > %(cursor)s {conditions}
+		ORDER BY name
+		LIMIT %(limit)s
+	""",
+		{"cursor": cursor, "limit": chunk_size, "sales_partner": sales_partner},
+		as_dict=True,
+	)
+
+
+def abgleichen(rechnungen, punkte_pro_artikel, betroffene):
+	"""
+	Gleicht einen Block Rechnungen mit den offenen Ledger-Zeilen ab.
+	Partnerinnen mit geänderten Zeilen kommen in betroffene - Saldo und Perioden baut der Aufrufer
+	danach einmal neu auf.
+
+	Returns:
+		tuple: (eingefügte, stornierte) Transaktionen
+	"""
+	namen = [rechnung.name for rechnung in rechnungen]
+
+	positionen = defaultdict(list)
+	for item in frappe.get_all(
+		"Sales Invoice Item",
+		filters={"parent": ["in", namen], "parenttype": "Sales Invoice"},
+		fields=["name", "parent", "item_code", "item_name", "qty"],
+		order_by="parent, idx",
+	):
+		positionen[item.parent].append(item)
+
+	# custom_punkte nur für Artikel nachladen, die in früheren Blöcken noch nicht vorkamen
+	neue_artikel = {
+		item.item_code for items in positionen.values() for item in items if item.item_code
+	} - set(punkte_pro_artikel)
+	if neue_artikel:
+		geladen = get_punkte_pro_artikel(neue_artikel)
+		punkte_pro_artikel.update({item_code: geladen.get(item_code, 0) for item_code in neue_artikel})
+
+	# Offene Vergaben nach Vergleichsschlüssel gruppiert (Verfall-Gegenbuchungen hängen an ihrer Vergabe)
+	vorhanden = defaultdict(list)
+	for zeile in frappe.get_all(
+		"ENJO Punkte Transaktion",
+		filters={"sales_invoice": ["in", namen], "is_cancelled": 0, "transaktionsart": ["!=", "Verfall"]},
+		fields=[
+			"name",
+			"sales_invoice",
+			"sales_partner",
+			"item_code",
+			"qty",
+			"punkte_pro_item",
+			"punkte_gesamt",
+			"transaction_date",
+		],
+	):
+		vorhanden[get_vergleichsschluessel(zeile)].append(zeile)
+
+	neu = []
+	for rechnung in rechnungen:
+		for zeile in build_punkte_zeilen(
+			rechnung.name,
+			rechnung.sales_partner,
+			rechnung.posting_date,
+			positionen[rechnung.name],
+			punkte_pro_artikel,
+		):
+			treffer = vorhanden.get(get_vergleichsschluessel(zeile))
+			if treffer:
+				treffer.pop()
+			else:
+				neu.append(zeile)
+
+	# Was übrig bleibt, passt nicht mehr zur Rechnung
+	ueberzaehlig = [zeile for zeilen in vorhanden.values() for zeile in zeilen]
+
+	if not neu and not ueberzaehlig:
+		return 0, 0
+
+	if ueberzaehlig:
+		frappe.db.sql(
+			"""
+			UPDATE `tabENJO Punkte Transaktion`
+			SET is_cancelled = 1, modified = %(modified)s, modified_by = %(modified_by)s
+			WHERE name IN %(names)s
+			""",
+			{
+				"modified": now(),
+				"modified_by": frappe.session.user,
+				"names": tuple(zeile.name for zeile in ueberzaehlig),
+			},
+		)
+		# Verfall-Gegenbuchungen der stornierten Vergaben ebenfalls stornieren
+		frappe.db.sql(
+			"""
+			UPDATE `tabENJO Punkte Transaktion`
+			SET is_cancelled = 1, modified = %(modified)s, modified_by = %(modified_by)s
+			WHERE verfall_von IN %(names)s AND is_cancelled = 0
+			""",
+			{
+				"modified": now(),
+				"modified_by": frappe.session.user,
+				"names": tuple(zeile.name for zeile in ueberzaehlig),
+			},
+		)
+
+	if neu:
+		insert_punkte_transaktionen(neu)
+
+	# Betroffene Ranglisten-Perioden beim nächsten Lesen neu aufbauen
+	betroffene.update(zeile["sales_partner"] for zeile in neu + ueberzaehlig)
+	perioden = {punkte_rangliste.normalize_periode(zeile["transaction_date"]) for zeile in neu + ueberzaehlig}
+	frappe.db.after_commit.add(lambda: punkte_rangliste.invalidate(perioden | {punkte_rangliste.GESAMT}))
+	punkte_cache.invalidate_ledger_version()
+
+	logger.info(
+		"ENJO Punkte Ledger: %s eingefügt, %s storniert in %s … %s",
+		len(neu),
+		len(ueberzaehlig),
+		namen[0],
+		namen[-1],
+		title="enjo_points_rebuild",
+	)
+	return len(neu), len(ueberzaehlig)
+
+
+def get_vergleichsschluessel(zeile):
+	"""Zwei Ledger-Zeilen sind gleich, wenn Partnerin, Rechnung, Artikel, Menge, Punkte und Datum übereinstimmen"""
+	return (
+		zeile["sales_partner"],
+		zeile["sales_invoice"],
+		zeile["item_code"],
+		flt(zeile["qty"], 6),
+		cint(zeile["punkte_pro_item"]),
+		cint(zeile["punkte_gesamt"]),
+		str(getdate(zeile["transaction_date"])),
+	)
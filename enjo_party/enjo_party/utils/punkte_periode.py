@@ -0,0 +1,178 @@
+# ENJO Punkte Periode
+# Monatliche Rollups pro Vertriebspartnerin (ENJO Punkte Periode), damit Monats- und
+# Quartalsauswertungen nicht das komplette Ledger (ENJO Punkte Transaktion) scannen.
+#
+# - add_transaktionen:      bei Rechnungs-Submit inkrementell erhöhen
+# - remove_transaktionen:   bei Rechnungs-Storno inkrementell verringern
+# - rebuild_punkte_perioden: Neuaufbau aus dem Ledger in Partnerinnen-Blöcken mit Commit pro Block, z.B.
+#   bench --site <site> execute enjo_party.enjo_party.utils.punkte_periode.rebuild_punkte_perioden
+
+import frappe
+from frappe.utils import cint, getdate, now
+
+from enjo_party.enjo_party.utils import logger, punkte_cache
+
+# Anzahl Partnerinnen pro Block beim Neuaufbau
+REBUILD_CHUNK_SIZE = 50
+
+
+def get_periode(datum):
+	"""Erster Tag des Monats als Periodenschlüssel"""
+	return getdate(datum).replace(day=1)
+
+
+def add_transaktionen(zeilen):
+	"""
+	Addiert neu geschriebene Ledger-Zeilen auf die Monatsperiode ihrer Vertriebspartnerin.
+
+	Args:
+		zeilen: Liste von Dicts mit sales_partner, punkte_gesamt, transaction_date
+	"""
+	pro_periode = {}
+	for zeile in zeilen:
+		schluessel = (zeile["sales_partner"], get_periode(zeile["transaction_date"]))
+		werte = pro_periode.setdefault(schluessel, {"punkte": 0, "anzahl": 0})
+		werte["punkte"] += cint(zeile["punkte_gesamt"])
+		werte["anzahl"] += 1
+
+	_upsert(
+		[
+			{"sales_partner": sales_partner, "periode": periode, **werte}
+			for (sales_partner, periode), werte in pro_periode.items()
+		]
+	)
+
+
+def remove_transaktionen(stornierte):
+	"""
+	Zieht stornierte Ledger-Zeilen von ihrer Monatsperiode ab. Verfall-Gegenbuchungen zählen nicht
+	zu den Perioden, daher werden nur die Punkte aus Vergaben (punkte_vergabe) abgezogen.
+
+	Args:
+		stornierte: Liste von Dicts mit sales_partner, periode, punkte_vergabe, anzahl (pro Partnerin und Monat aggregiert)
+	"""
+	_upsert(
+		[
+			{
+				"sales_partner": zeile["sales_partner"],
+				"periode": zeile["periode"],
+				"punkte": -cint(zeile["punkte_vergabe"]),
+				"anzahl": -cint(zeile["anzahl"]),
+			}
+			for zeile in stornierte
+			if cint(zeile["punkte_vergabe"]) or cint(zeile["anzahl"])
+		]
+	)
+
+
+def _upsert(perioden):
+	"""Ein INSERT ... ON DUPLICATE KEY UPDATE pro (Partnerin, Monat) über den Unique-Key aus on_doctype_update"""
+	zeitpunkt = now()
+	for periode in perioden:
+		frappe.db.sql(
+			"""
+			INSERT INTO `tabENJO Punkte Periode` (
+				name, creation, modified, modified_by, owner, docstatus, idx,
+				sales_partner, periode, total_points, transaction_count
+			)
+			VALUES (
+				%(name)s, %(zeitpunkt)s, %(zeitpunkt)s, %(user)s, %(user)s, 0, 0,
+				%(sales_partner)s, %(periode)s, %(punkte)s, %(anzahl)s
+			)
+			ON DUPLICATE KEY UPDATE
+				total_points = total_points + VALUES(total_points),
+				transaction_count = transaction_count + VALUES(transaction_count),
+				modified = VALUES(modified),
+				modified_by = VALUES(modified_by)
+			""",
+			{
+				"name": frappe.generate_hash(length=10),
+				"zeitpunkt": zeitpunkt,
+				"user": frappe.session.user,
+				**periode,
+			},
+		)
+
+
+def rebuild_punkte_perioden(sales_partners=None, chunk_size=REBUILD_CHUNK_SIZE):
+	"""
+	Baut die Monatsperioden aus dem Ledger neu auf - alle oder nur die angegebenen Partnerinnen.
+	Verarbeitet die Partnerinnen in Blöcken und committet nach jedem Block, damit große Ledger
+	keine lange Transaktion halten.
+	"""
+	if not sales_partners:
+		sales_partners = frappe.db.sql_list(
+			"SELECT DISTINCT sales_partner FROM `tabENJO Punkte Transaktion` ORDER BY sales_partner"
+		)
+		# Partnerinnen ohne Transaktionen mehr (z.B. nach Löschungen) ebenfalls entfernen
+		if sales_partners:
+			frappe.db.sql(
+				"DELETE FROM `tabENJO Punkte Periode` WHERE sales_partner NOT IN %(sales_partners)s",
+				{"sales_partners": tuple(sales_partners)},
+			)
+		else:
+			frappe.db.sql("DELETE FROM `tabENJO Punkte Periode`")
+
+	sales_partners = list(sales_partners)
+	chunk_size = max(cint(chunk_size), 1)
+	punkte_cache.invalidate_ledger_version()
+	for start in range(0, len(sales_partners), chunk_size):
+		block = tuple(sales_partners[start : start + chunk_size])
+		_rebuild_block(block)
+		frappe.db.commit()
+
+	logger.info(
+		"ENJO Punkte Perioden neu aufgebaut: %s Partnerinnen",
+		len(sales_partners),
+		title="enjo_points_periode",
+	)
+	return len(sales_partners)
+
+
+def _rebuild_block(sales_partners):
+	frappe.db.sql(
+		"DELETE FROM `tabENJO Punkte Periode` WHERE sales_partner IN %(sales_partners)s",
+		{"sales_partners": sales_partners},
+	)
+
+	zeitpunkt = now()
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabENJO Punkte Periode` (
+			name, creation, modified, modified_by, owner, docstatus, idx,
+			sales_partner, periode, total_points, transaction_count
+		)
+		SELECT
+			LEFT(MD5(CONCAT(t.sales_partner, '|', DATE_FORMAT(t.transaction_date, '%%Y-%%m-01'))), 10),
+			%(zeitpunkt)s, %(zeitpunkt)s, %(user)s, %(user)s, 0, 0,
+			t.sales_partner,
+			DATE_FORMAT(t.transaction_date, '%%Y-%%m-01'),
+			SUM(t.punkte_gesamt),
+			COUNT(*)
+		FROM `tabENJO Punkte Transaktion` t
+		WHERE t.is_cancelled = 0 AND t.transaktionsart != 'Verfall' AND t.sales_partner IN %(sales_partners)s
+		GROUP BY t.sales_partner, DATE_FORMAT(t.transaction_date, '%%Y-%%m-01')
+		""",
+		{"zeitpunkt": zeitpunkt, "user": frappe.session.user, "sales_partners": sales_partners},
+	)
+
+
+def get_perioden(from_date=None, to_date=None, sales_partner=None):
+	"""
+	Liest die Monatsperioden (für die Pivot-Ansicht der Punkte-Übersicht).
+	Datumsgrenzen werden auf ganze Monate erweitert.
+	"""
+	filters = []
+	if from_date:
+		filters.append(["periode", ">=", get_periode(from_date)])
+	if to_date:
+		filters.append(["periode", "<=", get_periode(to_date)])
+	if sales_partner:
+		filters.append(["sales_partner", "=", sales_partner])
+
+	return frappe.get_all(
+		"ENJO Punkte Periode",
+		filters=filters,
+		fields=["sales_partner", "periode", "total_points", "transaction_count"],
+		order_by="periode asc",
+	)
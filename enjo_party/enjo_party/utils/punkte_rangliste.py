@@ -0,0 +1,205 @@
+# ENJO Punkte Rangliste
+# Rangliste der Vertriebspartnerinnen als Redis Sorted Set pro Monat (plus Gesamtwertung "alle"),
+# damit Dashboards "Top N" und "Platz von X" in O(log n) abfragen statt die Punkte-Übersicht zu rechnen.
+#
+# - add_transaktionen / remove_transaktionen: von Vergabe und Storno nach dem Commit aufgerufen
+# - rebuild_rangliste: Neuaufbau einer Periode aus dem Ledger; passiert automatisch beim ersten Lesen,
+#   wenn die Periode (z.B. nach einem Redis-Neustart) nicht geladen ist
+# - invalidate: verwirft geladene Perioden, z.B. nach einem Ledger-Abgleich (utils/punkte_ledger)
+
+import frappe
+from frappe import _
+from frappe.utils import cint, getdate, today
+
+GESAMT = "alle"
+
+
+def normalize_periode(periode=None):
+	"""Periodenschlüssel "YYYY-MM" (Standard: aktueller Monat) bzw. "alle" für die Gesamtwertung"""
+	if periode == GESAMT:
+		return GESAMT
+	datum = getdate(f"{periode}-01" if periode and len(str(periode)) == 7 else (periode or today()))
+	return f"{datum.year}-{datum.month:02d}"
+
+
+def get_key(periode):
+	return frappe.cache().make_key(f"enjo_punkte_rangliste::{periode}")
+
+
+def get_geladen_key(periode):
+	return frappe.cache().make_key(f"enjo_punkte_rangliste_geladen::{periode}")
+
+
+def add_transaktionen(zeilen):
+	"""
+	Erhöht die Punkte der Partnerinnen im Monat der Transaktion und in der Gesamtwertung.
+	Wird erst nach dem Commit ausgeführt, damit ein Rollback die Rangliste nicht verfälscht.
+	"""
+	aenderungen = {}
+	for zeile in zeilen:
+		for periode in (normalize_periode(zeile["transaction_date"]), GESAMT):
+			schluessel = (periode, zeile["sales_partner"])
+			aenderungen[schluessel] = aenderungen.get(schluessel, 0) + cint(zeile["punkte_gesamt"])
+
+	frappe.db.after_commit.add(lambda: _anwenden(aenderungen))
+
+
+def remove_transaktionen(stornierte):
+	"""
+	Verringert die Punkte stornierter bzw. verfallener Transaktionen (pro Partnerin und Monat aggregiert).
+	Monatswertungen zählen nur Vergaben (punkte_vergabe), die Gesamtwertung alle Punkte inkl. Verfall.
+	"""
+	aenderungen = {}
+	for zeile in stornierte:
+		for periode, punkte in (
+			(normalize_periode(zeile["periode"]), zeile["punkte_vergabe"]),
+			(GESAMT, zeile["punkte"]),
+		):
+			schluessel = (periode, zeile["sales_partner"])
+			aenderungen[schluessel] = aenderungen.get(schluessel, 0) - cint(punkte)
+
+	frappe.db.after_commit.add(lambda: _anwenden(aenderungen))
+
+
+def _anwenden(aenderungen):
+	"""
+	Schreibt die Änderungen in einer Pipeline.
+	Nicht geladene Perioden werden übersprungen - sie werden beim nächsten Lesen vollständig aus dem Ledger gebaut.
+	"""
+	cache = frappe.cache()
+	geladen = {periode for periode, _partner in aenderungen if cache.exists(get_geladen_key(periode))}
+
+	pipeline = cache.pipeline()
+	for (periode, sales_partner), punkte in aenderungen.items():
+		if periode in geladen and punkte:
+			pipeline.zincrby(get_key(periode), punkte, sales_partner)
+	# Partnerinnen, die nach Stornos keine Punkte mehr haben, fallen aus der Wertung
+	for periode in geladen:
+		pipeline.zremrangebyscore(get_key(periode), "-inf", 0)
+	pipeline.execute()
+
+
+def rebuild_rangliste(periode=None):
+	"""
+	Baut die Rangliste einer Periode aus dem Ledger neu auf (nicht stornierte Transaktionen).
+	Monatswertungen ohne Verfall-Gegenbuchungen. Partnerinnen ohne Punkte werden nicht aufgenommen.
+	"""
+	periode = normalize_periode(periode)
+
+	conditions = ""
+	values = {}
+	if periode != GESAMT:
+		start = getdate(f"{periode}-01")
+		values = {"from_date": start, "to_date": frappe.utils.get_last_day(start)}
+		conditions = (
+			"AND transaktionsart != 'Verfall' AND transaction_date BETWEEN %(from_date)s AND %(to_date)s"
+		)
+
+	punkte = frappe.db.sql(
+		f"""
+		SELECT sales_partner, SUM(punkte_gesamt)
+		FROM `tabENJO Punkte Transaktion`
+		WHERE is_cancelled = 0 {conditions}
+		GROUP BY sales_partner
+		HAVING SUM(punkte_gesamt) > 0
+	""",
+		values,
+	)
+
+	cache = frappe.cache()
+	pipeline = cache.pipeline()
+	pipeline.delete(get_key(periode))
+	if punkte:
+		pipeline.zadd(get_key(periode), {sales_partner: cint(summe) for sales_partner, summe in punkte})
+	pipeline.set(get_geladen_key(periode), 1)
+	pipeline.execute()
+
+	return len(punkte)
+
+
+def invalidate(perioden=None):
+	"""Verwirft die angegebenen (bzw. alle) Perioden; sie werden beim nächsten Lesen neu aufgebaut"""
+	if perioden:
+		frappe.cache().delete(*[get_geladen_key(normalize_periode(periode)) for periode in perioden])
+	else:
+		frappe.cache().delete_keys("enjo_punkte_rangliste_geladen::")
+
+
+def ensure_geladen(periode):
+	if not frappe.cache().exists(get_geladen_key(periode)):
+		rebuild_rangliste(periode)
+
+
+@frappe.whitelist()
+def get_top_partners(period=None, n=10):
+	"""
+	Top N Vertriebspartnerinnen einer Periode.
+
+	Args:
+		period: "YYYY-MM" (Standard: aktueller Monat) oder "alle"
+
+	Returns:
+		list: [{"rank", "sales_partner", "partner_name", "points"}]
+	"""
+	frappe.has_permission("ENJO Punkte Saldo", "read", throw=True)
+
+	periode = normalize_periode(period)
+	ensure_geladen(periode)
+
+	n = min(max(cint(n), 1), 1000)
+	eintraege = frappe.cache().zrevrange(get_key(periode), 0, n - 1, withscores=True)
+
+	namen = [frappe.safe_decode(sales_partner) for sales_partner, _punkte in eintraege]
+	partner_namen = (
+		dict(
+			frappe.get_all(
+				"Sales Partner",
+				filters={"name": ["in", namen]},
+				fields=["name", "partner_name"],
+				as_list=True,
+			)
+		)
+		if namen
+		else {}
+	)
+
+	return [
+		{
+			"rank": platz,
+			"sales_partner": sales_partner,
+			"partner_name": partner_namen.get(sales_partner),
+			"points": cint(punkte),
+		}
+		for platz, (sales_partner, (_name, punkte)) in enumerate(zip(namen, eintraege, strict=True), start=1)
+	]
+
+
+@frappe.whitelist()
+def get_partner_rank(partner, period=None):
+	"""
+	Platz und Punkte einer Vertriebspartnerin in einer Periode.
+
+	Returns:
+		dict: {"sales_partner", "rank" (None ohne Punkte), "points", "partners" (Anzahl in der Wertung)}
+	"""
+	frappe.has_permission("ENJO Punkte Saldo", "read", throw=True)
+	if not partner:
+		frappe.throw(_("Bitte eine Vertriebspartnerin angeben"))
+
+	periode = normalize_periode(period)
+	ensure_geladen(periode)
+
+	cache = frappe.cache()
+	key = get_key(periode)
+	pipeline = cache.pipeline()
+	pipeline.zrevrank(key, partner)
+	pipeline.zscore(key, partner)
+	pipeline.zcard(key)
+	platz, punkte, anzahl = pipeline.execute()
+
+	return {
+		"sales_partner": partner,
+		"rank": platz + 1 if platz is not None else None,
+		"points": cint(punkte),
+		"partners": anzahl,
+	}
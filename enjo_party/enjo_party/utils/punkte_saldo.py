@@ -0,0 +1,173 @@
+# ENJO Punkte Saldo
+# Materialisierter Punktestand pro Vertriebspartnerin (ENJO Punkte Saldo), damit Reports
+# nicht bei jedem Aufruf das komplette Ledger (ENJO Punkte Transaktion) aggregieren.
+#
+# - add_transaktionen:    bei Rechnungs-Submit inkrementell erhöhen
+# - remove_transaktionen: bei Rechnungs-Storno inkrementell verringern
+# - rebuild_punkte_saldo: kompletter Neuaufbau aus dem Ledger, z.B.
+#   bench --site <site> execute enjo_party.enjo_party.utils.punkte_saldo.rebuild_punkte_saldo
+
+import frappe
+from frappe.utils import cint, now
+
+from enjo_party.enjo_party.utils import logger, punkte_cache
+
+
+def add_transaktionen(zeilen):
+	"""
+	Addiert neu geschriebene Ledger-Zeilen auf den Saldo ihrer Vertriebspartnerin (ein Upsert pro Partnerin).
+
+	Args:
+		zeilen: Liste von Dicts mit sales_partner, sales_invoice, punkte_gesamt, transaction_date
+	"""
+	pro_partnerin = {}
+	for zeile in zeilen:
+		saldo = pro_partnerin.setdefault(
+			zeile["sales_partner"],
+			{
+				"total_points": 0,
+				"transaction_count": 0,
+				"last_transaction": None,
+				"last_invoice": None,
+			},
+		)
+		saldo["total_points"] += cint(zeile["punkte_gesamt"])
+		saldo["transaction_count"] += 1
+		if saldo["last_transaction"] is None or str(zeile["transaction_date"]) >= str(
+			saldo["last_transaction"]
+		):
+			saldo["last_transaction"] = zeile["transaction_date"]
+			saldo["last_invoice"] = zeile["sales_invoice"]
+
+	zeitpunkt = now()
+	for sales_partner, saldo in pro_partnerin.items():
+		# last_invoice vor last_transaction zuweisen: MariaDB wertet SET von links nach rechts aus
+		frappe.db.sql(
+			"""
+			INSERT INTO `tabENJO Punkte Saldo` (
+				name, creation, modified, modified_by, owner, docstatus, idx,
+				sales_partner, total_points, transaction_count, last_transaction, last_invoice
+			)
+			VALUES (
+				%(sales_partner)s, %(zeitpunkt)s, %(zeitpunkt)s, %(user)s, %(user)s, 0, 0,
+				%(sales_partner)s, %(total_points)s, %(transaction_count)s, %(last_transaction)s, %(last_invoice)s
+			)
+			ON DUPLICATE KEY UPDATE
+				total_points = total_points + VALUES(total_points),
+				transaction_count = transaction_count + VALUES(transaction_count),
+				last_invoice = IF(
+					last_transaction IS NULL OR VALUES(last_transaction) >= last_transaction,
+					VALUES(last_invoice), last_invoice
+				),
+				last_transaction = IF(
+					last_transaction IS NULL OR VALUES(last_transaction) >= last_transaction,
+					VALUES(last_transaction), last_transaction
+				),
+				modified = VALUES(modified),
+				modified_by = VALUES(modified_by)
+			""",
+			{"sales_partner": sales_partner, "zeitpunkt": zeitpunkt, "user": frappe.session.user, **saldo},
+		)
+
+
+def remove_transaktionen(sales_invoice, stornierte):
+	"""
+	Zieht stornierte bzw. verfallene Ledger-Zeilen vom Saldo ab.
+	War die stornierte Rechnung die letzte Aktivität, wird die Partnerin aus dem Ledger neu berechnet.
+
+	Args:
+		sales_invoice: die stornierte Rechnung (None beim Punkteverfall)
+		stornierte: Liste von Dicts mit sales_partner, punkte, anzahl (pro Partnerin und Monat aggregiert)
+	"""
+	zeitpunkt = now()
+	for zeile in stornierte:
+		frappe.db.sql(
+			"""
+			UPDATE `tabENJO Punkte Saldo`
+			SET total_points = total_points - %(punkte)s,
+				transaction_count = transaction_count - %(anzahl)s,
+				modified = %(zeitpunkt)s,
+				modified_by = %(user)s
+			WHERE name = %(sales_partner)s
+			""",
+			{
+				"punkte": cint(zeile["punkte"]),
+				"anzahl": cint(zeile["anzahl"]),
+				"zeitpunkt": zeitpunkt,
+				"user": frappe.session.user,
+				"sales_partner": zeile["sales_partner"],
+			},
+		)
+
+	if not sales_invoice:
+		return
+
+	# Letzte Aktivität stimmt nicht mehr, wenn sie auf die stornierte Rechnung zeigt
+	veraltet = frappe.get_all(
+		"ENJO Punkte Saldo",
+		filters={
+			"name": ["in", list({zeile["sales_partner"] for zeile in stornierte})],
+			"last_invoice": sales_invoice,
+		},
+		pluck="name",
+	)
+	if veraltet:
+		rebuild_punkte_saldo(veraltet)
+
+
+def rebuild_punkte_saldo(sales_partners=None):
+	"""
+	Baut den Saldo komplett (oder für die angegebenen Partnerinnen) aus dem Ledger neu auf.
+	Nicht stornierte Transaktionen zählen, letzte Rechnung = Rechnung der jüngsten Transaktion.
+	Verfall-Gegenbuchungen mindern nur die Punkte, nicht Anzahl und letzte Aktivität.
+	"""
+	bedingung = ""
+	if sales_partners:
+		sales_partners = tuple(sales_partners)
+		bedingung = "AND t.sales_partner IN %(sales_partners)s"
+		frappe.db.sql(
+			"DELETE FROM `tabENJO Punkte Saldo` WHERE name IN %(sales_partners)s",
+			{"sales_partners": sales_partners},
+		)
+	else:
+		frappe.db.sql("DELETE FROM `tabENJO Punkte Saldo`")
+
+	zeitpunkt = now()
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tabENJO Punkte Saldo` (
+			name, creation, modified, modified_by, owner, docstatus, idx,
+			sales_partner, total_points, transaction_count, last_transaction, last_invoice
+		)
+		SELECT
+			x.sales_partner, %(zeitpunkt)s, %(zeitpunkt)s, %(user)s, %(user)s, 0, 0,
+			x.sales_partner,
+			SUM(x.punkte_gesamt),
+			SUM(x.ist_vergabe),
+			MAX(CASE WHEN x.ist_vergabe THEN x.transaction_date END),
+			MAX(CASE WHEN x.rn = 1 AND x.ist_vergabe THEN x.sales_invoice END)
+		FROM (
+			SELECT
+				t.sales_partner, t.punkte_gesamt, t.transaction_date, t.sales_invoice,
+				t.transaktionsart != 'Verfall' AS ist_vergabe,
+				ROW_NUMBER() OVER (
+					PARTITION BY t.sales_partner
+					ORDER BY t.transaktionsart = 'Verfall', t.transaction_date DESC, t.creation DESC
+				) AS rn
+			FROM `tabENJO Punkte Transaktion` t
+			WHERE t.is_cancelled = 0 {bedingung}
+		) x
+		GROUP BY x.sales_partner
+		""",
+		{"zeitpunkt": zeitpunkt, "user": frappe.session.user, "sales_partners": sales_partners},
+	)
+
+	anzahl = frappe.db.count("ENJO Punkte Saldo")
+	punkte_cache.invalidate_ledger_version()
+	logger.info(
+		"ENJO Punkte Saldo neu aufgebaut (%s): %s Partnerinnen",
+		"alle" if not sales_partners else ", ".join(sales_partners),
+		anzahl,
+		title="enjo_points_saldo",
+	)
+	return anzahl
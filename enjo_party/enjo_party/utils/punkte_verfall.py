@@ -0,0 +1,160 @@
+# ENJO Punkte Verfall
+# Vergebene Punkte verfallen nach "Punkte verfallen nach (Monaten)" aus ENJO Aktionseinstellungen.
+# Der tägliche Job (scheduler_events "daily_long") sucht offene Vergaben vor dem Stichtag über den
+# verfall_index, schreibt pro Vergabe eine Gegenbuchung (transaktionsart "Verfall", negative Punkte,
+# gleiche Rechnung) und markiert die Vergabe als verfallen - blockweise mit einem Commit pro Block.
+#
+# Der Verfall mindert den Punktestand (ENJO Punkte Saldo, Gesamtwertung der Rangliste), nicht aber die
+# in einem Monat erzielten Punkte (ENJO Punkte Periode, Monatsranglisten). Wird die Rechnung später
+# storniert, werden Vergabe und Gegenbuchung gemeinsam storniert.
+
+import frappe
+from frappe.utils import add_months, cint, getdate, now, today
+
+from enjo_party.enjo_party.utils import logger, punkte_cache, punkte_rangliste, punkte_saldo
+
+# Vergaben pro Block
+VERFALL_BATCH_SIZE = 5000
+
+
+def get_verfall_monate():
+	return cint(frappe.db.get_single_value("ENJO Aktionseinstellungen", "punkte_verfall_monate"))
+
+
+def process_punkte_verfall(stichtag=None, batch_size=VERFALL_BATCH_SIZE):
+	"""
+	Täglicher Job: lässt alle offenen Vergaben mit transaction_date vor dem Stichtag verfallen.
+
+	Args:
+		stichtag: Vergaben vor diesem Datum verfallen (Standard: heute minus Verfallsdauer)
+
+	Returns:
+		int: Anzahl verfallener Vergaben
+	"""
+	if not stichtag:
+		monate = get_verfall_monate()
+		if monate <= 0:
+			return 0
+		stichtag = add_months(today(), -monate)
+
+	stichtag = getdate(stichtag)
+	batch_size = max(cint(batch_size), 1)
+	verfallsdatum = today()
+	anzahl = 0
+
+	while True:
+		# Verfallene Vergaben fallen durch verfallen = 1 aus der Abfrage - kein Cursor nötig
+		vergaben = frappe.db.sql(
+			"""
+			SELECT name, sales_partner, sales_invoice, sales_invoice_item, item_code, item_name,
+				qty, punkte_pro_item, punkte_gesamt
+			FROM `tabENJO Punkte Transaktion`
+			WHERE transaktionsart = 'Vergabe' AND verfallen = 0 AND is_cancelled = 0
+				AND transaction_date < %(stichtag)s
+			ORDER BY transaction_date, name
+			LIMIT %(limit)s
+			""",
+			{"stichtag": stichtag, "limit": batch_size},
+			as_dict=True,
+		)
+		if not vergaben:
+			break
+
+		verfallen_lassen(vergaben, verfallsdatum)
+		frappe.db.commit()
+		anzahl += len(vergaben)
+
+	if anzahl:
+		logger.info(
+			"ENJO Punkte Verfall: %s Vergaben vor %s verfallen", anzahl, stichtag, title="enjo_points_verfall"
+		)
+	return anzahl
+
+
+def verfallen_lassen(vergaben, verfallsdatum):
+	"""Schreibt die Gegenbuchungen eines Blocks als einen INSERT und markiert die Vergaben mit einem UPDATE"""
+	zeitpunkt = now()
+	benutzer = frappe.session.user
+
+	felder = [
+		"name",
+		"creation",
+		"modified",
+		"modified_by",
+		"owner",
+		"docstatus",
+		"idx",
+		"sales_partner",
+		"sales_invoice",
+		"sales_invoice_item",
+		"item_code",
+		"item_name",
+		"qty",
+		"punkte_pro_item",
+		"punkte_gesamt",
+		"transaction_date",
+		"is_cancelled",
+		"transaktionsart",
+		"verfallen",
+		"verfall_von",
+	]
+	werte = [
+		[
+			frappe.generate_hash(length=10),
+			zeitpunkt,
+			zeitpunkt,
+			benutzer,
+			benutzer,
+			0,
+			0,
+			vergabe.sales_partner,
+			vergabe.sales_invoice,
+			vergabe.sales_invoice_item,
+			vergabe.item_code,
+			vergabe.item_name,
+			-vergabe.qty,
+			vergabe.punkte_pro_item,
+			-cint(vergabe.punkte_gesamt),
+			verfallsdatum,
+			0,
+			"Verfall",
+			0,
+			vergabe.name,
+		]
+		for vergabe in vergaben
+	]
+	frappe.db.bulk_insert("ENJO Punkte Transaktion", felder, werte)
+
+	frappe.db.sql(
+		"""
+		UPDATE `tabENJO Punkte Transaktion`
+		SET verfallen = 1, modified = %(modified)s, modified_by = %(modified_by)s
+		WHERE name IN %(names)s
+		""",
+		{
+			"modified": zeitpunkt,
+			"modified_by": benutzer,
+			"names": tuple(vergabe.name for vergabe in vergaben),
+		},
+	)
+
+	# Punktestand und Gesamtwertung mindern - erzielte Punkte pro Monat bleiben unverändert
+	pro_partnerin = {}
+	for vergabe in vergaben:
+		pro_partnerin[vergabe.sales_partner] = pro_partnerin.get(vergabe.sales_partner, 0) + cint(
+			vergabe.punkte_gesamt
+		)
+
+	verfall = [
+		{
+			"sales_partner": sales_partner,
+			"periode": verfallsdatum,
+			"punkte": punkte,
+			"punkte_vergabe": 0,
+			"anzahl": 0,
+		}
+		for sales_partner, punkte in pro_partnerin.items()
+	]
+	punkte_saldo.remove_transaktionen(None, verfall)
+	punkte_rangliste.remove_transaktionen(verfall)
+	punkte_cache.invalidate_ledger_version()
@@ -0,0 +1,129 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from enjo_party.enjo_party.utils import folgebelege
+
+AUFTRAG = "TEST-SO-0001"
+RECHNUNG = "TEST-SINV-0001"
+
+
+class UnitTestFolgebelege(UnitTestCase):
+	"""
+	Unit tests für die Job-Kette (utils/folgebelege).
+	Datenbank, Queue und Belegerstellung sind gemockt - geprüft werden Status, Verkettung und Wiederholungen.
+	"""
+
+	def run_schritt(self, schritt, versuch=1, fehler=None):
+		"""Führt einen Schritt aus und liefert die Mocks für Datenbank und Queue"""
+		mocks = frappe._dict(db=MagicMock(), enqueue=MagicMock())
+		mocks.db.get_value.return_value = 0
+		with (
+			patch.object(folgebelege.frappe, "db", mocks.db),
+			patch.object(folgebelege.frappe, "get_doc", return_value=frappe._dict(name=AUFTRAG)),
+			patch.object(
+				folgebelege, "create_sales_invoice_for_order", side_effect=fehler, return_value=RECHNUNG
+			),
+			patch.object(folgebelege, "enqueue_folgebelege", mocks.enqueue),
+			patch.object(folgebelege, "logger"),
+		):
+			folgebelege.run_folgebelege(AUFTRAG, schritt, versuch=versuch)
+		return mocks
+
+	def get_status(self, db):
+		return db.set_value.call_args.args[2]["custom_folgebelege_status"]
+
+	def test_rechnung_reiht_punkte_ein(self):
+		mocks = self.run_schritt("rechnung")
+
+		self.assertEqual(self.get_status(mocks.db), folgebelege.STATUS_RECHNUNG)
+		mocks.enqueue.assert_called_once_with(AUFTRAG, "punkte", RECHNUNG)
+		mocks.db.commit.assert_called_once()
+
+	def test_fehler_wird_nach_wartezeit_wiederholt(self):
+		mocks = self.run_schritt("rechnung", versuch=2, fehler=Exception("Kein Lager"))
+
+		mocks.db.rollback.assert_called_once()
+		# Nicht sofort einreihen - der Scheduler übernimmt, sobald der Versuch fällig ist
+		mocks.enqueue.assert_not_called()
+		werte = mocks.db.set_value.call_args.args[2]
+		self.assertEqual(werte["custom_folgebelege_status"], folgebelege.STATUS_AUSSTEHEND)
+		self.assertEqual(werte["custom_folgebelege_versuch"], 3)
+		wartezeit = (werte["custom_folgebelege_naechster_versuch"] - now_datetime()).total_seconds()
+		self.assertAlmostEqual(wartezeit, folgebelege.FOLGEBELEGE_WARTEZEIT * 2, delta=5)
+
+	def test_scheduler_reiht_faellige_wiederholungen_ein(self):
+		faellig = [
+			frappe._dict(
+				name=AUFTRAG,
+				custom_folgebelege_status=folgebelege.STATUS_RECHNUNG,
+				custom_folgebelege_versuch=2,
+			)
+		]
+		db = MagicMock()
+		enqueue = MagicMock()
+		with (
+			patch.object(folgebelege.frappe, "get_all", return_value=faellig),
+			patch.object(folgebelege.frappe, "db", db),
+			patch.object(folgebelege, "get_invoice_for_order", return_value=RECHNUNG),
+			patch.object(folgebelege, "enqueue_folgebelege", enqueue),
+			patch.object(folgebelege, "logger"),
+		):
+			folgebelege.enqueue_faellige_wiederholungen()
+
+		enqueue.assert_called_once_with(AUFTRAG, "punkte", RECHNUNG, 2)
+		db.set_value.assert_called_once_with(
+			"Sales Order", AUFTRAG, "custom_folgebelege_naechster_versuch", None, update_modified=False
+		)
+
+	def test_letzter_versuch_setzt_fehlgeschlagen(self):
+		mocks = self.run_schritt(
+			"rechnung", versuch=folgebelege.FOLGEBELEGE_VERSUCHE, fehler=Exception("Kein Lager")
+		)
+
+		mocks.enqueue.assert_not_called()
+		werte = mocks.db.set_value.call_args.args[2]
+		self.assertEqual(werte["custom_folgebelege_status"], folgebelege.STATUS_FEHLGESCHLAGEN)
+		self.assertEqual(werte["custom_folgebelege_fehler"], "rechnung: Kein Lager")
+		self.assertEqual(werte["custom_folgebelege_versuche"], 1)
+
+	def retry(self, versuche, fehlgeschlagen_am, rollen=("System User",)):
+		auftrag = frappe._dict(
+			docstatus=1,
+			custom_folgebelege_status=folgebelege.STATUS_FEHLGESCHLAGEN,
+			custom_folgebelege_versuche=versuche,
+			custom_folgebelege_fehlgeschlagen_am=fehlgeschlagen_am,
+		)
+		db = MagicMock()
+		db.get_value.return_value = auftrag
+		enqueue = MagicMock()
+		with (
+			patch.object(folgebelege.frappe, "db", db),
+			patch.object(folgebelege.frappe, "get_roles", return_value=list(rollen)),
+			patch.object(folgebelege, "enqueue_folgebelege", enqueue),
+		):
+			folgebelege.retry_folgebelege(AUFTRAG)
+		return enqueue
+
+	def test_retry_nach_wartezeit(self):
+		vorher = add_to_date(now_datetime(), seconds=-folgebelege.FOLGEBELEGE_WARTEZEIT - 1)
+		self.retry(1, vorher).assert_called_once_with(AUFTRAG)
+
+	def test_retry_vor_wartezeit_abgelehnt(self):
+		# Nach dem zweiten fehlgeschlagenen Lauf gilt die doppelte Wartezeit
+		vorher = add_to_date(now_datetime(), seconds=-folgebelege.FOLGEBELEGE_WARTEZEIT - 1)
+		with self.assertRaises(frappe.ValidationError):
+			self.retry(2, vorher)
+
+	def test_retry_nach_limit_nur_system_manager(self):
+		vorher = add_to_date(now_datetime(), days=-7)
+		versuche = folgebelege.FOLGEBELEGE_WIEDERHOLUNGEN + 1
+		with self.assertRaises(frappe.ValidationError):
+			self.retry(versuche, vorher)
+
+		self.retry(versuche, vorher, rollen=("System Manager",)).assert_called_once_with(AUFTRAG)
@@ -0,0 +1,51 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from enjo_party.enjo_party.utils import logger
+
+
+class UnitTestLogger(UnitTestCase):
+	"""
+	Unit tests für das gepufferte Logging (utils/logger).
+	"""
+
+	def setUp(self):
+		frappe.local.enjo_party_log_buffer = []
+		frappe.local.enjo_party_log_level = logger.WARN
+
+	def tearDown(self):
+		frappe.local.enjo_party_log_buffer = None
+		frappe.local.enjo_party_log_level = None
+
+	def test_debug_formatiert_nicht_unter_level(self):
+		wert = MagicMock()
+
+		logger.debug("Wert %s", wert, title="test")
+
+		wert.__str__.assert_not_called()
+		self.assertEqual(frappe.local.enjo_party_log_buffer, [])
+
+	def test_formatiert_ab_level(self):
+		frappe.local.enjo_party_log_level = logger.DEBUG
+
+		logger.debug("Versandziel %s: %s Aufträge", "Kunde A", 3, title="group_detail")
+		logger.info("100% ohne Werte", title="prozent")
+
+		nachrichten = [eintrag[3] for eintrag in frappe.local.enjo_party_log_buffer]
+		self.assertEqual(nachrichten, ["Versandziel Kunde A: 3 Aufträge", "100% ohne Werte"])
+
+	def test_falsche_platzhalter(self):
+		logger.warn("Wert %d", "kein int", title="test")
+
+		self.assertEqual(frappe.local.enjo_party_log_buffer[0][3], "Wert %d kein int")
+
+	def test_error_formatiert_fuer_error_log(self):
+		with patch.object(logger.frappe, "log_error") as log_error:
+			logger.error("Auftrag %s fehlgeschlagen", "SO-1", title="test")
+
+		self.assertEqual(log_error.call_args.kwargs["message"], "Auftrag SO-1 fehlgeschlagen")
@@ -0,0 +1,201 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from enjo_party.enjo_party.utils import picklist
+
+
+def location(sales_order, sales_order_item, qty, item_code="TEST-ITEM", customer="Test Kunde"):
+	return {
+		"item_code": item_code,
+		"warehouse": "Lager - T",
+		"uom": "Stk",
+		"qty": qty,
+		"stock_qty": qty,
+		"sales_order": sales_order,
+		"sales_order_item": sales_order_item,
+		"_customer": customer,
+	}
+
+
+def pick_list(locations, zuordnung, docstatus=1):
+	return frappe._dict(
+		name="TEST-PICK-0001",
+		docstatus=docstatus,
+		locations=[frappe._dict(location, idx=idx) for idx, location in enumerate(locations, start=1)],
+		custom_zuordnung=[frappe._dict(zeile, name=f"TEST-PLZ-{i}") for i, zeile in enumerate(zuordnung)],
+	)
+
+
+class UnitTestPicklist(UnitTestCase):
+	"""
+	Unit tests für die zusammengefasste Kommissionierung (utils/picklist).
+	Datenbank und Auftragsdokumente sind gemockt.
+	"""
+
+	def test_zusammenfassen(self):
+		zeilen, zuordnung = picklist.zusammenfassen(
+			[
+				location("SO-1", "SOI-1", 2),
+				location("SO-2", "SOI-2", 3),
+				location("SO-2", "SOI-3", 1, item_code="TEST-ANDERS"),
+			]
+		)
+
+		self.assertEqual(len(zeilen), 2)
+		self.assertEqual(zeilen[0]["qty"], 5)
+		self.assertIsNone(zeilen[0]["sales_order_item"])
+		self.assertEqual(zeilen[1]["sales_order_item"], "SOI-3")
+		self.assertEqual([z["item_code"] for z in zuordnung], ["TEST-ITEM", "TEST-ITEM", "TEST-ANDERS"])
+		self.assertNotIn("zeile", zuordnung[0])
+		self.assertEqual(zuordnung[1]["customer"], "Test Kunde")
+
+	def test_auftragszeilen_verteilen_gepickte_menge(self):
+		zeilen, zuordnung = picklist.zusammenfassen(
+			[location("SO-1", "SOI-1", 2), location("SO-2", "SOI-2", 3)]
+		)
+		zeilen[0]["picked_qty"] = 4
+
+		auftragszeilen = picklist.get_auftragszeilen(pick_list(zeilen, zuordnung))
+
+		self.assertEqual(
+			[(z.sales_order_item, z.picked_qty) for z in auftragszeilen], [("SOI-1", 2), ("SOI-2", 2)]
+		)
+		self.assertEqual(auftragszeilen[0].zuordnung, "TEST-PLZ-0")
+
+	def test_auftragszeilen_nach_aufteilung_durch_erpnext(self):
+		"""ERPNext teilt eine zusammengefasste Zeile auf und nummeriert neu - verteilt wird über den Schlüssel"""
+		zeilen, zuordnung = picklist.zusammenfassen(
+			[
+				location("SO-1", "SOI-1", 1, item_code="TEST-ANDERS"),
+				location("SO-1", "SOI-2", 2),
+				location("SO-2", "SOI-3", 3),
+			]
+		)
+		aufgeteilt = [
+			dict(zeilen[1], qty=4, stock_qty=4, picked_qty=4),
+			dict(zeilen[1], qty=1, stock_qty=1, picked_qty=1),
+			dict(zeilen[0], picked_qty=1),
+		]
+
+		auftragszeilen = picklist.get_auftragszeilen(pick_list(aufgeteilt, zuordnung))
+
+		self.assertEqual(
+			[(z.sales_order_item, z.picked_qty) for z in auftragszeilen],
+			[("SOI-2", 2), ("SOI-3", 3), ("SOI-1", 1)],
+		)
+
+	def test_einzelne_position_zaehlt_direkt(self):
+		zeilen, zuordnung = picklist.zusammenfassen([location("SO-1", "SOI-1", 2)])
+		zeilen[0]["picked_qty"] = 2
+
+		auftragszeilen = picklist.get_auftragszeilen(pick_list(zeilen, zuordnung))
+
+		self.assertEqual(len(auftragszeilen), 1)
+		self.assertIsNone(auftragszeilen[0].zuordnung)
+
+	def test_picked_qty_am_auftrag(self):
+		zeilen, zuordnung = picklist.zusammenfassen(
+			[location("SO-1", "SOI-1", 2), location("SO-2", "SOI-2", 3)]
+		)
+		zeilen[0]["picked_qty"] = 5
+		db = MagicMock()
+		db.sql.side_effect = [[("SOI-1", 2), ("SOI-2", 3)], [("SOI-2", 1)]]
+		auftrag = MagicMock()
+
+		with (
+			patch.object(picklist.frappe, "db", db),
+			patch.object(picklist.frappe, "get_doc", return_value=auftrag),
+			patch.object(picklist, "logger"),
+		):
+			picklist.update_auftrags_picked_qty(pick_list(zeilen, zuordnung))
+
+		picked = {
+			call.args[1]: call.args[3]
+			for call in db.set_value.call_args_list
+			if call.args[0] == "Sales Order Item"
+		}
+		# SOI-2 liegt zusätzlich direkt auf einer anderen Picklist
+		self.assertEqual(picked, {"SOI-1": 2, "SOI-2": 4})
+		self.assertEqual(auftrag.update_picking_status.call_count, 2)
+
+	def test_picked_qty_ohne_zuordnung_bleibt_erpnext(self):
+		db = MagicMock()
+		db.sql.return_value = []
+
+		with patch.object(picklist.frappe, "db", db):
+			picklist.update_auftrags_picked_qty(pick_list([location("SO-1", "SOI-1", 2)], []))
+
+		self.assertEqual(db.sql.call_count, 1)
+		db.set_value.assert_not_called()
+
+	def test_picklist_index_mit_sammelabfragen(self):
+		"""Drei Aufträge: je eine Abfrage für Aufträge, Positionen, Rechnungen und Kundennamen"""
+		get_all = MagicMock(
+			side_effect=[
+				[("SO-1", "Kunde A"), ("SO-2", "Kunde B"), ("SO-3", "Kunde A")],
+				[
+					frappe._dict(
+						name="SOI-1", parent="SO-1", item_code="TEST-ITEM", qty=1, warehouse="Lager - T"
+					),
+					frappe._dict(
+						name="SOI-2", parent="SO-2", item_code="TEST-ITEM", qty=1, warehouse="Lager - T"
+					),
+					frappe._dict(
+						name="SOI-3", parent="SO-2", item_code="shipping-7", qty=1, warehouse="Lager - T"
+					),
+				],
+				[("Kunde A", "Anna"), ("Kunde B", "Berta")],
+			]
+		)
+		db = MagicMock()
+		db.sql.return_value = [("SINV-1", "SO-1"), ("SINV-2", "SO-2")]
+
+		with patch.object(picklist.frappe, "get_all", get_all), patch.object(picklist.frappe, "db", db):
+			index = picklist.get_picklist_index(["SO-1", "SO-2", "SO-3", "SO-1"])
+
+		self.assertEqual(get_all.call_count, 3)
+		self.assertEqual(db.sql.call_count, 1)
+		self.assertEqual(list(index), ["SO-1", "SO-2", "SO-3"])
+		self.assertEqual([item.name for item in index["SO-2"]["items"]], ["SOI-2", "SOI-3"])
+		self.assertEqual(index["SO-1"].invoices, ["SINV-1"])
+		self.assertEqual(index["SO-3"].customer_name, "Anna")
+
+		# Versandartikel werden nicht kommissioniert
+		locations = picklist.build_picklist_items({"SO-2": index["SO-2"]})
+		self.assertEqual([location["sales_order_item"] for location in locations], ["SOI-2"])
+
+
+class IntegrationTestPicklist(IntegrationTestCase):
+	"""
+	Integration tests mit einer echten Pick List (ERPNext-Testdaten: _Test Company, _Test Item,
+	_Test Warehouse - _TC, _Test Customer).
+	"""
+
+	def test_zusammengefasste_picklist_speichern(self):
+		from erpnext.selling.doctype.sales_order.test_sales_order import make_sales_order
+		from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+
+		make_stock_entry(item_code="_Test Item", target="_Test Warehouse - _TC", qty=10, basic_rate=100)
+		auftraege = [make_sales_order(qty=2), make_sales_order(qty=3)]
+		index = picklist.get_picklist_index([auftrag.name for auftrag in auftraege], mit_rechnungen=False)
+
+		with patch.object(picklist, "is_zusammenfassen_aktiv", return_value=True):
+			name = picklist.create_picklist("_Test Customer", index, [], "Test", company="_Test Company")
+
+		pick_list = frappe.get_doc("Pick List", name)
+		self.assertTrue(pick_list.pick_manually)
+		self.assertEqual([(row.item_code, row.stock_qty) for row in pick_list.locations], [("_Test Item", 5)])
+		self.assertEqual(len(pick_list.custom_zuordnung), 2)
+
+		pick_list.locations[0].picked_qty = 5
+		auftragszeilen = picklist.get_auftragszeilen(pick_list)
+
+		self.assertEqual(
+			{z.sales_order_item: z.picked_qty for z in auftragszeilen},
+			{auftrag.items[0].name: auftrag.items[0].stock_qty for auftrag in auftraege},
+		)
@@ -0,0 +1,52 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+from frappe.tests import UnitTestCase
+
+from enjo_party.enjo_party.utils import punkte_cache
+
+
+class DictCache:
+	"""Minimaler Ersatz für frappe.cache() mit get_value/set_value/delete_value"""
+
+	def __init__(self):
+		self.werte = {}
+
+	def get_value(self, key):
+		return self.werte.get(key)
+
+	def set_value(self, key, value, expires_in_sec=None):
+		self.werte[key] = value
+
+	def delete_value(self, key):
+		self.werte.pop(key, None)
+
+
+class UnitTestPunkteCache(UnitTestCase):
+	"""
+	Unit tests für die Ledger-Version (utils/punkte_cache).
+	Neuaufbauten von Saldo und Perioden ändern das Ledger nicht - die Version muss trotzdem wechseln.
+	"""
+
+	def test_invalidierung_ohne_ledger_aenderung(self):
+		cache = DictCache()
+		db = MagicMock()
+		db.sql.return_value = [["2026-10-01 10:00:00"]]
+		# after_commit direkt ausführen
+		db.after_commit.add.side_effect = lambda callback: callback()
+
+		with (
+			patch.object(punkte_cache.frappe, "cache", return_value=cache),
+			patch.object(punkte_cache.frappe, "db", db),
+			patch.object(punkte_cache.frappe, "generate_hash", side_effect=["gen1", "gen2"]),
+		):
+			vorher = punkte_cache.get_ledger_version()
+			self.assertEqual(punkte_cache.get_ledger_version(), vorher)
+
+			punkte_cache.invalidate_ledger_version()
+			nachher = punkte_cache.get_ledger_version()
+
+		self.assertNotEqual(vorher, nachher)
+		self.assertTrue(nachher.startswith("2026-10-01 10:00:00"))
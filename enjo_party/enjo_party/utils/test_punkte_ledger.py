@@ -0,0 +1,127 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from enjo_party.enjo_party.utils import punkte_ledger
+
+RECHNUNG = frappe._dict(name="TEST-SINV-0001", sales_partner="Test Partnerin", posting_date="2026-10-01")
+POSITION = frappe._dict(
+	name="TEST-SII-0001", parent=RECHNUNG.name, item_code="TEST-ITEM", item_name="Test", qty=2
+)
+
+
+class UnitTestPunkteLedger(UnitTestCase):
+	"""
+	Unit tests für den Ledger-Abgleich (utils/punkte_ledger).
+	Datenbank und Nachzieh-Funktionen sind gemockt - geprüft wird die Abgleichslogik.
+	"""
+
+	def abgleichen(self, vorhandene_zeilen):
+		"""Führt abgleichen für RECHNUNG aus und liefert (Ergebnis, Mocks)"""
+		mocks = frappe._dict(db=MagicMock(), insert=MagicMock(), invalidate=MagicMock(), betroffene=set())
+		with (
+			patch.object(punkte_ledger.frappe, "get_all", side_effect=[[POSITION], vorhandene_zeilen]),
+			patch.object(punkte_ledger.frappe, "db", mocks.db),
+			patch.object(punkte_ledger, "get_punkte_pro_artikel", return_value={"TEST-ITEM": 5}),
+			patch.object(punkte_ledger, "insert_punkte_transaktionen", mocks.insert),
+			patch.object(punkte_ledger.punkte_cache, "invalidate_ledger_version", mocks.invalidate),
+		):
+			ergebnis = punkte_ledger.abgleichen([RECHNUNG], {}, mocks.betroffene)
+		return ergebnis, mocks
+
+	def test_fehlende_zeile_wird_eingefuegt(self):
+		ergebnis, mocks = self.abgleichen([])
+
+		self.assertEqual(ergebnis, (1, 0))
+		zeilen = mocks.insert.call_args.args[0]
+		self.assertEqual(len(zeilen), 1)
+		self.assertEqual(zeilen[0]["punkte_gesamt"], 10)
+		self.assertEqual(zeilen[0]["sales_invoice_item"], POSITION.name)
+		self.assertEqual(mocks.betroffene, {RECHNUNG.sales_partner})
+		mocks.invalidate.assert_called_once()
+
+	def test_abweichende_zeile_wird_storniert(self):
+		abweichend = frappe._dict(
+			name="TEST-TX-0001",
+			sales_invoice=RECHNUNG.name,
+			sales_partner=RECHNUNG.sales_partner,
+			item_code="TEST-ITEM",
+			qty=3,
+			punkte_pro_item=5,
+			punkte_gesamt=15,
+			transaction_date=RECHNUNG.posting_date,
+		)
+		ergebnis, mocks = self.abgleichen([abweichend])
+
+		self.assertEqual(ergebnis, (1, 1))
+		# Vergabe und ihre Verfall-Gegenbuchungen
+		self.assertEqual(mocks.db.sql.call_count, 2)
+		mocks.invalidate.assert_called_once()
+
+	def test_unveraenderte_zeile_bleibt(self):
+		unveraendert = frappe._dict(
+			name="TEST-TX-0002",
+			sales_invoice=RECHNUNG.name,
+			sales_partner=RECHNUNG.sales_partner,
+			item_code="TEST-ITEM",
+			qty=2,
+			punkte_pro_item=5,
+			punkte_gesamt=10,
+			transaction_date=RECHNUNG.posting_date,
+		)
+		ergebnis, mocks = self.abgleichen([unveraendert])
+
+		self.assertEqual(ergebnis, (0, 0))
+		mocks.insert.assert_not_called()
+		mocks.invalidate.assert_not_called()
+		self.assertEqual(mocks.betroffene, set())
+
+	def test_rebuild_mit_abweichung(self):
+		"""
+		Neuaufbau über zwei Blöcke mit Abweichung: Saldo und Perioden werden einmal nach dem letzten
+		Block nachgezogen, Cursor und betroffene Partnerinnen danach gelöscht
+		"""
+		cache = MagicMock()
+		saldo = MagicMock()
+		perioden = MagicMock()
+		with (
+			patch.object(punkte_ledger, "get_rechnungen", side_effect=[[RECHNUNG], [RECHNUNG], []]),
+			patch.object(punkte_ledger.frappe, "get_all", side_effect=[[POSITION], [], [POSITION], []]),
+			patch.object(punkte_ledger.frappe, "db", MagicMock()),
+			patch.object(punkte_ledger.frappe, "cache", return_value=cache),
+			patch.object(punkte_ledger, "get_punkte_pro_artikel", return_value={"TEST-ITEM": 5}),
+			patch.object(punkte_ledger, "insert_punkte_transaktionen"),
+			patch.object(punkte_ledger.punkte_saldo, "rebuild_punkte_saldo", saldo),
+			patch.object(punkte_ledger.punkte_periode, "rebuild_punkte_perioden", perioden),
+			patch.object(punkte_ledger.punkte_cache, "invalidate_ledger_version"),
+		):
+			ergebnis = punkte_ledger.rebuild_punkte_ledger(after="")
+
+		self.assertEqual(ergebnis, {"rechnungen": 2, "eingefuegt": 2, "storniert": 0})
+		saldo.assert_called_once_with([RECHNUNG.sales_partner])
+		perioden.assert_called_once_with([RECHNUNG.sales_partner])
+		cache.set_value.assert_any_call(punkte_ledger.get_cursor_key(), RECHNUNG.name)
+		cache.set_value.assert_any_call(punkte_ledger.get_betroffene_key(), [RECHNUNG.sales_partner])
+		cache.delete_value.assert_any_call(punkte_ledger.get_cursor_key())
+		cache.delete_value.assert_any_call(punkte_ledger.get_betroffene_key())
+
+	def test_fortsetzen_uebernimmt_betroffene(self):
+		"""Ein fortgesetzter Lauf baut auch die Partnerinnen der bereits committeten Blöcke neu auf"""
+		cache = MagicMock()
+		cache.get_value.side_effect = [RECHNUNG.name, ["Andere Partnerin"]]
+		saldo = MagicMock()
+		with (
+			patch.object(punkte_ledger, "get_rechnungen", return_value=[]),
+			patch.object(punkte_ledger.frappe, "db", MagicMock()),
+			patch.object(punkte_ledger.frappe, "cache", return_value=cache),
+			patch.object(punkte_ledger.punkte_saldo, "rebuild_punkte_saldo", saldo),
+			patch.object(punkte_ledger.punkte_periode, "rebuild_punkte_perioden"),
+			patch.object(punkte_ledger, "logger"),
+		):
+			punkte_ledger.rebuild_punkte_ledger()
+
+		saldo.assert_called_once_with(["Andere Partnerin"])
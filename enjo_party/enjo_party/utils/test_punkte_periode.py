@@ -0,0 +1,110 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+import datetime
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from enjo_party.enjo_party.utils import punkte_periode
+
+
+def zeile(sales_partner, punkte, datum):
+	return {"sales_partner": sales_partner, "punkte_gesamt": punkte, "transaction_date": datum}
+
+
+class UnitTestPunktePeriode(UnitTestCase):
+	"""
+	Unit tests für den Rollup ENJO Punkte Periode (utils/punkte_periode).
+	Geprüft wird die Aggregation vor dem Upsert - ein Upsert pro Partnerin und Monat.
+	"""
+
+	def upserts(self, funktion, *args):
+		db = MagicMock()
+		with patch.object(punkte_periode.frappe, "db", db):
+			funktion(*args)
+		return [call.args[1] for call in db.sql.call_args_list]
+
+	def test_perioden_ein_upsert_pro_monat(self):
+		werte = self.upserts(
+			punkte_periode.add_transaktionen,
+			[
+				zeile("Partnerin A", 10, "2026-09-30"),
+				zeile("Partnerin A", 5, "2026-10-02"),
+				zeile("Partnerin A", 7, "2026-10-20"),
+			],
+		)
+
+		perioden = {wert["periode"]: (wert["punkte"], wert["anzahl"]) for wert in werte}
+		self.assertEqual(perioden, {datetime.date(2026, 9, 1): (10, 1), datetime.date(2026, 10, 1): (12, 2)})
+
+	def test_perioden_storno_ohne_verfall(self):
+		# Verfall-Gegenbuchungen zählen nicht zu den Perioden - nur punkte_vergabe wird abgezogen
+		werte = self.upserts(
+			punkte_periode.remove_transaktionen,
+			[
+				{
+					"sales_partner": "Partnerin A",
+					"periode": "2026-10-01",
+					"punkte": 0,
+					"punkte_vergabe": 10,
+					"anzahl": 1,
+				},
+				{
+					"sales_partner": "Partnerin A",
+					"periode": "2026-11-01",
+					"punkte": -10,
+					"punkte_vergabe": 0,
+					"anzahl": 0,
+				},
+			],
+		)
+
+		self.assertEqual(len(werte), 1)
+		self.assertEqual((werte[0]["punkte"], werte[0]["anzahl"]), (-10, -1))
+
+
+class IntegrationTestPunktePeriode(IntegrationTestCase):
+	"""
+	Integration tests für ENJO Punkte Periode: Upserts über den Unique-Key (Partnerin, Monat).
+	"""
+
+	def get_perioden(self, sales_partner):
+		return {
+			str(periode.periode): (periode.total_points, periode.transaction_count)
+			for periode in frappe.get_all(
+				"ENJO Punkte Periode",
+				filters={"sales_partner": sales_partner},
+				fields=["periode", "total_points", "transaction_count"],
+			)
+		}
+
+	def test_upserts_und_storno(self):
+		punkte_periode.add_transaktionen([zeile("Test Partnerin Periode", 10, "2026-09-30")])
+		punkte_periode.add_transaktionen(
+			[
+				zeile("Test Partnerin Periode", 5, "2026-10-02"),
+				zeile("Test Partnerin Periode", 7, "2026-10-20"),
+			]
+		)
+		# Weitere Vergabe im selben Monat erhöht die vorhandene Zeile statt eine zweite anzulegen
+		punkte_periode.add_transaktionen([zeile("Test Partnerin Periode", 3, "2026-10-31")])
+
+		self.assertEqual(
+			self.get_perioden("Test Partnerin Periode"), {"2026-09-01": (10, 1), "2026-10-01": (15, 3)}
+		)
+
+		punkte_periode.remove_transaktionen(
+			[
+				{
+					"sales_partner": "Test Partnerin Periode",
+					"periode": "2026-10-01",
+					"punkte": 5,
+					"punkte_vergabe": 5,
+					"anzahl": 1,
+				},
+			]
+		)
+
+		self.assertEqual(self.get_perioden("Test Partnerin Periode")["2026-10-01"], (10, 2))
@@ -0,0 +1,100 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from enjo_party.enjo_party.server_scripts.enjo_punkte_vergabe import insert_punkte_transaktionen
+from enjo_party.enjo_party.utils import punkte_saldo
+
+
+def zeile(sales_partner, sales_invoice, punkte, datum):
+	return {
+		"sales_partner": sales_partner,
+		"sales_invoice": sales_invoice,
+		"punkte_gesamt": punkte,
+		"transaction_date": datum,
+	}
+
+
+class UnitTestPunkteSaldo(UnitTestCase):
+	"""
+	Unit tests für den Rollup ENJO Punkte Saldo (utils/punkte_saldo).
+	Geprüft wird die Aggregation vor dem Upsert - ein Upsert pro Partnerin.
+	"""
+
+	def upserts(self, funktion, *args):
+		db = MagicMock()
+		with patch.object(punkte_saldo.frappe, "db", db):
+			funktion(*args)
+		return [call.args[1] for call in db.sql.call_args_list]
+
+	def test_saldo_ein_upsert_pro_partnerin(self):
+		werte = self.upserts(
+			punkte_saldo.add_transaktionen,
+			[
+				zeile("Partnerin A", "SINV-1", 10, "2026-09-30"),
+				zeile("Partnerin A", "SINV-2", 5, "2026-10-02"),
+				zeile("Partnerin B", "SINV-3", 7, "2026-10-01"),
+			],
+		)
+
+		self.assertEqual(len(werte), 2)
+		a = next(wert for wert in werte if wert["sales_partner"] == "Partnerin A")
+		self.assertEqual((a["total_points"], a["transaction_count"]), (15, 2))
+		self.assertEqual((a["last_transaction"], a["last_invoice"]), ("2026-10-02", "SINV-2"))
+
+	def test_saldo_storno_zieht_ab(self):
+		db = MagicMock()
+		get_all = MagicMock(return_value=[])
+		with (
+			patch.object(punkte_saldo.frappe, "db", db),
+			patch.object(punkte_saldo.frappe, "get_all", get_all),
+		):
+			punkte_saldo.remove_transaktionen(
+				"SINV-1", [{"sales_partner": "Partnerin A", "punkte": 10, "anzahl": 1}]
+			)
+
+		self.assertEqual(db.sql.call_count, 1)
+		self.assertEqual(db.sql.call_args.args[1]["punkte"], 10)
+		self.assertEqual(db.sql.call_args.args[1]["anzahl"], 1)
+
+
+class IntegrationTestPunkteSaldo(IntegrationTestCase):
+	"""
+	Integration tests für ENJO Punkte Saldo: Upserts und Neuaufbau gegen die Datenbank.
+	"""
+
+	def get_saldo(self, sales_partner):
+		return frappe.db.get_value(
+			"ENJO Punkte Saldo",
+			sales_partner,
+			["total_points", "transaction_count", "last_transaction", "last_invoice"],
+			as_dict=True,
+		)
+
+	def test_upserts_entsprechen_dem_neuaufbau(self):
+		zeilen = [
+			dict(
+				zeile("Test Partnerin Saldo", "TEST-SINV-1", 10, "2026-09-30"),
+				sales_invoice_item="TEST-SII-1",
+			),
+			dict(
+				zeile("Test Partnerin Saldo", "TEST-SINV-2", 5, "2026-10-02"), sales_invoice_item="TEST-SII-2"
+			),
+		]
+		insert_punkte_transaktionen(zeilen)
+		# Zwei Vergaben nacheinander: der zweite Upsert erhöht die vorhandene Zeile
+		punkte_saldo.add_transaktionen(zeilen[:1])
+		punkte_saldo.add_transaktionen(zeilen[1:])
+
+		inkrementell = self.get_saldo("Test Partnerin Saldo")
+		self.assertEqual((inkrementell.total_points, inkrementell.transaction_count), (15, 2))
+		self.assertEqual(
+			(str(inkrementell.last_transaction), inkrementell.last_invoice), ("2026-10-02", "TEST-SINV-2")
+		)
+
+		punkte_saldo.rebuild_punkte_saldo(["Test Partnerin Saldo"])
+		self.assertEqual(self.get_saldo("Test Partnerin Saldo"), inkrementell)
@@ -0,0 +1,153 @@
+# Copyright (c) 2025, Elia and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from enjo_party.enjo_party.server_scripts.enjo_punkte_vergabe import insert_punkte_transaktionen
+from enjo_party.enjo_party.utils import punkte_saldo, punkte_verfall
+
+
+def vergabe(name, sales_partner, punkte):
+	return frappe._dict(
+		name=name,
+		sales_partner=sales_partner,
+		sales_invoice="SINV-1",
+		sales_invoice_item=f"SII-{name}",
+		item_code="TEST-ITEM",
+		item_name="Test",
+		qty=2,
+		punkte_pro_item=punkte // 2,
+		punkte_gesamt=punkte,
+	)
+
+
+class UnitTestPunkteVerfall(UnitTestCase):
+	"""
+	Unit tests für den Punkteverfall (utils/punkte_verfall).
+	Datenbank und Rollups sind gemockt - geprüft werden Gegenbuchungen und Blockverarbeitung.
+	"""
+
+	def test_gegenbuchungen(self):
+		db = MagicMock()
+		rollups = MagicMock()
+		vergaben = [
+			vergabe("TX-1", "Partnerin A", 10),
+			vergabe("TX-2", "Partnerin A", 6),
+			vergabe("TX-3", "Partnerin B", 4),
+		]
+
+		with (
+			patch.object(punkte_verfall.frappe, "db", db),
+			patch.object(punkte_verfall, "punkte_saldo", rollups.saldo),
+			patch.object(punkte_verfall, "punkte_rangliste", rollups.rangliste),
+			patch.object(punkte_verfall, "punkte_cache", rollups.cache),
+		):
+			punkte_verfall.verfallen_lassen(vergaben, "2026-10-18")
+
+		_doctype, felder, werte = db.bulk_insert.call_args.args
+		gegenbuchungen = [dict(zip(felder, wert, strict=True)) for wert in werte]
+		self.assertEqual(len(gegenbuchungen), 3)
+		self.assertEqual(
+			(
+				gegenbuchungen[0]["transaktionsart"],
+				gegenbuchungen[0]["punkte_gesamt"],
+				gegenbuchungen[0]["qty"],
+			),
+			("Verfall", -10, -2),
+		)
+		self.assertEqual([g["verfall_von"] for g in gegenbuchungen], ["TX-1", "TX-2", "TX-3"])
+		self.assertEqual(db.sql.call_args.args[1]["names"], ("TX-1", "TX-2", "TX-3"))
+
+		# Saldo pro Partnerin gemindert, Perioden bleiben unverändert
+		saldo = {
+			zeile["sales_partner"]: zeile["punkte"]
+			for zeile in rollups.saldo.remove_transaktionen.call_args.args[1]
+		}
+		self.assertEqual(saldo, {"Partnerin A": 16, "Partnerin B": 4})
+		rollups.cache.invalidate_ledger_version.assert_called_once()
+
+	def test_verfall_in_bloecken(self):
+		db = MagicMock()
+		db.sql.side_effect = [
+			[vergabe("TX-1", "Partnerin A", 10), vergabe("TX-2", "Partnerin A", 6)],
+			[vergabe("TX-3", "Partnerin B", 4)],
+			[],
+		]
+		verfallen_lassen = MagicMock()
+
+		with (
+			patch.object(punkte_verfall.frappe, "db", db),
+			patch.object(punkte_verfall, "verfallen_lassen", verfallen_lassen),
+			patch.object(punkte_verfall, "logger"),
+		):
+			anzahl = punkte_verfall.process_punkte_verfall(stichtag="2025-10-18", batch_size=2)
+
+		self.assertEqual(anzahl, 3)
+		self.assertEqual(verfallen_lassen.call_count, 2)
+		self.assertEqual(db.commit.call_count, 2)
+
+	def test_ohne_verfallsdauer_nichts_zu_tun(self):
+		db = MagicMock()
+		db.get_single_value.return_value = 0
+
+		with patch.object(punkte_verfall.frappe, "db", db):
+			self.assertEqual(punkte_verfall.process_punkte_verfall(), 0)
+		db.sql.assert_not_called()
+
+
+class IntegrationTestPunkteVerfall(IntegrationTestCase):
+	"""
+	Integration tests für den Punkteverfall: Gegenbuchung, Markierung und Saldo gegen die Datenbank.
+	"""
+
+	def test_verfall_schreibt_gegenbuchung_und_mindert_saldo(self):
+		zeilen = [
+			{
+				"sales_partner": "Test Partnerin Verfall",
+				"sales_invoice": "TEST-SINV-VERFALL",
+				"sales_invoice_item": "TEST-SII-VERFALL",
+				"item_code": "TEST-ITEM",
+				"item_name": "Test",
+				"qty": 2,
+				"punkte_pro_item": 5,
+				"punkte_gesamt": 10,
+				"transaction_date": "2025-01-15",
+				"transaktionsart": "Vergabe",
+			}
+		]
+		insert_punkte_transaktionen(zeilen)
+		punkte_saldo.add_transaktionen(zeilen)
+
+		vergaben = frappe.get_all(
+			"ENJO Punkte Transaktion",
+			filters={"sales_invoice": "TEST-SINV-VERFALL"},
+			fields=[
+				"name",
+				"sales_partner",
+				"sales_invoice",
+				"sales_invoice_item",
+				"item_code",
+				"item_name",
+				"qty",
+				"punkte_pro_item",
+				"punkte_gesamt",
+			],
+		)
+		punkte_verfall.verfallen_lassen(vergaben, "2026-10-18")
+
+		self.assertEqual(frappe.db.get_value("ENJO Punkte Transaktion", vergaben[0].name, "verfallen"), 1)
+		gegenbuchung = frappe.db.get_value(
+			"ENJO Punkte Transaktion",
+			{"verfall_von": vergaben[0].name},
+			["transaktionsart", "punkte_gesamt", "qty"],
+			as_dict=True,
+		)
+		self.assertEqual(
+			(gegenbuchung.transaktionsart, gegenbuchung.punkte_gesamt, gegenbuchung.qty), ("Verfall", -10, -2)
+		)
+		self.assertEqual(
+			frappe.db.get_value("ENJO Punkte Saldo", "Test Partnerin Verfall", "total_points"), 0
+		)
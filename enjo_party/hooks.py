@@ -153,13 +153,30 @@ doc_events = {
 		"on_cancel": "enjo_party.enjo_party.server_scripts.enjo_punkte_vergabe.cancel_points_on_invoice_cancel"
 	},
 	"Sales Order": {
-		"on_submit": "enjo_party.enjo_party.utils.sales_order_hooks.auto_create_and_submit_sales_invoice"
+		"on_submit": "enjo_party.enjo_party.utils.sales_order_hooks.auto_create_and_submit_sales_invoice",
+		"on_cancel": "enjo_party.enjo_party.utils.sales_order_hooks.clear_party_buchung"
+	},
+	"Pick List": {
+		"on_submit": "enjo_party.enjo_party.utils.picklist.update_auftrags_picked_qty",
+		"on_cancel": "enjo_party.enjo_party.utils.picklist.update_auftrags_picked_qty"
 	}
 }
 
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+	"all": [
+		"enjo_party.enjo_party.utils.folgebelege.enqueue_faellige_wiederholungen"
+	],
+	"daily": [
+		"enjo_party.enjo_party.server_scripts.enjo_punkte_vergabe.reconcile_punkte_vergabe"
+	],
+	"daily_long": [
+		"enjo_party.enjo_party.utils.punkte_verfall.process_punkte_verfall"
+	]
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"enjo_party.tasks.all"
@@ -209,12 +226,12 @@ doc_events = {
 # Request Events
 # ----------------
 # before_request = ["enjo_party.utils.fix_erpnext_compatibility"]
-# after_request = ["enjo_party.utils.after_request"]
+after_request = ["enjo_party.enjo_party.utils.logger.flush"]
 
 # Job Events
 # ----------
 # before_job = ["enjo_party.utils.before_job"]
-# after_job = ["enjo_party.utils.after_job"]
+after_job = ["enjo_party.enjo_party.utils.logger.flush"]
 
 # User Data Protection
 # --------------------
@@ -0,0 +1,8 @@
+# Zusammengesetzter Index für die Punkte-Übersicht auf bestehenden Sites
+# (neue Sites bekommen ihn über on_doctype_update von ENJO Punkte Transaktion)
+
+from enjo_party.enjo_party.doctype.enjo_punkte_transaktion.enjo_punkte_transaktion import on_doctype_update
+
+
+def execute():
+	on_doctype_update()
@@ -0,0 +1,14 @@
+# Indizes für Storno (sales_invoice), Zeitraum-Auswertung (sales_partner, transaction_date) und item_code
+# auf bestehenden Sites anlegen
+
+import frappe
+
+from enjo_party.enjo_party.doctype.enjo_punkte_transaktion.enjo_punkte_transaktion import on_doctype_update
+
+
+def execute():
+	for fieldname in ("sales_invoice", "item_code"):
+		# gleicher Indexname wie beim search_index im Schema-Sync, damit kein Duplikat entsteht
+		frappe.db.add_index("ENJO Punkte Transaktion", [fieldname], index_name=fieldname)
+
+	on_doctype_update()
@@ -0,0 +1,104 @@
+# Party Buchung aus bestehenden Aufträgen befüllen
+# Vor Party Buchung erkannte create_invoices bereits gebuchte Kunden an eingereichten Sales Orders mit
+# custom_party_reference bzw. po_no = Party. Ohne Buchungseintrag würden diese Kunden (auch bei teilweise
+# gebuchten Parties) nach dem Update ein zweites Mal gebucht.
+
+import frappe
+from frappe.utils import now
+
+BATCH_SIZE = 1000
+
+
+def execute():
+	zeitpunkt = now()
+	cursor = ""
+	while True:
+		auftraege = frappe.db.sql(
+			"""
+			SELECT so.name, so.customer, party.name AS party
+			FROM `tabSales Order` so
+			INNER JOIN `tabParty` party
+				ON party.name = IF(IFNULL(so.custom_party_reference, '') != '', so.custom_party_reference, so.po_no)
+			WHERE so.docstatus = 1 AND so.name > %(cursor)s
+			ORDER BY so.name
+			LIMIT %(limit)s
+			""",
+			{"cursor": cursor, "limit": BATCH_SIZE},
+			as_dict=True,
+		)
+		if not auftraege:
+			break
+		cursor = auftraege[-1].name
+
+		namen = tuple(auftrag.name for auftrag in auftraege)
+
+		# Rechnung und Picklist pro Auftrag (jeweils die erste nicht stornierte)
+		rechnungen = dict(
+			frappe.db.sql(
+				"""
+			SELECT sii.sales_order, MIN(sii.parent)
+			FROM `tabSales Invoice Item` sii
+			INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
+			WHERE sii.sales_order IN %(namen)s AND sii.parenttype = 'Sales Invoice' AND si.docstatus = 1
+			GROUP BY sii.sales_order
+			""",
+				{"namen": namen},
+			)
+		)
+		picklists = dict(
+			frappe.db.sql(
+				"""
+			SELECT pli.sales_order, MIN(pli.parent)
+			FROM `tabPick List Item` pli
+			INNER JOIN `tabPick List` pl ON pl.name = pli.parent
+			WHERE pli.sales_order IN %(namen)s AND pli.parenttype = 'Pick List' AND pl.docstatus != 2
+			GROUP BY pli.sales_order
+			""",
+				{"namen": namen},
+			)
+		)
+
+		werte = []
+		gesehen = set()
+		for auftrag in auftraege:
+			# Ein Eintrag pro Party und Kunde; vorhandene Einträge bleiben über den Unique-Index unberührt
+			if (auftrag.party, auftrag.customer) in gesehen:
+				continue
+			gesehen.add((auftrag.party, auftrag.customer))
+			werte.append(
+				[
+					frappe.generate_hash(length=10),
+					zeitpunkt,
+					zeitpunkt,
+					"Administrator",
+					"Administrator",
+					0,
+					0,
+					auftrag.party,
+					auftrag.customer,
+					auftrag.name,
+					rechnungen.get(auftrag.name),
+					picklists.get(auftrag.name),
+				]
+			)
+
+		frappe.db.bulk_insert(
+			"Party Buchung",
+			[
+				"name",
+				"creation",
+				"modified",
+				"modified_by",
+				"owner",
+				"docstatus",
+				"idx",
+				"party",
+				"customer",
+				"sales_order",
+				"sales_invoice",
+				"pick_list",
+			],
+			werte,
+			ignore_duplicates=True,
+		)
+		frappe.db.commit()
@@ -0,0 +1,104 @@
+# Pick List Rechnung aus dem bisherigen Textfeld custom_invoice_references befüllen
+# (Einträge "SINV-... (Kundenname)", früher komma-, heute zeilengetrennt)
+
+import re
+
+import frappe
+from frappe.utils import now
+
+BATCH_SIZE = 1000
+
+
+def execute():
+	if not frappe.db.has_column("Pick List", "custom_invoice_references"):
+		return
+
+	zeitpunkt = now()
+	cursor = ""
+	while True:
+		picklists = frappe.db.sql(
+			"""
+			SELECT pl.name, pl.docstatus, pl.custom_invoice_references
+			FROM `tabPick List` pl
+			WHERE pl.name > %(cursor)s
+				AND IFNULL(pl.custom_invoice_references, '') != ''
+				AND NOT EXISTS (
+					SELECT 1 FROM `tabPick List Rechnung` plr
+					WHERE plr.parent = pl.name AND plr.parenttype = 'Pick List'
+				)
+			ORDER BY pl.name
+			LIMIT %(limit)s
+			""",
+			{"cursor": cursor, "limit": BATCH_SIZE},
+			as_dict=True,
+		)
+		if not picklists:
+			break
+		cursor = picklists[-1].name
+
+		# Kandidaten aus dem Text; nur tatsächlich existierende Rechnungen übernehmen
+		kandidaten = {
+			picklist.name: list(dict.fromkeys(re.findall(r"[^\s,()]+", picklist.custom_invoice_references)))
+			for picklist in picklists
+		}
+		docstatus = {picklist.name: picklist.docstatus for picklist in picklists}
+		alle = {token for tokens in kandidaten.values() for token in tokens}
+		rechnungen = (
+			{
+				rechnung.name: rechnung
+				for rechnung in frappe.get_all(
+					"Sales Invoice",
+					filters={"name": ["in", list(alle)]},
+					fields=["name", "customer", "customer_name"],
+				)
+			}
+			if alle
+			else {}
+		)
+
+		werte = []
+		for picklist, tokens in kandidaten.items():
+			idx = 0
+			for token in tokens:
+				if token not in rechnungen:
+					continue
+				idx += 1
+				werte.append(
+					[
+						frappe.generate_hash(length=10),
+						zeitpunkt,
+						zeitpunkt,
+						"Administrator",
+						"Administrator",
+						docstatus[picklist],
+						idx,
+						picklist,
+						"Pick List",
+						"custom_rechnungen",
+						token,
+						rechnungen[token].customer,
+						rechnungen[token].customer_name,
+					]
+				)
+
+		if werte:
+			frappe.db.bulk_insert(
+				"Pick List Rechnung",
+				[
+					"name",
+					"creation",
+					"modified",
+					"modified_by",
+					"owner",
+					"docstatus",
+					"idx",
+					"parent",
+					"parenttype",
+					"parentfield",
+					"sales_invoice",
+					"customer",
+					"customer_name",
+				],
+				werte,
+			)
+		frappe.db.commit()
@@ -0,0 +1,81 @@
+# Überführt die 16 festen Produkttabellen der Party
+# (produktauswahl_für_gastgeberin, produktauswahl_für_gast_1 bis _15 - jeweils "Sales Order Item")
+# in die eine Tabelle "Party Produkt" mit Teilnehmer-Spalte.
+# Die Versandziele versand_gast_1 bis _15 wandern nach "Party Kunde".versand_zu.
+
+import frappe
+
+
+def execute():
+	if not frappe.db.exists("Sales Order Item", {"parenttype": "Party"}):
+		return
+
+	move_product_rows()
+	move_guest_shipping_targets()
+
+	# Alte Zeilen entfernen, damit sie nicht als verwaiste Auftragspositionen liegen bleiben
+	frappe.db.sql("DELETE FROM `tabSales Order Item` WHERE parenttype = 'Party'")
+
+
+def move_product_rows():
+	"""
+	Alle Produktzeilen mit einer INSERT ... SELECT Abfrage übernehmen.
+	Gast-Tabellen werden über die Position in der Gästeliste (idx) dem Kunden zugeordnet,
+	Zeilen ohne passenden Gast wurden schon bisher ignoriert und entfallen.
+	"""
+	frappe.db.sql(
+		"""
+		INSERT IGNORE INTO `tabParty Produkt` (
+			name, creation, modified, modified_by, owner, docstatus,
+			parent, parentfield, parenttype, idx,
+			teilnehmer, item_code, item_name, qty, rate, amount,
+			uom, stock_uom, conversion_factor, stock_qty,
+			base_rate, base_amount, price_list_rate, base_price_list_rate,
+			warehouse, delivery_date
+		)
+		SELECT
+			soi.name, soi.creation, soi.modified, soi.modified_by, soi.owner, soi.docstatus,
+			soi.parent, 'produktauswahl', 'Party',
+			ROW_NUMBER() OVER (
+				PARTITION BY soi.parent
+				ORDER BY IF(soi.parentfield = 'produktauswahl_für_gastgeberin', 0, pk.idx), soi.idx
+			),
+			IF(soi.parentfield = 'produktauswahl_für_gastgeberin', p.gastgeberin, pk.kunde),
+			soi.item_code, soi.item_name, soi.qty, soi.rate, soi.amount,
+			soi.uom, soi.stock_uom, soi.conversion_factor, soi.stock_qty,
+			soi.base_rate, soi.base_amount, soi.price_list_rate, soi.base_price_list_rate,
+			soi.warehouse, soi.delivery_date
+		FROM `tabSales Order Item` soi
+		INNER JOIN `tabParty` p ON p.name = soi.parent
+		LEFT JOIN `tabParty Kunde` pk
+			ON pk.parent = soi.parent
+			AND pk.parenttype = 'Party'
+			AND pk.parentfield = 'kunden'
+			AND soi.parentfield = CONCAT('produktauswahl_für_gast_', pk.idx)
+		WHERE soi.parenttype = 'Party'
+			AND IF(soi.parentfield = 'produktauswahl_für_gastgeberin', p.gastgeberin, pk.kunde) IS NOT NULL
+		"""
+	)
+
+
+def move_guest_shipping_targets():
+	"""versand_gast_N der Party in die N-te Zeile der Gästeliste übernehmen (eine UPDATE-Abfrage)"""
+	# Position in ELT() entspricht der Gastnummer, fehlende Spalten werden zu NULL
+	columns = [
+		f"p.`versand_gast_{i}`" if frappe.db.has_column("Party", f"versand_gast_{i}") else "NULL"
+		for i in range(1, 16)
+	]
+	if all(column == "NULL" for column in columns):
+		return
+
+	frappe.db.sql(
+		"""
+		UPDATE `tabParty Kunde` pk
+		INNER JOIN `tabParty` p ON p.name = pk.parent
+		SET pk.versand_zu = ELT(pk.idx, {columns})
+		WHERE pk.parenttype = 'Party'
+			AND pk.parentfield = 'kunden'
+			AND IFNULL(pk.versand_zu, '') = ''
+			AND IFNULL(ELT(pk.idx, {columns}), '') != ''
+		""".format(columns=", ".join(columns))
+	)
@@ -0,0 +1,7 @@
+# Erstbefüllung der Monatsrollups (ENJO Punkte Periode) aus dem Ledger
+
+from enjo_party.enjo_party.utils.punkte_periode import rebuild_punkte_perioden
+
+
+def execute():
+	rebuild_punkte_perioden()
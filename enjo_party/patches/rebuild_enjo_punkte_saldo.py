@@ -0,0 +1,7 @@
+# Erstbefüllung des materialisierten Punktestands (ENJO Punkte Saldo) aus dem Ledger
+
+from enjo_party.enjo_party.utils.punkte_saldo import rebuild_punkte_saldo
+
+
+def execute():
+	rebuild_punkte_saldo()
@@ -1,4 +1,23 @@
 frappe.ui.form.on('Sales Order', {
+    refresh: function(frm) {
+        // Folgebelege (Rechnung, Punkte, Picklist) laufen im Hintergrund - bei Fehlern erneut anstoßen
+        if (frm.doc.docstatus === 1 && frm.doc.custom_folgebelege_status === 'Fehlgeschlagen') {
+            frm.add_custom_button(__('Folgebelege erneut erstellen'), function() {
+                frappe.call({
+                    method: 'enjo_party.enjo_party.utils.folgebelege.retry_folgebelege',
+                    args: { sales_order: frm.doc.name },
+                    callback: function() {
+                        frappe.show_alert({
+                            message: __('Folgebelege werden im Hintergrund erstellt'),
+                            indicator: 'blue'
+                        });
+                        frm.reload_doc();
+                    }
+                });
+            });
+        }
+    },
+    
     before_submit: function(frm) {
         console.log("Before Save wird ausgeführt");
         console.log("Dokument Status:", frm.doc.docstatus);